@@ -0,0 +1,4 @@
+"""
+Benchmarks package for the AI service.
+Contains a local fake Gemini server and performance measurement scripts.
+"""
@@ -0,0 +1,120 @@
+"""
+Upstream concurrency benchmark.
+Measures AIService.generate_content throughput against the local fake Gemini server
+at several concurrency levels, optionally next to the old thread-pool call pattern.
+
+Run from the llm_service directory:
+    python -m benchmarks.bench_concurrency --levels 50,200,1000 --compare-threadpool
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark upstream concurrency")
+    parser.add_argument("--levels", default="50,200,1000", help="Comma-separated concurrency levels")
+    parser.add_argument("--latency-ms", type=float, default=300, help="Fake Gemini latency")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--max-concurrency", type=int, default=1000,
+                        help="AI_MAX_CONCURRENT_REQUESTS for the service under test")
+    parser.add_argument("--compare-threadpool", action="store_true",
+                        help="Also run blocking calls through asyncio.to_thread (previous behaviour)")
+    parser.add_argument("--json", dest="json_path", help="Write results to this JSON file")
+    return parser.parse_args()
+
+
+def configure_environment(args, base_url: str):
+    """Point the service at the fake server before config is imported."""
+    os.environ["GOOGLE_API_KEY"] = "benchmark-key"
+    os.environ["GEMINI_API_BASE_URL"] = base_url
+    os.environ["AI_CACHE_ENABLED"] = "false"
+    os.environ["AI_MAX_CONCURRENT_REQUESTS"] = str(args.max_concurrency)
+    os.environ["AI_HTTP_MAX_CONNECTIONS"] = str(args.max_concurrency)
+    os.environ["AI_HTTP_MAX_KEEPALIVE"] = str(args.max_concurrency)
+
+
+async def run_async_level(concurrency: int) -> dict:
+    """Fire `concurrency` distinct prompts through the async upstream path."""
+    from services import AIService
+
+    service = AIService()
+    try:
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *[service.generate_content(f"benchmark prompt {i}") for i in range(concurrency)],
+            return_exceptions=True,
+        )
+        elapsed = time.perf_counter() - started
+    finally:
+        await service.aclose()
+    return _summary("async", concurrency, elapsed, results)
+
+
+async def run_threadpool_level(concurrency: int, base_url: str) -> dict:
+    """Same workload with a blocking client on the default executor."""
+    import httpx
+    from config import settings
+
+    client = httpx.Client(timeout=60)
+    url = f"{base_url}/v1beta/models/{settings.model_name}:generateContent"
+
+    def call(i: int):
+        body = {"contents": [{"role": "user", "parts": [{"text": f"benchmark prompt {i}"}]}]}
+        response = client.post(url, json=body)
+        response.raise_for_status()
+        return response.json()
+
+    try:
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *[asyncio.to_thread(call, i) for i in range(concurrency)],
+            return_exceptions=True,
+        )
+        elapsed = time.perf_counter() - started
+    finally:
+        client.close()
+    return _summary("threadpool", concurrency, elapsed, results)
+
+
+def _summary(mode: str, concurrency: int, elapsed: float, results: list) -> dict:
+    errors = sum(1 for r in results if isinstance(r, BaseException))
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(concurrency / elapsed, 1),
+        "errors": errors,
+    }
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from benchmarks.fake_gemini import FakeGeminiServer
+
+    levels = [int(level) for level in args.levels.split(",")]
+    rows = []
+    with FakeGeminiServer(port=args.port, latency_ms=args.latency_ms) as server:
+        configure_environment(args, server.base_url)
+        for level in levels:
+            rows.append(asyncio.run(run_async_level(level)))
+            if args.compare_threadpool:
+                rows.append(asyncio.run(run_threadpool_level(level, server.base_url)))
+
+    print(f"{'mode':<12}{'concurrency':>12}{'elapsed (s)':>14}{'req/s':>10}{'errors':>8}")
+    for row in rows:
+        print(f"{row['mode']:<12}{row['concurrency']:>12}{row['elapsed_s']:>14}"
+              f"{row['throughput_rps']:>10}{row['errors']:>8}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"latency_ms": args.latency_ms, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Local stand-in for the Gemini REST API.
+Serves generateContent and streamGenerateContent with configurable latency, errors and 429s.
+
+Run standalone:
+    python -m benchmarks.fake_gemini --port 8081 --latency-ms 300 --error-rate 0.01 --rate-limit-rate 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import re
+import socket
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+FAKE_TEXT = (
+    "Implement the requested change end to end: confirm the requirements, update the "
+    "affected modules, add tests covering the main and edge cases, and document the "
+    "behaviour. Done when the feature works in staging and reviewers approve the change."
+)
+
+
+def _payload(text: str, prompt_chars: int, completion_chars: int) -> dict:
+    # Like Gemini, usage counts cover the whole response so far, not just this chunk
+    return {
+        "candidates": [
+            {
+                "content": {"role": "model", "parts": [{"text": text}]},
+                "finishReason": "STOP",
+            }
+        ],
+        "usageMetadata": {
+            "promptTokenCount": prompt_chars // 4,
+            "candidatesTokenCount": completion_chars // 4,
+            "totalTokenCount": prompt_chars // 4 + completion_chars // 4,
+        },
+    }
+
+
+def _json_text(body: dict) -> str:
+    """Answer a JSON-mode (packed batch) prompt with one description per "[n]" task line."""
+    prompt = "".join(
+        part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", [])
+    )
+    indexes = [int(index) for index in re.findall(r"^\[(\d+)\]", prompt, flags=re.MULTILINE)]
+    return json.dumps([{"index": index, "description": FAKE_TEXT} for index in indexes or [0]])
+
+
+def _error(status_code: int, message: str, headers: dict = None) -> JSONResponse:
+    return JSONResponse(
+        {"error": {"code": status_code, "message": message}},
+        status_code=status_code,
+        headers=headers,
+    )
+
+
+def create_app(
+    latency_ms: float = 300,
+    chunk_count: int = 8,
+    latency_jitter_ms: float = 0,
+    error_rate: float = 0.0,
+    rate_limit_rate: float = 0.0,
+    retry_after_seconds: float = 1,
+    seed: int = None
+) -> FastAPI:
+    """
+    Build the fake Gemini application.
+
+    error_rate and rate_limit_rate are the fractions of calls answered with a 500
+    (after the usual latency) or an immediate 429 carrying Retry-After.
+    """
+    app = FastAPI(title="Fake Gemini")
+    app.state.requests = 0
+    rng = random.Random(seed)
+
+    def delay(fraction: float = 1.0) -> float:
+        jitter = rng.uniform(-latency_jitter_ms, latency_jitter_ms)
+        return max(0.0, latency_ms + jitter) * fraction / 1000
+
+    @app.post("/v1beta/models/{model_method}")
+    async def model_method(model_method: str, request: Request):
+        app.state.requests += 1
+        body = await request.json()
+        prompt_chars = sum(
+            len(part.get("text", ""))
+            for content in body.get("contents", []) + [body.get("systemInstruction", {})]
+            for part in content.get("parts", [])
+        )
+        _, _, method = model_method.partition(":")
+
+        roll = rng.random()
+        if roll < rate_limit_rate:
+            return _error(
+                429, "Resource has been exhausted (e.g. check quota).",
+                headers={"Retry-After": f"{retry_after_seconds:g}"},
+            )
+        if roll < rate_limit_rate + error_rate:
+            await asyncio.sleep(delay())
+            return _error(500, "An internal error has occurred.")
+
+        if method == "streamGenerateContent":
+            async def events():
+                step = max(1, len(FAKE_TEXT) // chunk_count)
+                for start in range(0, len(FAKE_TEXT), step):
+                    await asyncio.sleep(delay(1 / chunk_count))
+                    chunk = _payload(
+                        FAKE_TEXT[start:start + step],
+                        prompt_chars,
+                        min(start + step, len(FAKE_TEXT)),
+                    )
+                    yield f"data: {json.dumps(chunk)}\r\n\r\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep(delay())
+        text = FAKE_TEXT
+        if body.get("generationConfig", {}).get("responseMimeType") == "application/json":
+            text = _json_text(body)
+        return JSONResponse(_payload(text, prompt_chars, len(text)))
+
+    @app.get("/v1beta/models/{model}")
+    async def model_info(model: str):
+        return {"name": f"models/{model}", "displayName": model}
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": app.state.requests}
+
+    return app
+
+
+def _serve(port: int, app_options: dict):
+    uvicorn.run(
+        create_app(**app_options), host="127.0.0.1", port=port, log_level="warning", backlog=4096
+    )
+
+
+class FakeGeminiServer:
+    """Run the fake Gemini app in a child process so it does not share the benchmark's GIL."""
+
+    def __init__(self, port: int = 8081, **app_options):
+        self.port = port
+        self._process = multiprocessing.Process(
+            target=_serve, args=(port, app_options), daemon=True
+        )
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "FakeGeminiServer":
+        self._process.start()
+        deadline = time.monotonic() + 15
+        while time.monotonic() < deadline:
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=0.2):
+                    return self
+            except OSError:
+                time.sleep(0.05)
+        self._process.terminate()
+        raise RuntimeError(f"Fake Gemini server did not start on port {self.port}")
+
+    def __exit__(self, *exc_info):
+        self._process.terminate()
+        self._process.join(timeout=5)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local fake Gemini API server")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of calls failing with 429")
+    parser.add_argument("--retry-after", type=float, default=1, help="Retry-After sent with 429s")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    _serve(args.port, {
+        "latency_ms": args.latency_ms,
+        "latency_jitter_ms": args.latency_jitter_ms,
+        "error_rate": args.error_rate,
+        "rate_limit_rate": args.rate_limit_rate,
+        "retry_after_seconds": args.retry_after,
+        "seed": args.seed,
+    })
@@ -0,0 +1,260 @@
+"""
+HTTP load test for the AI service.
+Runs the FastAPI app against the local fake Gemini server and drives the generate, shorten
+and expand endpoints at fixed concurrency levels, reporting latency percentiles per level.
+
+Run from the llm_service directory:
+    python -m benchmarks.load_test --levels 10,50 --requests 200 --json load_test.json
+    python -m benchmarks.load_test --error-rate 0.02 --rate-limit-rate 0.05 --baseline load_test.json
+    python -m benchmarks.load_test --workers 4 --state-backend sqlite
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import httpx
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STAGES = ["To Do", "In Progress", "Review", "Done"]
+SAMPLE_DESCRIPTION = (
+    "Add password reset to the login page: email a single-use link valid for 30 minutes, "
+    "rate limit reset requests per account, and log every reset for the security audit."
+)
+
+ENDPOINTS = {
+    "generate": (
+        "/generate-description",
+        lambda i: {"task": {"title": f"Load test task {i}", "stage": STAGES[i % len(STAGES)]}},
+    ),
+    "shorten": ("/shorten-description", lambda i: {"content": f"{SAMPLE_DESCRIPTION} (#{i})"}),
+    "expand": ("/expand-description", lambda i: {"content": f"{SAMPLE_DESCRIPTION} (#{i})"}),
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test the AI service endpoints")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="Comma-separated endpoints to drive")
+    parser.add_argument("--levels", default="10,50", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint and level")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests per endpoint before each level")
+    parser.add_argument("--latency-ms", type=float, default=300, help="Fake Gemini latency")
+    parser.add_argument("--latency-jitter-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of upstream calls failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of upstream calls failing with 429")
+    parser.add_argument("--retry-after", type=float, default=1, help="Retry-After on injected 429s")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--rate-limit-rpm", type=float, default=0,
+                        help="AI_RATE_LIMIT_RPM for the service under test (0 disables admission control)")
+    parser.add_argument("--cache", action="store_true", help="Leave the response cache enabled")
+    parser.add_argument("--workers", type=int, default=1, help="Service worker processes")
+    parser.add_argument("--state-backend", default="memory", choices=["memory", "sqlite", "redis"],
+                        help="AI_STATE_BACKEND for the service under test")
+    parser.add_argument("--fake-port", type=int, default=8081)
+    parser.add_argument("--service-port", type=int, default=8091)
+    parser.add_argument("--verbose", action="store_true", help="Show the service's own log output")
+    parser.add_argument("--json", dest="json_path", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a previous JSON result")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="Fail if p95 grows by more than this fraction over the baseline")
+    return parser.parse_args()
+
+
+class ServiceProcess:
+    """Run the AI service with uvicorn in a subprocess, configured through its environment."""
+
+    def __init__(self, port: int, env: dict, verbose: bool = False, workers: int = 1):
+        self.port = port
+        self.workers = workers
+        self._env = {**os.environ, **env}
+        self._output = None if verbose else subprocess.DEVNULL
+        self._process = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "ServiceProcess":
+        self._process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app",
+             "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning",
+             "--workers", str(self.workers)],
+            cwd=SERVICE_DIR,
+            env=self._env,
+            stdout=self._output,
+            stderr=self._output,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError(f"AI service exited with code {self._process.returncode}")
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=0.2):
+                    return self
+            except OSError:
+                time.sleep(0.1)
+        self._process.terminate()
+        raise RuntimeError(f"AI service did not start on port {self.port}")
+
+    def __exit__(self, *exc_info):
+        self._process.terminate()
+        self._process.wait(timeout=10)
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+async def run_level(client: httpx.AsyncClient, endpoint: str, concurrency: int, total: int, offset: int) -> dict:
+    """Send `total` requests to one endpoint with `concurrency` requests outstanding at a time."""
+    path, payload = ENDPOINTS[endpoint]
+    latencies = []
+    statuses = Counter()
+    next_index = iter(range(offset, offset + total))
+
+    async def worker():
+        for i in next_index:
+            started = time.perf_counter()
+            try:
+                response = await client.post(path, json=payload(i))
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    errors = total - statuses["200"]
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4),
+        "throughput_rps": round(total / elapsed, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 1),
+            "p95": round(percentile(latencies, 95), 1),
+            "p99": round(percentile(latencies, 99), 1),
+            "mean": round(sum(latencies) / len(latencies), 1),
+            "max": round(latencies[-1], 1),
+        },
+        "status_codes": dict(sorted(statuses.items())),
+    }
+
+
+async def run_suite(base_url: str, endpoints: list, levels: list, args) -> list:
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    timeout = httpx.Timeout(120, connect=10)
+    rows = []
+    offset = 0
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        for endpoint in endpoints:
+            for level in levels:
+                if args.warmup:
+                    await run_level(client, endpoint, min(level, args.warmup), args.warmup, offset)
+                    offset += args.warmup
+                rows.append(await run_level(client, endpoint, level, args.requests, offset))
+                offset += args.requests
+    return rows
+
+
+def compare(rows: list, baseline_path: str, max_regression: float) -> bool:
+    """Print p95/error-rate deltas against a baseline; return False on a regression."""
+    with open(baseline_path) as f:
+        baseline = {(row["endpoint"], row["concurrency"]): row for row in json.load(f)["results"]}
+
+    ok = True
+    print(f"\n{'endpoint':<10}{'concurrency':>12}{'p95 base':>10}{'p95 now':>10}{'change':>9}{'errors':>14}")
+    for row in rows:
+        base = baseline.get((row["endpoint"], row["concurrency"]))
+        if base is None:
+            continue
+        before, after = base["latency_ms"]["p95"], row["latency_ms"]["p95"]
+        change = (after - before) / before if before else 0.0
+        regressed = change > max_regression or row["error_rate"] > base["error_rate"] + 0.01
+        ok = ok and not regressed
+        print(f"{row['endpoint']:<10}{row['concurrency']:>12}{before:>10}{after:>10}{change:>+9.0%}"
+              f"{base['error_rate']:>7.1%}->{row['error_rate']:<6.1%}{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, SERVICE_DIR)
+    from benchmarks.fake_gemini import FakeGeminiServer
+
+    endpoints = args.endpoints.split(",")
+    levels = [int(level) for level in args.levels.split(",")]
+    fake_options = {
+        "latency_ms": args.latency_ms,
+        "latency_jitter_ms": args.latency_jitter_ms,
+        "error_rate": args.error_rate,
+        "rate_limit_rate": args.rate_limit_rate,
+        "retry_after_seconds": args.retry_after,
+        "seed": args.seed,
+    }
+
+    with FakeGeminiServer(port=args.fake_port, **fake_options) as fake:
+        service_env = {
+            "GOOGLE_API_KEY": "load-test-key",
+            "GEMINI_API_BASE_URL": fake.base_url,
+            "AI_CACHE_ENABLED": "true" if args.cache else "false",
+            "AI_RATE_LIMIT_RPM": str(args.rate_limit_rpm),
+            "AI_STATE_BACKEND": args.state_backend,
+        }
+        if args.state_backend == "sqlite":
+            state_path = os.path.join(SERVICE_DIR, "load_test_state.db")
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(state_path + suffix):
+                    os.remove(state_path + suffix)
+            service_env["AI_STATE_SQLITE_PATH"] = state_path
+        with ServiceProcess(args.service_port, service_env, verbose=args.verbose, workers=args.workers) as service:
+            rows = asyncio.run(run_suite(service.base_url, endpoints, levels, args))
+        upstream_requests = httpx.get(f"{fake.base_url}/stats").json()["requests"]
+
+    print(f"{'endpoint':<10}{'concurrency':>12}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'errors':>8}")
+    for row in rows:
+        latency = row["latency_ms"]
+        print(f"{row['endpoint']:<10}{row['concurrency']:>12}{latency['p50']:>9}{latency['p95']:>9}"
+              f"{latency['p99']:>9}{row['throughput_rps']:>9}{row['error_rate']:>8.1%}")
+    print(f"Upstream calls: {upstream_requests}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({
+                "config": {
+                    "requests": args.requests,
+                    "levels": levels,
+                    "cache": args.cache,
+                    "rate_limit_rpm": args.rate_limit_rpm,
+                    "workers": args.workers,
+                    "state_backend": args.state_backend,
+                    "fake_gemini": fake_options,
+                },
+                "results": rows,
+                "upstream_requests": upstream_requests,
+            }, f, indent=2, sort_keys=True)
+
+    if args.baseline and not compare(rows, args.baseline, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
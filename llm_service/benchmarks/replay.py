@@ -0,0 +1,172 @@
+"""
+Offline traffic replay benchmark.
+Re-issues the requests in a recorded traffic log (AI_RECORD_PATH) through AIService.generate_content
+at their recorded arrival times, answered by the replay client instead of Gemini, and reports
+latency percentiles, cache hits and upstream calls. No network access or quota is used.
+
+Run from the llm_service directory:
+    python -m benchmarks.replay traffic.jsonl --speed 10 --json replay.json
+    python -m benchmarks.replay traffic.jsonl --latency-scale 0.5 --env AI_CACHE_MAX_ENTRIES=100
+    python -m benchmarks.replay traffic.jsonl --env AI_CACHE_ENABLED=false --baseline replay.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay recorded Gemini traffic through the service offline")
+    parser.add_argument("log", help="Traffic log written with AI_RECORD_PATH")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Arrival-time speed-up (10 = ten times faster; 0 = send everything at once)")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="Multiplier on recorded upstream latencies (0 = answer instantly)")
+    parser.add_argument("--limit", type=int, default=0, help="Replay only the first N requests")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Service setting for this run, e.g. a cache policy (repeatable)")
+    parser.add_argument("--miss", default="error", choices=["error", "cycle"],
+                        help="AI_REPLAY_MISS: how to answer calls that are not in the log")
+    parser.add_argument("--json", dest="json_path", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Earlier --json results to compare against")
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    """Serve upstream calls from the log before config is imported."""
+    os.environ["AI_REPLAY_PATH"] = os.path.abspath(args.log)
+    os.environ["AI_REPLAY_LATENCY_SCALE"] = str(args.latency_scale)
+    os.environ["AI_REPLAY_MISS"] = args.miss
+    os.environ["AI_RECORD_PATH"] = ""
+    # Offline there is no quota to protect; --env AI_RATE_LIMIT_RPM=... models one
+    os.environ["AI_RATE_LIMIT_RPM"] = "0"
+    for setting in args.env:
+        key, _, value = setting.partition("=")
+        os.environ[key.strip()] = value
+
+
+def requests_from_log(entries: list, limit: int) -> list:
+    """
+    One entry per request the service received while recording.
+
+    A request reached upstream as a successful call or as a cache hit; failed
+    attempts that were retried and truncated streams are left out.
+    """
+    requests = [
+        entry for entry in entries
+        if "error" not in entry and not entry.get("truncated")
+    ]
+    requests.sort(key=lambda entry: entry["t"])
+    return requests[:limit] if limit else requests
+
+
+async def replay(requests: list, speed: float) -> dict:
+    """Send each request at its (sped-up) recorded arrival time and collect the outcomes."""
+    from services import AIService
+
+    service = AIService()
+    first_arrival = requests[0]["t"]
+    started = time.perf_counter()
+
+    async def send(entry: dict) -> dict:
+        if speed > 0:
+            delay = (entry["t"] - first_arrival) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        sent = time.perf_counter()
+        try:
+            result = await service.generate_content(
+                entry["prompt"],
+                generation_overrides=entry.get("config"),
+                operation="replay",
+                system_instruction=entry.get("system_instruction"),
+                history=entry.get("history"),
+            )
+        except Exception as e:
+            return {"ok": False, "latency": time.perf_counter() - sent, "error": type(e).__name__}
+        return {
+            "ok": True,
+            "latency": time.perf_counter() - sent,
+            "cache_match": result.get("cache_match") if result.get("cached") else None,
+        }
+
+    try:
+        outcomes = await asyncio.gather(*[send(entry) for entry in requests])
+        elapsed = time.perf_counter() - started
+        traffic = service.traffic_stats()
+    finally:
+        await service.aclose()
+    return {"outcomes": outcomes, "elapsed": elapsed, "traffic": traffic}
+
+
+def summarize(requests: list, run: dict) -> dict:
+    from benchmarks.load_test import percentile
+
+    outcomes = run["outcomes"]
+    latencies = sorted(outcome["latency"] * 1000 for outcome in outcomes if outcome["ok"])
+    hits = Counter(outcome["cache_match"] for outcome in outcomes if outcome["ok"] and outcome["cache_match"])
+    recorded_hits = sum(1 for entry in requests if entry["kind"] == "cache_hit")
+    return {
+        "requests": len(outcomes),
+        "errors": dict(Counter(outcome["error"] for outcome in outcomes if not outcome["ok"])),
+        "elapsed_s": round(run["elapsed"], 2),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "cache_hits": dict(hits),
+        "hit_ratio": round(sum(hits.values()) / len(outcomes), 4) if outcomes else 0.0,
+        "upstream_calls": run["traffic"]["served"],
+        "replay_misses": run["traffic"]["misses"],
+        "recorded_upstream_calls": len(requests) - recorded_hits,
+        "recorded_hit_ratio": round(recorded_hits / len(requests), 4) if requests else 0.0,
+    }
+
+
+def compare(summary: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["summary"]
+    print(f"\n{'metric':<16}{'baseline':>12}{'this run':>12}")
+    for key in ("p50_ms", "p95_ms", "p99_ms", "hit_ratio", "upstream_calls"):
+        print(f"{key:<16}{baseline[key]:>12}{summary[key]:>12}")
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, SERVICE_DIR)
+    configure_environment(args)
+    from services.traffic_log import load_traffic
+
+    requests = requests_from_log(load_traffic(args.log), args.limit)
+    if not requests:
+        print(f"No replayable requests in {args.log}")
+        sys.exit(1)
+
+    run = asyncio.run(replay(requests, args.speed))
+    summary = summarize(requests, run)
+
+    print(f"Replayed {summary['requests']} requests in {summary['elapsed_s']}s "
+          f"(speed x{args.speed}, latency x{args.latency_scale})")
+    print(f"  latency p50/p95/p99: {summary['p50_ms']} / {summary['p95_ms']} / {summary['p99_ms']} ms")
+    print(f"  cache hit ratio: {summary['hit_ratio']:.1%} (recorded {summary['recorded_hit_ratio']:.1%}) "
+          f"{summary['cache_hits']}")
+    print(f"  upstream calls: {summary['upstream_calls']} (recorded {summary['recorded_upstream_calls']}), "
+          f"replay misses: {summary['replay_misses']}")
+    if summary["errors"]:
+        print(f"  errors: {summary['errors']}")
+
+    if args.baseline:
+        compare(summary, args.baseline)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"log": args.log, "speed": args.speed, "latency_scale": args.latency_scale,
+                       "env": args.env, "summary": summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Startup time benchmark for the AI service.
+Measures `import main` with `python -X importtime` in fresh interpreters, checks that heavy modules stay
+out of the import path, and times a uvicorn process from launch to its first /health response.
+
+Run from the llm_service directory:
+    python -m benchmarks.startup_time --runs 5 --budget-ms 1500 --json startup.json
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.load_test import SERVICE_DIR, ServiceProcess
+
+# Only needed once a request (or an enabled feature) uses them
+DEFAULT_FORBIDDEN = "numpy,httpx,dotenv,redis,google.generativeai,grpc"
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure AI service startup time")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time `import main` in")
+    parser.add_argument("--budget-ms", type=float, default=0,
+                        help="Fail if the median `import main` time exceeds this (0 disables)")
+    parser.add_argument("--ready-budget-ms", type=float, default=0,
+                        help="Fail if launch-to-first-/health exceeds this (0 disables)")
+    parser.add_argument("--forbid", default=DEFAULT_FORBIDDEN,
+                        help="Comma-separated modules that `import main` must not import")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list")
+    parser.add_argument("--port", type=int, default=8092)
+    parser.add_argument("--json", dest="json_path", help="Write results to this JSON file")
+    return parser.parse_args()
+
+
+def service_env() -> dict:
+    # A key in the environment also skips the .env lookup, as in a container
+    return {**os.environ, "GOOGLE_API_KEY": "startup-benchmark-key", "AI_WARMUP": "false"}
+
+
+def import_profile() -> dict:
+    """Run `import main` under -X importtime in a fresh interpreter; return {module: (self_us, cumulative_us)}."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=SERVICE_DIR,
+        env=service_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            modules[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return modules
+
+
+def time_to_ready(port: int) -> float:
+    """Seconds from launching uvicorn to the first successful /health response."""
+    started = time.perf_counter()
+    with ServiceProcess(port, service_env()) as service:
+        while True:
+            try:
+                if httpx.get(f"{service.base_url}/health", timeout=1).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.01)
+
+
+def main():
+    args = parse_args()
+    forbidden = [module for module in args.forbid.split(",") if module]
+
+    # The first run also writes bytecode caches, so it is not counted
+    import_profile()
+    profiles = [import_profile() for _ in range(args.runs)]
+    totals_ms = sorted(profile["main"][1] / 1000 for profile in profiles)
+    median_ms = statistics.median(totals_ms)
+
+    last = profiles[-1]
+    slowest = sorted(last.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    eager = [
+        module for module in forbidden
+        if any(name == module or name.startswith(module + ".") for name in last)
+    ]
+    ready_ms = time_to_ready(args.port) * 1000
+
+    print(f"import main: median {median_ms:.0f} ms over {args.runs} runs "
+          f"(min {totals_ms[0]:.0f}, max {totals_ms[-1]:.0f})")
+    print(f"launch to first /health: {ready_ms:.0f} ms")
+    print(f"\n{'module':<50}{'self ms':>10}{'cumulative ms':>15}")
+    for module, (self_us, cumulative_us) in slowest:
+        print(f"{module:<50}{self_us / 1000:>10.1f}{cumulative_us / 1000:>15.1f}")
+
+    failures = []
+    if eager:
+        failures.append(f"imported at startup but should be lazy: {', '.join(eager)}")
+    if args.budget_ms and median_ms > args.budget_ms:
+        failures.append(f"import main took {median_ms:.0f} ms, budget is {args.budget_ms:.0f} ms")
+    if args.ready_budget_ms and ready_ms > args.ready_budget_ms:
+        failures.append(f"startup took {ready_ms:.0f} ms, budget is {args.ready_budget_ms:.0f} ms")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({
+                "import_ms": {"median": round(median_ms, 1), "runs": [round(t, 1) for t in totals_ms]},
+                "ready_ms": round(ready_ms, 1),
+                "eager_forbidden_imports": eager,
+                "slowest_imports": [
+                    {"module": module, "self_ms": self_us / 1000, "cumulative_ms": cumulative_us / 1000}
+                    for module, (self_us, cumulative_us) in slowest
+                ],
+                "budgets": {"import_ms": args.budget_ms, "ready_ms": args.ready_budget_ms},
+            }, f, indent=2)
+
+    for failure in failures:
+        print(f"\nFAIL: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
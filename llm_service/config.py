@@ -3,14 +3,51 @@ Configuration module for the AI service.
 Handles environment variables and application settings.
 """
 
+import math
 import os
 import logging
-from dotenv import load_dotenv
+from typing import Dict
 
-# .env load
-load_dotenv(dotenv_path="../.env")  
-if not os.getenv("GOOGLE_API_KEY"):
-    load_dotenv(dotenv_path=".env")
+
+def load_env_files(paths=("../.env", ".env")):
+    """
+    Load every .env file that exists: the project root's, then the service's own.
+
+    Variables already set (in the environment or by an earlier file) are kept.
+    python-dotenv is only imported when there is a file to read.
+    """
+    existing = [path for path in paths if os.path.exists(path)]
+    if not existing:
+        return
+    from dotenv import load_dotenv
+
+    for dotenv_path in existing:
+        load_dotenv(dotenv_path=dotenv_path)
+
+
+def parse_tenant_weights(value: str) -> Dict[str, float]:
+    """
+    Parse AI_TENANT_WEIGHTS ("tenant=weight,...") into a weight per tenant.
+
+    Raises ValueError naming the bad entry if a pair has no "=" or its weight
+    is not a finite number above 0; a zero weight would never get a turn.
+    """
+    weights = {}
+    for pair in value.split(","):
+        if not pair.strip():
+            continue
+        name, separator, weight = pair.partition("=")
+        try:
+            parsed = float(weight) if separator and name.strip() else None
+        except ValueError:
+            parsed = None
+        if parsed is None or not math.isfinite(parsed) or parsed <= 0:
+            raise ValueError(f"AI_TENANT_WEIGHTS entry {pair.strip()!r} must be tenant=weight with a weight above 0")
+        weights[name.strip()] = parsed
+    return weights
+
+
+load_env_files()
 
 logger = logging.getLogger(__name__)
 
@@ -32,7 +69,9 @@ class Settings:
             "http://localhost:7001"
         ]
         
-        self.model_name = "gemini-2.0-flash-exp"
+        self.model_name = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp")
+        # Used while the primary model is erroring; empty disables fallback
+        self.fallback_model_name = os.getenv("GEMINI_FALLBACK_MODEL", "gemini-2.0-flash")
         self.model_temperature = 0.7
         self.model_top_p = 0.9
         self.model_top_k = 40
@@ -41,13 +80,130 @@ class Settings:
         # Request Configuration
         self.max_retries = 3
         self.request_timeout = 30000  # milliseconds
-        
+        self.retry_base_delay = float(os.getenv("AI_RETRY_BASE_DELAY", "1.0"))  # seconds
+        self.retry_max_delay = float(os.getenv("AI_RETRY_MAX_DELAY", "20.0"))  # seconds
+
+        # Hedging and Model Fallback Configuration
+        self.hedge_enabled = os.getenv("AI_HEDGE_ENABLED", "true").lower() == "true"
+        self.hedge_quantile = float(os.getenv("AI_HEDGE_QUANTILE", "0.95"))
+        self.hedge_min_delay_ms = float(os.getenv("AI_HEDGE_MIN_DELAY_MS", "200"))
+        self.hedge_default_delay_ms = float(os.getenv("AI_HEDGE_DEFAULT_DELAY_MS", "3000"))
+        self.fallback_error_rate = float(os.getenv("AI_FALLBACK_ERROR_RATE", "0.5"))
+        self.fallback_window_seconds = float(os.getenv("AI_FALLBACK_WINDOW_SECONDS", "60"))
+
+        # Circuit Breaker Configuration (fail fast while Gemini is down)
+        self.breaker_enabled = os.getenv("AI_BREAKER_ENABLED", "true").lower() == "true"
+        self.breaker_error_rate = float(os.getenv("AI_BREAKER_ERROR_RATE", "0.5"))
+        self.breaker_min_calls = int(os.getenv("AI_BREAKER_MIN_CALLS", "10"))
+        self.breaker_window_seconds = float(os.getenv("AI_BREAKER_WINDOW_SECONDS", "30"))
+        self.breaker_open_seconds = float(os.getenv("AI_BREAKER_OPEN_SECONDS", "15"))
+        self.breaker_probe_calls = int(os.getenv("AI_BREAKER_PROBE_CALLS", "3"))
+
+        # Admission Control (Gemini quota); AI_RATE_LIMIT_RPM=0 disables it
+        self.rate_limit_rpm = float(os.getenv("AI_RATE_LIMIT_RPM", "300"))
+        self.rate_limit_tpm = float(os.getenv("AI_RATE_LIMIT_TPM", "1000000"))
+        self.admission_queue_size = int(os.getenv("AI_ADMISSION_QUEUE_SIZE", "200"))
+        self.admission_max_wait_seconds = float(os.getenv("AI_ADMISSION_MAX_WAIT_SECONDS", "30"))
+
+        # Per-Tenant Fair Scheduling; tenants are bearer tokens, or X-Project-Id with AI_TENANT_KEY=project
+        self.tenant_key = os.getenv("AI_TENANT_KEY", "caller").lower()
+        self.tenant_rpm = float(os.getenv("AI_TENANT_RPM", "0"))  # 0 = no per-tenant quota
+        self.tenant_tpm = float(os.getenv("AI_TENANT_TPM", "0"))
+        self.tenant_max_queue = int(os.getenv("AI_TENANT_MAX_QUEUE", "50"))
+        self.fair_quantum_tokens = float(os.getenv("AI_FAIR_QUANTUM_TOKENS", "1000"))
+        # Comma-separated tenant=weight pairs, e.g. "project:ops=2,3f9a1c0d2b7e=0.5"
+        self.tenant_weights = parse_tenant_weights(os.getenv("AI_TENANT_WEIGHTS", ""))
+
+        # Upstream Connection Configuration
+        self.gemini_api_base_url = os.getenv(
+            "GEMINI_API_BASE_URL", "https://generativelanguage.googleapis.com"
+        )
+        self.max_concurrent_requests = int(os.getenv("AI_MAX_CONCURRENT_REQUESTS", "64"))
+        self.http_max_connections = int(os.getenv("AI_HTTP_MAX_CONNECTIONS", "100"))
+        self.http_max_keepalive_connections = int(os.getenv("AI_HTTP_MAX_KEEPALIVE", "20"))
+        # Open the upstream connection (and load lazy modules) during startup instead of on the first request
+        self.warmup_enabled = os.getenv("AI_WARMUP", "false").lower() == "true"
+
+        # Traffic Record/Replay Configuration; a replay log stands in for Gemini (no API key needed)
+        self.record_path = os.getenv("AI_RECORD_PATH", "")
+        self.replay_path = os.getenv("AI_REPLAY_PATH", "")
+        self.replay_latency_scale = float(os.getenv("AI_REPLAY_LATENCY_SCALE", "1.0"))
+        self.replay_miss = os.getenv("AI_REPLAY_MISS", "error").lower()
+
+        # Tracing and Profiling Configuration; AI_TRACE_EXPORT is none, file or otlp
+        self.trace_export = os.getenv("AI_TRACE_EXPORT", "none").lower()
+        self.trace_file = os.getenv("AI_TRACE_FILE", "traces.jsonl")
+        self.trace_sample_rate = float(os.getenv("AI_TRACE_SAMPLE_RATE", "1.0"))
+        self.otel_service_name = os.getenv("OTEL_SERVICE_NAME", "projecthub-ai")
+        # Requests at least this slow keep their span breakdown in the slow-request log (0 disables)
+        self.slow_request_ms = float(os.getenv("AI_SLOW_REQUEST_MS", "5000"))
+        self.slow_request_log_size = int(os.getenv("AI_SLOW_REQUEST_LOG_SIZE", "50"))
+        self.profile_max_reports = int(os.getenv("AI_PROFILE_MAX_REPORTS", "20"))
+        # Token required in X-Admin-Token by the /admin endpoints; empty disables them
+        self.admin_token = os.getenv("AI_ADMIN_TOKEN", "")
+
+        # Response Encoding Configuration; AI_COMPRESSION_MIN_BYTES=0 compresses every body
+        self.compression_min_bytes = int(os.getenv("AI_COMPRESSION_MIN_BYTES", "1024"))
+        self.gzip_level = int(os.getenv("AI_GZIP_LEVEL", "6"))
+        self.brotli_quality = int(os.getenv("AI_BROTLI_QUALITY", "5"))
+
+        # Structured Output Configuration: generate asks for JSON fields instead of free text
+        self.structured_output = os.getenv("AI_STRUCTURED_OUTPUT", "false").lower() == "true"
+
+        # Batch Generation Configuration
+        self.batch_max_tasks = int(os.getenv("AI_BATCH_MAX_TASKS", "100"))
+        self.batch_max_concurrency = int(os.getenv("AI_BATCH_MAX_CONCURRENCY", "8"))
+        self.batch_pack_size = int(os.getenv("AI_BATCH_PACK_SIZE", "5"))
+
+        # Refine Session Configuration (multi-turn editing kept server-side)
+        self.refine_max_sessions = int(os.getenv("AI_REFINE_MAX_SESSIONS", "1000"))
+        self.refine_session_ttl_seconds = int(os.getenv("AI_REFINE_SESSION_TTL_SECONDS", "1800"))
+        # Earlier exchanges (instruction + answer) resent as chat history on each turn
+        self.refine_max_turns = int(os.getenv("AI_REFINE_MAX_TURNS", "2"))
+
+        # Background Job Configuration (async expand)
+        self.job_workers = int(os.getenv("AI_JOB_WORKERS", "2"))
+        self.job_queue_size = int(os.getenv("AI_JOB_QUEUE_SIZE", "100"))
+        self.job_result_ttl_seconds = int(os.getenv("AI_JOB_RESULT_TTL_SECONDS", "3600"))
+        self.job_sqlite_path = os.getenv("AI_JOB_SQLITE_PATH", "")
+
+        # Speculative Pre-generation Configuration (task events from the backend)
+        self.pregenerate_enabled = os.getenv("AI_PREGENERATE_ENABLED", "true").lower() == "true"
+        self.pregenerate_max_queued = int(os.getenv("AI_PREGENERATE_MAX_QUEUED", "50"))
+        # Shared secret the backend sends in X-Webhook-Secret; empty disables the task-event webhook
+        self.webhook_secret = os.getenv("AI_WEBHOOK_SECRET", "")
+
+        # Usage Accounting Configuration
+        self.usage_retention_seconds = int(os.getenv("AI_USAGE_RETENTION_SECONDS", "86400"))
+        self.usage_max_events = int(os.getenv("AI_USAGE_MAX_EVENTS", "100000"))
+        # Callers tracked by name in cumulative usage; later callers are summed under "other"
+        self.usage_max_callers = int(os.getenv("AI_USAGE_MAX_CALLERS", "1000"))
+
+        # Shared State Configuration (multi-worker); memory keeps state per process
+        self.state_backend = os.getenv("AI_STATE_BACKEND", "memory").lower()
+        self.state_sqlite_path = os.getenv("AI_STATE_SQLITE_PATH", "ai_state.db")
+        self.redis_url = os.getenv("AI_REDIS_URL", "redis://localhost:6379/0")
+
+        # Response Cache Configuration
+        self.cache_enabled = os.getenv("AI_CACHE_ENABLED", "true").lower() == "true"
+        self.cache_max_entries = int(os.getenv("AI_CACHE_MAX_ENTRIES", "1000"))
+        self.cache_ttl_seconds = int(os.getenv("AI_CACHE_TTL_SECONDS", "3600"))
+        self.cache_sqlite_path = os.getenv("AI_CACHE_SQLITE_PATH", "")
+
+        # Semantic (near-duplicate) Cache Configuration
+        self.semantic_cache_enabled = os.getenv("AI_SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+        self.semantic_cache_threshold = float(os.getenv("AI_SEMANTIC_CACHE_THRESHOLD", "0.7"))
+        self.semantic_cache_max_entries = int(os.getenv("AI_SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+        self.semantic_cache_dim = int(os.getenv("AI_SEMANTIC_CACHE_DIM", "512"))
+
         # Validate configuration
         self._validate_config()
     
     def _validate_config(self):
         """Validate configuration and log status."""
-        if not self.google_api_key:
+        if self.replay_path:
+            logger.info(f"📼 Replaying recorded Gemini traffic from {self.replay_path}")
+        elif not self.google_api_key:
             logger.error("❌ GOOGLE_API_KEY not found in environment variables!")
             logger.error("📝 Please create a .env file in the project root with:")
             logger.error("   GOOGLE_API_KEY=your_api_key_here")
@@ -59,8 +215,13 @@ class Settings:
     @property
     def is_configured(self) -> bool:
         """Check if the service is properly configured."""
-        return bool(self.google_api_key)
+        return bool(self.google_api_key) or bool(self.replay_path)
     
+    @property
+    def max_generation_seconds(self) -> float:
+        """Longest one generation can take, retries and backoff included."""
+        return self.max_retries * (self.request_timeout / 1000 + self.retry_max_delay)
+
     @property
     def api_key_preview(self) -> str:
         """Return a preview of the API key for logging/debugging."""
@@ -0,0 +1,33 @@
+"""
+Gunicorn configuration for the AI service.
+Runs uvicorn workers; with more than one, set AI_STATE_BACKEND so workers share the cache and quota.
+"""
+
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
+bind = f"{os.getenv('AI_SERVICE_HOST', '0.0.0.0')}:{os.getenv('AI_SERVICE_PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+
+def on_starting(server):
+    if workers > 1 and os.getenv("AI_STATE_BACKEND", "memory").lower() == "memory":
+        server.log.warning(
+            "⚠️  Running %s workers with AI_STATE_BACKEND=memory: cache and rate limit are per worker", workers
+        )
+    # Metric files from a previous run would be merged into this one's
+    metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
@@ -7,9 +7,14 @@ import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from config import settings
-from routes import ai_router, health_router
+from routes import admin_router, ai_router, health_router, metrics_router
+from routes.admin_routes import profiler, tracer
+from routes.ai_routes import ai_service, job_queue
+from services.compression import CompressionMiddleware
+from services.tracing import TracingMiddleware
 
 logging.basicConfig(
     level=logging.INFO,
@@ -31,11 +36,18 @@ async def lifespan(app: FastAPI):
         logger.info("✅ AI Service ready for requests")
     else:
         logger.warning("⚠️  AI Service started without API key - limited functionality")
+
+    if settings.warmup_enabled:
+        await ai_service.warm_up()
+    await job_queue.start()
     
     yield
     
     # Shutdown
     logger.info("🛑 ProjectHub AI Service shutting down...")
+    await job_queue.stop()
+    await ai_service.aclose()
+    tracer.close()
 
 
 # Initialize FastAPI app
@@ -45,6 +57,7 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -55,11 +68,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Trace-Id"],
 )
 
+# Compress large JSON bodies; event streams are left alone
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_min_bytes,
+    gzip_level=settings.gzip_level,
+    brotli_quality=settings.brotli_quality,
+)
+
+# Outermost, so a trace covers the whole request including compression
+app.add_middleware(TracingMiddleware, tracer=tracer, profiler=profiler)
+
 # Include routers
 app.include_router(health_router, tags=["Health"])
 app.include_router(ai_router, tags=["AI Operations"])
+app.include_router(metrics_router, tags=["Monitoring"])
+app.include_router(admin_router, tags=["Admin"])
 
 if __name__ == "__main__":
     import uvicorn
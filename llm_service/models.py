@@ -3,7 +3,7 @@ Data models for the AI service.
 Contains all Pydantic models for request/response handling.
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional, List, Dict, Any
 
 
@@ -24,18 +24,134 @@ class AIGenerateRequest(BaseModel):
     task: TaskContext
 
 
+class AIBatchGenerateRequest(BaseModel):
+    """Request model for generating descriptions for many tasks at once."""
+    tasks: List[TaskContext] = Field(..., min_length=1)
+    pack: bool = False
+
+
 class AIProcessRequest(BaseModel):
     """Request model for AI processing operations (shorten/expand)."""
     content: str
     context: Optional[Dict[str, Any]] = {}
 
 
+class StructuredDescription(BaseModel):
+    """Task description fields requested from Gemini in structured-output mode."""
+    purpose: str = Field(..., min_length=1)
+    requirements: List[str] = Field(..., min_length=1)
+    acceptance_criteria: List[str] = Field(..., min_length=1)
+
+    @field_validator("purpose")
+    @classmethod
+    def _strip_purpose(cls, purpose: str) -> str:
+        purpose = " ".join(purpose.split())
+        if not purpose:
+            raise ValueError("purpose is blank")
+        return purpose
+
+    @field_validator("requirements", "acceptance_criteria")
+    @classmethod
+    def _drop_blank_items(cls, items: List[str]) -> List[str]:
+        items = [" ".join(item.split()) for item in items if item.strip()]
+        if not items:
+            raise ValueError("at least one non-blank item is required")
+        return items
+
+
 class AIResponse(BaseModel):
     """Response model for AI operations."""
     success: bool
     content: str
     usage_info: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
+    cached: bool = False
+    cache_match: Optional[str] = None
+    similarity: Optional[float] = None
+    structured: Optional[StructuredDescription] = None
+
+
+class AIBatchResponse(BaseModel):
+    """Response model for batch generation, one result per requested task."""
+    results: List[AIResponse]
+
+
+class TextEdit(BaseModel):
+    """Replace the one occurrence of find in the current draft."""
+    find: str = Field(..., min_length=1)
+    replace: str = ""
+
+
+class RefineSessionRequest(BaseModel):
+    """Start a refine session from a description, optionally running a first instruction."""
+    content: str = Field(..., min_length=1)
+    instruction: Optional[str] = Field(None, min_length=1, max_length=2000)
+
+
+class RefineTurnRequest(BaseModel):
+    """
+    One refine iteration: the user's own edits to the draft and/or an instruction for the model.
+
+    base_version, if given, must match the session's version, so a client
+    editing a stale draft gets a 409 instead of overwriting newer changes.
+    """
+    instruction: Optional[str] = Field(None, min_length=1, max_length=2000)
+    edits: List[TextEdit] = Field(default_factory=list, max_length=50)
+    base_version: Optional[int] = None
+
+
+class RefineResponse(BaseModel):
+    """Current state of a refine session; usage_info is set when the turn called the model."""
+    session_id: str
+    version: int
+    content: str
+    turns: int
+    usage_info: Optional[Dict[str, Any]] = None
+    cached: bool = False
+    expires_in_seconds: int
+
+
+class JobResponse(BaseModel):
+    """Status of a background job; result is set once the job has succeeded."""
+    job_id: str
+    operation: str
+    priority: str
+    status: str
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[AIResponse] = None
+    error: Optional[str] = None
+
+
+class TaskEvent(BaseModel):
+    """Task lifecycle event sent by the ProjectHub backend."""
+    event: str = Field(..., pattern=r"^task\.(created|stage_changed)$")
+    task_id: Optional[str] = None
+    task: TaskContext
+
+
+class TaskEventResponse(BaseModel):
+    """Whether a task event queued a speculative generation, and why not if it did not."""
+    accepted: bool
+    reason: Optional[str] = None
+
+
+class ProfileRequest(BaseModel):
+    """Profile the next requests requests, optionally only those whose path starts with path_prefix."""
+    requests: int = Field(1, ge=1, le=100)
+    interval_ms: Optional[float] = Field(None, gt=0, le=100)
+    path_prefix: Optional[str] = None
+
+
+class UpstreamHealth(BaseModel):
+    """Circuit breaker state and recent behaviour of the Gemini upstream."""
+    state: str
+    error_rate: Optional[float] = None
+    recent_calls: int = 0
+    latency_p50_ms: Optional[float] = None
+    latency_p95_ms: Optional[float] = None
+    retry_after_seconds: Optional[float] = None
 
 
 class HealthResponse(BaseModel):
@@ -46,6 +162,7 @@ class HealthResponse(BaseModel):
     api_key_preview: Optional[str] = None
     backend_url: str
     instructions: Optional[Dict[str, Optional[str]]] = None
+    upstream: Optional[UpstreamHealth] = None
 
 
 class UsageInfo(BaseModel):
@@ -54,6 +171,7 @@ class UsageInfo(BaseModel):
     prompt_tokens: int
     completion_tokens: int
     total_tokens: Optional[int] = None
+    estimated: bool = False
     
     def __init__(self, **data):
         super().__init__(**data)
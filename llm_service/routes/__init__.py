@@ -3,7 +3,9 @@ Routes package for the AI service.
 Contains all API endpoint definitions.
 """
 
+from .admin_routes import router as admin_router
 from .ai_routes import router as ai_router
 from .health_routes import router as health_router
+from .metrics_routes import router as metrics_router
 
-__all__ = ["ai_router", "health_router"] 
\ No newline at end of file
+__all__ = ["admin_router", "ai_router", "health_router", "metrics_router"] 
\ No newline at end of file
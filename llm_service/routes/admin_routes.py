@@ -0,0 +1,81 @@
+"""
+Admin and diagnostics routes for the AI service.
+Exposes the slow-request log and on-demand sampling profiling of upcoming requests.
+"""
+
+import hmac
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import HTMLResponse, PlainTextResponse
+
+from config import settings
+from models import ProfileRequest
+from services.profiler import RequestProfiler
+from services.tracing import RequestTracer
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+# Service instances
+tracer = RequestTracer(
+    export=settings.trace_export,
+    path=settings.trace_file,
+    sample_rate=settings.trace_sample_rate,
+    slow_ms=settings.slow_request_ms,
+    slow_log_size=settings.slow_request_log_size,
+    service_name=settings.otel_service_name,
+)
+profiler = RequestProfiler(max_reports=settings.profile_max_reports)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Allow the request only with the configured AI_ADMIN_TOKEN in X-Admin-Token."""
+    if not settings.admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (AI_ADMIN_TOKEN is not set)")
+    if not hmac.compare_digest((x_admin_token or "").encode("utf-8"), settings.admin_token.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@router.get("/traces/slow", dependencies=[Depends(require_admin)])
+async def slow_requests(limit: int = Query(20, ge=1, le=1000)):
+    """Return the most recent slow requests with their span breakdown, newest first."""
+    return {
+        **tracer.stats(),
+        "requests": tracer.slow_log.entries(limit) if tracer.slow_log is not None else [],
+    }
+
+
+@router.post("/admin/profile", dependencies=[Depends(require_admin)])
+async def start_profiling(request: ProfileRequest):
+    """Profile the next N requests with the sampling profiler."""
+    try:
+        profiler.arm(request.requests, interval_ms=request.interval_ms, path_prefix=request.path_prefix)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return profiler.stats()
+
+
+@router.delete("/admin/profile", dependencies=[Depends(require_admin)])
+async def stop_profiling():
+    """Stop profiling requests that have not started yet."""
+    profiler.disarm()
+    return profiler.stats()
+
+
+@router.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """Return profiler status and the kept reports, newest first."""
+    return {**profiler.stats(), "profiles": profiler.reports()}
+
+
+@router.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str, format: str = Query("text", pattern="^(text|html)$")) -> Response:
+    """Return one profile as a text call tree or as pyinstrument's interactive HTML page."""
+    report = profiler.render(profile_id, html=format == "html")
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "html":
+        return HTMLResponse(report)
+    return PlainTextResponse(report)
@@ -3,99 +3,758 @@ AI-related routes for the AI service.
 Contains endpoints for AI generation, processing, and context-aware operations.
 """
 
+import asyncio
+import contextlib
+import hashlib
+import hmac
 import logging
-from fastapi import APIRouter, HTTPException, Depends
+
+import orjson
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Optional
+from typing import Optional, AsyncIterator, Awaitable, Dict, Any, List, TypeVar
 
 from models import (
     AIGenerateRequest, 
+    AIBatchGenerateRequest,
+    AIBatchResponse,
     AIProcessRequest, 
     AIResponse, 
+    JobResponse,
+    RefineResponse,
+    RefineSessionRequest,
+    RefineTurnRequest,
     TaskContext, 
+    TaskEvent,
+    TaskEventResponse,
 )
-from services import AIService
+from services import AIService, metrics
+from services.deadline import deadline_scope
+from services.errors import DeadlineExceededError
+from services.job_queue import JobQueue
+from services.tenant import tenant_scope
 from config import settings
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
+T = TypeVar("T")
 security = HTTPBearer(auto_error=False)
 
 # Service instances
 ai_service = AIService()
 
 
+async def run_expand_job(payload: Dict[str, Any], caller: str) -> Dict[str, Any]:
+    """Run a queued expand job at background priority, billed to the submitting tenant."""
+    with tenant_scope(payload.get("tenant") or caller):
+        result = await ai_service.expand_description(
+            payload["content"],
+            cache_mode=payload["cache_mode"],
+            caller=caller,
+            background=True
+        )
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail="Failed to expand description")
+    return AIResponse(
+        success=True,
+        content=result["content"],
+        usage_info=result.get("usage_info"),
+        cached=result.get("cached", False),
+        cache_match=result.get("cache_match"),
+        similarity=result.get("similarity")
+    ).dict()
+
+
+async def run_pregenerate_job(payload: Dict[str, Any], caller: str) -> Dict[str, Any]:
+    """Generate a description ahead of the user asking, leaving it in the response cache."""
+    with tenant_scope(caller):
+        result = await ai_service.generate_description(
+            AIGenerateRequest(task=TaskContext(**payload["task"])),
+            caller=caller,
+            background=True
+        )
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail=result.get("error") or "Failed to pre-generate description")
+    return {"cached": result.get("cached", False), "character_count": result.get("character_count")}
+
+
+job_queue = JobQueue(
+    handlers={"expand": run_expand_job, "pregenerate": run_pregenerate_job},
+    workers=settings.job_workers,
+    max_queued=settings.job_queue_size,
+    result_ttl_seconds=settings.job_result_ttl_seconds,
+    sqlite_path=settings.job_sqlite_path or None,
+    stale_after_seconds=settings.max_generation_seconds,
+)
+
+
+def resolve_cache_mode(cache_control: Optional[str], x_ai_cache: Optional[str]) -> str:
+    """Map per-request cache headers to an AIService cache mode."""
+    directives = {d.strip().lower() for d in (cache_control or "").split(",")}
+    override = (x_ai_cache or "").strip().lower()
+    if "no-store" in directives or override == "bypass":
+        return "bypass"
+    if "no-cache" in directives or override == "refresh":
+        return "refresh"
+    return "use"
+
+
+def prompt_etag(*cache_keys: str) -> str:
+    """ETag for content generated from these prompts, keyed on their cache keys (the prompt hash)."""
+    if len(cache_keys) == 1:
+        return f'"{cache_keys[0][:32]}"'
+    return f'"{hashlib.sha256("".join(cache_keys).encode("utf-8")).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an ETag against an If-None-Match header."""
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip() for candidate in if_none_match.split(",")}
+    if "*" in candidates:
+        return True
+    return etag in {candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates}
+
+
+def not_modified(
+    operation: str,
+    etag: str,
+    if_none_match: Optional[str],
+    cache_mode: str
+) -> Optional[Response]:
+    """
+    A 304 for a caller that already holds content generated from this prompt.
+
+    The ETag names the prompt rather than the exact text, so a match skips
+    generation entirely. Callers asking for fresh content (no-cache/no-store)
+    never get a 304.
+    """
+    if cache_mode != "use" or not etag_matches(if_none_match, etag):
+        return None
+    metrics.NOT_MODIFIED.labels(operation).inc()
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+def caller_id(credentials: Optional[HTTPAuthorizationCredentials]) -> str:
+    """Stable, non-reversible caller label derived from the bearer token."""
+    if credentials is None or not credentials.credentials:
+        return "anonymous"
+    return hashlib.sha256(credentials.credentials.encode("utf-8")).hexdigest()[:12]
+
+
+def tenant_id(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    x_project_id: Optional[str] = Header(None)
+) -> str:
+    """
+    Tenant a request is scheduled and billed under for fair admission.
+
+    The caller (bearer token) by default; with AI_TENANT_KEY=project, the
+    X-Project-Id header when present, so a project's users share one quota.
+    """
+    if settings.tenant_key == "project" and x_project_id and x_project_id.strip():
+        return f"project:{x_project_id.strip()[:64]}"
+    return caller_id(credentials)
+
+
+async def wait_for_disconnect(http_request: Request):
+    """Return once the client has gone away."""
+    while True:
+        message = await http_request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def run_cancellable(
+    http_request: Request,
+    work: Awaitable[T],
+    timeout: Optional[float],
+    operation: str,
+    tenant: Optional[str] = None
+) -> T:
+    """
+    Run service work under the caller's deadline (X-Request-Timeout, seconds) and tenant.
+
+    If the client disconnects first, the work is cancelled so upstream calls,
+    backoff sleeps and queue slots are released instead of finishing for nobody.
+    """
+    with deadline_scope(timeout), tenant_scope(tenant):
+        task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(wait_for_disconnect(http_request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+            metrics.CANCELLED_REQUESTS.labels(operation, "disconnect").inc()
+            logger.info(f"🔌 Client disconnected, cancelled {operation} request")
+            # Let the work unwind before looking at its outcome
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    if task.cancelled():
+        raise HTTPException(status_code=499, detail="Client closed request")
+    if isinstance(task.exception(), DeadlineExceededError):
+        metrics.CANCELLED_REQUESTS.labels(operation, "deadline").inc()
+    return task.result()
+
+
+async def sse_events(
+    events: AsyncIterator[Dict[str, Any]],
+    tracker: metrics.RequestTracker
+) -> AsyncIterator[str]:
+    """Format AIService stream events as server-sent events."""
+    status = "error"
+    try:
+        async for event in events:
+            event_type = event.pop("type")
+            yield f"event: {event_type}\ndata: {orjson.dumps(event).decode()}\n\n"
+        status = "success"
+    except HTTPException as e:
+        if isinstance(e, DeadlineExceededError):
+            metrics.CANCELLED_REQUESTS.labels(tracker.operation, "deadline").inc()
+        yield f"event: error\ndata: {orjson.dumps({'success': False, 'error': e.detail}).decode()}\n\n"
+    except Exception as e:
+        logger.error(f"Error while streaming: {e}")
+        yield f"event: error\ndata: {orjson.dumps({'success': False, 'error': str(e)}).decode()}\n\n"
+    finally:
+        tracker.finish(status)
+
+
+async def sse_response(
+    events: AsyncIterator[Dict[str, Any]],
+    operation: str,
+    timeout: Optional[float] = None,
+    tenant: Optional[str] = None
+) -> StreamingResponse:
+    """
+    Wrap a stream of AIService events in an SSE response.
+
+    The first event is awaited before responding, so failures that happen before
+    any output (e.g. admission rejected) are returned with their HTTP status.
+    The stream picks up the caller's deadline and tenant when it starts. A client disconnect
+    cancels the stream, which closes the upstream connection.
+    """
+    if not settings.is_configured:
+        raise HTTPException(status_code=500, detail="AI service not configured - missing API key")
+
+    tracker = metrics.RequestTracker(operation)
+    try:
+        with deadline_scope(timeout), tenant_scope(tenant):
+            first = await events.__anext__()
+    except DeadlineExceededError:
+        tracker.finish("error")
+        metrics.CANCELLED_REQUESTS.labels(operation, "deadline").inc()
+        raise
+    except HTTPException:
+        tracker.finish("error")
+        raise
+    except Exception as e:
+        tracker.finish("error")
+        logger.error(f"Error starting stream: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def replay() -> AsyncIterator[Dict[str, Any]]:
+        yield first
+        async for event in events:
+            yield event
+
+    return StreamingResponse(
+        sse_events(replay(), tracker),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/generate-description", response_model=AIResponse)
 async def generate_description(
     request: AIGenerateRequest,
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+    http_request: Request,
+    response: Response,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    tenant: str = Depends(tenant_id),
+    cache_control: Optional[str] = Header(None),
+    x_ai_cache: Optional[str] = Header(None),
+    x_request_timeout: Optional[float] = Header(None, gt=0),
+    if_none_match: Optional[str] = Header(None)
 ):
     """Generate a comprehensive task description using project context."""
-    try:
-        logger.info(f"Generating description for task: {request.task.title}")
+    with metrics.track_request("generate"):
+        try:
+            cache_mode = resolve_cache_mode(cache_control, x_ai_cache)
+            etag = prompt_etag(ai_service.description_cache_key(request))
+            unchanged = not_modified("generate", etag, if_none_match, cache_mode)
+            if unchanged is not None:
+                return unchanged
+
+            logger.info(f"Generating description for task: {request.task.title}")
         
-        # Generate with AI service
-        result = await ai_service.generate_description(request)
+            # Generate with AI service
+            result = await run_cancellable(http_request, ai_service.generate_description(
+                request,
+                cache_mode=cache_mode,
+                caller=caller_id(credentials)
+            ), x_request_timeout, "generate", tenant)
         
-        if result["success"]:
-            return AIResponse(
-                success=True,
-                content=result["content"],
-                usage_info=result.get("usage_info")
-            )
-        else:
-            raise HTTPException(status_code=500, detail="Failed to generate description")
+            if result["success"]:
+                response.headers["ETag"] = etag
+                return AIResponse(
+                    success=True,
+                    content=result["content"],
+                    usage_info=result.get("usage_info"),
+                    cached=result.get("cached", False),
+                    cache_match=result.get("cache_match"),
+                    similarity=result.get("similarity"),
+                    structured=result.get("structured")
+                )
+            else:
+                raise HTTPException(status_code=500, detail="Failed to generate description")
             
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in generate_description: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error in generate_description: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/generate-descriptions:batch", response_model=AIBatchResponse)
+async def generate_descriptions_batch(
+    request: AIBatchGenerateRequest,
+    http_request: Request,
+    response: Response,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    tenant: str = Depends(tenant_id),
+    cache_control: Optional[str] = Header(None),
+    x_ai_cache: Optional[str] = Header(None),
+    x_request_timeout: Optional[float] = Header(None, gt=0),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Generate descriptions for a list of tasks; results are returned in request order."""
+    if len(request.tasks) > settings.batch_max_tasks:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch size {len(request.tasks)} exceeds the limit of {settings.batch_max_tasks} tasks"
+        )
+    if not settings.is_configured:
+        raise HTTPException(status_code=500, detail="AI service not configured - missing API key")
+
+    with metrics.track_request("batch"):
+        try:
+            cache_mode = resolve_cache_mode(cache_control, x_ai_cache)
+            etag = prompt_etag(*[
+                ai_service.description_cache_key(AIGenerateRequest(task=task))
+                for task in request.tasks
+            ])
+            unchanged = not_modified("batch", etag, if_none_match, cache_mode)
+            if unchanged is not None:
+                return unchanged
+
+            logger.info(f"Generating descriptions for {len(request.tasks)} tasks (pack={request.pack})")
+
+            results = await run_cancellable(http_request, ai_service.generate_descriptions_batch(
+                request.tasks,
+                pack=request.pack,
+                cache_mode=cache_mode,
+                caller=caller_id(credentials)
+            ), x_request_timeout, "batch", tenant)
+
+            # Only a fully successful batch is worth revalidating later
+            if all(result.get("success") for result in results):
+                response.headers["ETag"] = etag
+            return AIBatchResponse(results=[
+                AIResponse(
+                    success=result.get("success", False),
+                    content=result.get("content", ""),
+                    usage_info=result.get("usage_info"),
+                    error=result.get("error"),
+                    cached=result.get("cached", False),
+                    cache_match=result.get("cache_match"),
+                    similarity=result.get("similarity"),
+                    structured=result.get("structured")
+                )
+                for result in results
+            ])
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error in generate_descriptions_batch: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/generate-description/stream")
+async def generate_description_stream(
+    request: AIGenerateRequest,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    tenant: str = Depends(tenant_id),
+    cache_control: Optional[str] = Header(None),
+    x_ai_cache: Optional[str] = Header(None),
+    x_request_timeout: Optional[float] = Header(None, gt=0)
+):
+    """Stream a task description as server-sent events."""
+    logger.info(f"Streaming description for task: {request.task.title}")
+    return await sse_response(ai_service.stream_description(
+        request,
+        cache_mode=resolve_cache_mode(cache_control, x_ai_cache),
+        caller=caller_id(credentials)
+    ), "generate", x_request_timeout, tenant)
 
 
 @router.post("/shorten-description", response_model=AIResponse)
-async def shorten_description(request: AIProcessRequest):
+async def shorten_description(
+    request: AIProcessRequest,
+    http_request: Request,
+    response: Response,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    tenant: str = Depends(tenant_id),
+    cache_control: Optional[str] = Header(None),
+    x_ai_cache: Optional[str] = Header(None),
+    x_request_timeout: Optional[float] = Header(None, gt=0),
+    if_none_match: Optional[str] = Header(None)
+):
     """Shorten an existing task description while preserving key information."""
-    try:
-        logger.info("Shortening task description")
+    with metrics.track_request("shorten"):
+        try:
+            cache_mode = resolve_cache_mode(cache_control, x_ai_cache)
+            etag = prompt_etag(ai_service.cache_key_for(ai_service.create_shorten_prompt(request.content)))
+            unchanged = not_modified("shorten", etag, if_none_match, cache_mode)
+            if unchanged is not None:
+                return unchanged
+
+            logger.info("Shortening task description")
         
-        result = await ai_service.shorten_description(request.content)
+            result = await run_cancellable(http_request, ai_service.shorten_description(
+                request.content,
+                cache_mode=cache_mode,
+                caller=caller_id(credentials)
+            ), x_request_timeout, "shorten", tenant)
         
-        if result["success"]:
-            return AIResponse(
-                success=True,
-                content=result["content"],
-                usage_info=result.get("usage_info")
-            )
-        else:
-            raise HTTPException(status_code=500, detail="Failed to shorten description")
+            if result["success"]:
+                response.headers["ETag"] = etag
+                return AIResponse(
+                    success=True,
+                    content=result["content"],
+                    usage_info=result.get("usage_info"),
+                    cached=result.get("cached", False),
+                    cache_match=result.get("cache_match"),
+                    similarity=result.get("similarity")
+                )
+            else:
+                raise HTTPException(status_code=500, detail="Failed to shorten description")
             
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in shorten_description: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error in shorten_description: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/expand-description", response_model=AIResponse)
-async def expand_description(request: AIProcessRequest):
+async def expand_description(
+    request: AIProcessRequest,
+    http_request: Request,
+    response: Response,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    tenant: str = Depends(tenant_id),
+    cache_control: Optional[str] = Header(None),
+    x_ai_cache: Optional[str] = Header(None),
+    x_request_timeout: Optional[float] = Header(None, gt=0),
+    if_none_match: Optional[str] = Header(None)
+):
     """Expand an existing task description with additional details and considerations."""
-    try:
-        logger.info("Expanding task description")
+    with metrics.track_request("expand"):
+        try:
+            cache_mode = resolve_cache_mode(cache_control, x_ai_cache)
+            etag = prompt_etag(ai_service.cache_key_for(ai_service.create_expand_prompt(request.content)))
+            unchanged = not_modified("expand", etag, if_none_match, cache_mode)
+            if unchanged is not None:
+                return unchanged
+
+            logger.info("Expanding task description")
         
-        result = await ai_service.expand_description(request.content)
+            result = await run_cancellable(http_request, ai_service.expand_description(
+                request.content,
+                cache_mode=cache_mode,
+                caller=caller_id(credentials)
+            ), x_request_timeout, "expand", tenant)
         
-        if result["success"]:
-            return AIResponse(
-                success=True,
-                content=result["content"],
-                usage_info=result.get("usage_info")
-            )
-        else:
-            raise HTTPException(status_code=500, detail="Failed to expand description")
+            if result["success"]:
+                response.headers["ETag"] = etag
+                return AIResponse(
+                    success=True,
+                    content=result["content"],
+                    usage_info=result.get("usage_info"),
+                    cached=result.get("cached", False),
+                    cache_match=result.get("cache_match"),
+                    similarity=result.get("similarity")
+                )
+            else:
+                raise HTTPException(status_code=500, detail="Failed to expand description")
             
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in expand_description: {e}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error in expand_description: {e}")
+            raise HTTPException(status_code=500, detail=str(e)) 
+
+
+@router.post("/expand-description/stream")
+async def expand_description_stream(
+    request: AIProcessRequest,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    tenant: str = Depends(tenant_id),
+    cache_control: Optional[str] = Header(None),
+    x_ai_cache: Optional[str] = Header(None),
+    x_request_timeout: Optional[float] = Header(None, gt=0)
+):
+    """Stream an expanded task description as server-sent events."""
+    logger.info("Streaming expanded task description")
+    return await sse_response(ai_service.stream_expanded_description(
+        request.content,
+        cache_mode=resolve_cache_mode(cache_control, x_ai_cache),
+        caller=caller_id(credentials)
+    ), "expand", x_request_timeout, tenant)
+
+
+@router.post("/expand-description/jobs", response_model=JobResponse, status_code=202)
+async def submit_expand_job(
+    request: AIProcessRequest,
+    response: Response,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    tenant: str = Depends(tenant_id),
+    cache_control: Optional[str] = Header(None),
+    x_ai_cache: Optional[str] = Header(None),
+    priority: str = Query("normal", pattern="^(high|normal|low)$")
+):
+    """Queue an expand request and return its job id without waiting for the result."""
+    if not settings.is_configured:
+        raise HTTPException(status_code=500, detail="AI service not configured - missing API key")
+
+    job = await job_queue.submit(
+        "expand",
+        {
+            "content": request.content,
+            "cache_mode": resolve_cache_mode(cache_control, x_ai_cache),
+            "tenant": tenant,
+        },
+        caller=caller_id(credentials),
+        priority=priority
+    )
+    logger.info(f"📥 Queued expand job {job.id} (priority={priority})")
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return JobResponse(**job.to_dict())
+
+
+@router.post("/events/task", response_model=TaskEventResponse, status_code=202)
+async def task_event(
+    event: TaskEvent,
+    x_webhook_secret: Optional[str] = Header(None)
+):
+    """
+    Webhook for task created / stage changed events from the ProjectHub backend.
+
+    Queues a low-priority generation of the task's description so the user's
+    later /generate-description call is served from the cache. Events are
+    acknowledged even when no generation is queued; the reason says why.
+    The job is internal and cannot be polled, so no job id is returned.
+    """
+    if not settings.webhook_secret:
+        raise HTTPException(status_code=503, detail="Task events are disabled (AI_WEBHOOK_SECRET is not set)")
+    if not hmac.compare_digest((x_webhook_secret or "").encode("utf-8"), settings.webhook_secret.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid webhook secret")
+
+    reason = None
+    if not settings.pregenerate_enabled:
+        reason = "disabled"
+    elif not settings.is_configured:
+        reason = "not_configured"
+    elif not ai_service.caching:
+        reason = "cache_disabled"
+    elif not ai_service.upstream_available():
+        reason = "upstream_unavailable"
+
+    job = None
+    if reason is None:
+        try:
+            job = await job_queue.submit(
+                "pregenerate",
+                {"task": event.task.dict()},
+                caller="pregenerate",
+                priority="low",
+                limit=settings.pregenerate_max_queued
+            )
+        except HTTPException:
+            # Speculative work is the first thing to shed; the backend should not retry it
+            reason = "queue_full"
+
+    metrics.PREGENERATIONS.labels(event.event, reason or "queued").inc()
+    if job is None:
+        return TaskEventResponse(accepted=False, reason=reason)
+    logger.info(f"🔮 Queued pre-generation job {job.id} for task {event.task_id or event.task.title} ({event.event})")
+    return TaskEventResponse(accepted=True)
+
+
+@router.post("/refine/sessions", response_model=RefineResponse, status_code=201)
+async def start_refine_session(
+    request: RefineSessionRequest,
+    http_request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    tenant: str = Depends(tenant_id),
+    cache_control: Optional[str] = Header(None),
+    x_ai_cache: Optional[str] = Header(None),
+    x_request_timeout: Optional[float] = Header(None, gt=0)
+):
+    """Open a refine session on a description, running the first instruction if one is given."""
+    with metrics.track_request("refine"):
+        try:
+            result = await run_cancellable(http_request, ai_service.start_refine_session(
+                request.content,
+                caller=caller_id(credentials),
+                instruction=request.instruction,
+                cache_mode=resolve_cache_mode(cache_control, x_ai_cache)
+            ), x_request_timeout, "refine", tenant)
+            return RefineResponse(**result)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error in start_refine_session: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/refine/sessions/{session_id}/turns", response_model=RefineResponse)
+async def refine_turn(
+    session_id: str,
+    request: RefineTurnRequest,
+    http_request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    tenant: str = Depends(tenant_id),
+    cache_control: Optional[str] = Header(None),
+    x_ai_cache: Optional[str] = Header(None),
+    x_request_timeout: Optional[float] = Header(None, gt=0)
+):
+    """
+    Apply the user's edits and/or an instruction to a session's draft.
+
+    Follow-up instructions send only the instruction and a short chat history
+    upstream instead of the whole description.
+    """
+    with metrics.track_request("refine"):
+        try:
+            result = await run_cancellable(http_request, ai_service.refine_description(
+                session_id,
+                caller=caller_id(credentials),
+                instruction=request.instruction,
+                edits=[edit.dict() for edit in request.edits],
+                base_version=request.base_version,
+                cache_mode=resolve_cache_mode(cache_control, x_ai_cache)
+            ), x_request_timeout, "refine", tenant)
+            return RefineResponse(**result)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error in refine_turn: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/refine/stats")
+async def refine_stats():
+    """Return refine session store statistics."""
+    return ai_service.refine_stats()
+
+
+@router.get("/refine/sessions/{session_id}", response_model=RefineResponse)
+async def get_refine_session(
+    session_id: str,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+):
+    """Return a refine session's current draft and version."""
+    return RefineResponse(**await ai_service.get_refine_session(session_id, caller=caller_id(credentials)))
+
+
+@router.delete("/refine/sessions/{session_id}", status_code=204)
+async def end_refine_session(
+    session_id: str,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+):
+    """Close a refine session before it expires."""
+    await ai_service.end_refine_session(session_id, caller=caller_id(credentials))
+    return Response(status_code=204)
+
+
+@router.get("/jobs/stats")
+async def job_stats():
+    """Return background job queue statistics."""
+    return job_queue.stats()
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: str,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+):
+    """Return a job's status, and its result once finished."""
+    job = await job_queue.get(job_id, caller=caller_id(credentials))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobResponse(**job.to_dict())
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(
+    job_id: str,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+):
+    """Stream a job's status changes as server-sent events until it finishes."""
+    job = await job_queue.get(job_id, caller=caller_id(credentials))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events() -> AsyncIterator[str]:
+        async for state in job_queue.watch(job):
+            yield f"event: {state['status']}\ndata: {orjson.dumps(state).decode()}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Return response cache hit/miss metrics."""
+    return ai_service.cache_stats()
+
+
+@router.get("/upstream/stats")
+async def upstream_stats():
+    """Return per-model latency, error, hedge and fallback metrics."""
+    return ai_service.upstream_stats()
+
+
+@router.get("/rate-limit/stats")
+async def rate_limit_stats():
+    """Return admission control queue depth and wait-time metrics."""
+    return ai_service.admission_stats()
+
+
+@router.get("/tenants/stats")
+async def tenant_stats():
+    """Return per-tenant usage, quota rejections and admission queue-wait metrics."""
+    return ai_service.tenant_stats()
+
+
+@router.get("/usage")
+async def usage(window: Optional[List[int]] = Query(None)):
+    """Return token usage per operation and caller, cumulative and over time windows (seconds)."""
+    windows = window or [
+        seconds for seconds in (60, 3600, 86400) if seconds <= settings.usage_retention_seconds
+    ] or [settings.usage_retention_seconds]
+    if min(windows) < 1 or max(windows) > settings.usage_retention_seconds:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Windows must be between 1 and {settings.usage_retention_seconds} seconds"
+        )
+    return ai_service.usage_report(windows)
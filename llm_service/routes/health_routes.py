@@ -6,7 +6,8 @@ from fastapi import APIRouter
 from datetime import datetime
 
 from config import settings
-from models import HealthResponse
+from models import HealthResponse, UpstreamHealth
+from routes.ai_routes import ai_service
 
 router = APIRouter()
 
@@ -35,11 +36,22 @@ async def health_check():
             "get_api_key": "https://makersuite.google.com/app/apikey"
         }
     
+    # Still 200 while the circuit is open: this instance is fine, and callers can
+    # degrade (serve cached text, hide AI actions) until upstream recovers
+    status = "healthy"
+    upstream = None
+    circuit = ai_service.circuit_stats()
+    if circuit is not None:
+        upstream = UpstreamHealth(**circuit)
+        if circuit["state"] != "closed":
+            status = "degraded"
+
     return HealthResponse(
-        status="healthy",
+        status=status,
         timestamp=datetime.utcnow().isoformat(),
         gemini_status=gemini_status,
         api_key_preview=settings.api_key_preview,
         backend_url=settings.backend_api_url,
-        instructions=instructions
-    ) 
\ No newline at end of file
+        instructions=instructions,
+        upstream=upstream
+    )
@@ -0,0 +1,26 @@
+"""
+Metrics routes for the AI service.
+Exposes Prometheus metrics for scraping.
+"""
+
+import os
+
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+
+router = APIRouter()
+
+
+def metrics_registry():
+    """Aggregate every worker's metrics when running under a multi-process server."""
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus metrics endpoint."""
+    return Response(content=generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST)
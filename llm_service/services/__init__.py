@@ -4,5 +4,6 @@ Contains business logic and external service integrations.
 """
 
 from .ai_service import AIService
+from . import metrics
 
-__all__ = ["AIService"] 
\ No newline at end of file
+__all__ = ["AIService", "metrics"] 
\ No newline at end of file
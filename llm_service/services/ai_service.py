@@ -3,163 +3,870 @@ AI Service module for Google Gemini integration.
 Handles AI model communication and response processing.
 """
 
-import google.generativeai as genai
 import asyncio
+import json
 import logging
-from typing import Dict, Any
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator, List, Optional
 from fastapi import HTTPException
 
 from config import settings
-from models import AIGenerateRequest, UsageInfo
+from models import AIGenerateRequest, TaskContext, UsageInfo
+from . import metrics, tracing
+from .cache_service import ResponseCache, make_cache_key
+from .circuit_breaker import CLOSED, CircuitBreaker
+from .deadline import current_deadline, enforce_deadline, remaining
+from .errors import DeadlineExceededError, TenantQuotaExceededError, UpstreamUnavailableError
+from .gemini_client import GeminiClient, GeminiAPIError
+from .prompt_templates import RenderedPrompt, get_template, stage_category
+from .rate_limiter import AdmissionController
+from .semantic_cache import SemanticCache, SemanticQuery
+from .session_store import SessionStore, apply_edits, new_session
+from .shared_state import SharedSingleFlight, create_backend
+from .singleflight import SingleFlight
+from .structured_output import DESCRIPTION_SCHEMA, output_token_budget, parse_description, render_description
+from .tenant import current_tenant
+from .traffic_log import RecordingClient, ReplayClient, TrafficRecorder
+from .upstream_router import UpstreamRouter
+from .usage_tracker import UsageTracker, build_usage_info, estimate_tokens, split_usage
 
 logger = logging.getLogger(__name__)
 
+# Maximum stored description length (database limit)
+MAX_DESCRIPTION_LENGTH = 400
+
+# generate in structured mode: JSON fields, with an output budget sized to the stored length
+STRUCTURED_OVERRIDES = {
+    "responseMimeType": "application/json",
+    "responseSchema": DESCRIPTION_SCHEMA,
+    "maxOutputTokens": output_token_budget(MAX_DESCRIPTION_LENGTH),
+}
+
+# Upstream failures worth retrying (None = network error or empty response)
+RETRYABLE_STATUS_CODES = {None, 429, 500, 502, 503, 504}
+
+# Packed batches are the most expensive calls; a duplicate would double the largest token spend
+UNHEDGED_OPERATIONS = {"batch"}
+
 
 class AIService:
     """Service class for AI operations using Google Gemini."""
     
     def __init__(self):
-        if settings.is_configured:
-            genai.configure(api_key=settings.google_api_key)
-            self._model = genai.GenerativeModel(settings.model_name)
+        if settings.replay_path:
+            self._client = ReplayClient(
+                settings.replay_path,
+                latency_scale=settings.replay_latency_scale,
+                on_miss=settings.replay_miss,
+            )
+        elif settings.is_configured:
+            self._client = GeminiClient(
+                api_key=settings.google_api_key,
+                base_url=settings.gemini_api_base_url,
+                timeout_seconds=settings.request_timeout / 1000,
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive_connections,
+            )
         else:
-            self._model = None
+            self._client = None
             logger.warning("AI Service initialized without valid API key")
+        if self._client is not None and settings.record_path:
+            self._client = RecordingClient(self._client, TrafficRecorder(settings.record_path))
+
+        self._router = UpstreamRouter(
+            primary_model=settings.model_name,
+            fallback_model=settings.fallback_model_name or None,
+            hedge_enabled=settings.hedge_enabled,
+            hedge_quantile=settings.hedge_quantile,
+            hedge_min_delay=settings.hedge_min_delay_ms / 1000,
+            hedge_default_delay=settings.hedge_default_delay_ms / 1000,
+            fallback_error_rate=settings.fallback_error_rate,
+            error_window_seconds=settings.fallback_window_seconds,
+        )
+
+        if settings.breaker_enabled:
+            self._breaker = CircuitBreaker(
+                error_rate=settings.breaker_error_rate,
+                min_calls=settings.breaker_min_calls,
+                window_seconds=settings.breaker_window_seconds,
+                open_seconds=settings.breaker_open_seconds,
+                probe_calls=settings.breaker_probe_calls,
+            )
+        else:
+            self._breaker = None
+
+        # Cache, cross-worker coalescing and admission budget are shared through this backend
+        self._state = create_backend(
+            settings.state_backend,
+            sqlite_path=settings.state_sqlite_path,
+            redis_url=settings.redis_url,
+        )
+
+        # Bounds concurrent upstream calls independently of any thread pool
+        self._upstream_slots = asyncio.Semaphore(settings.max_concurrent_requests)
+        metrics.UPSTREAM_SLOTS_LIMIT.set(settings.max_concurrent_requests)
+
+        if settings.cache_enabled:
+            self._cache = ResponseCache(
+                max_entries=settings.cache_max_entries,
+                ttl_seconds=settings.cache_ttl_seconds,
+                sqlite_path=settings.cache_sqlite_path or None,
+                backend=self._state,
+            )
+        else:
+            self._cache = None
+
+        if settings.semantic_cache_enabled:
+            self._semantic_cache = SemanticCache(
+                threshold=settings.semantic_cache_threshold,
+                max_entries_per_group=settings.semantic_cache_max_entries,
+                ttl_seconds=settings.cache_ttl_seconds,
+                dim=settings.semantic_cache_dim,
+            )
+        else:
+            self._semantic_cache = None
+
+        self._inflight = SingleFlight()
+        if self._state.shared:
+            # Held for as long as a leader's call can take, retries included
+            self._shared_inflight = SharedSingleFlight(
+                self._state,
+                lock_ttl_seconds=settings.max_generation_seconds,
+            )
+        else:
+            self._shared_inflight = None
+        self._sessions = SessionStore(
+            max_sessions=settings.refine_max_sessions,
+            ttl_seconds=settings.refine_session_ttl_seconds,
+            backend=self._state,
+        )
+        self._usage = UsageTracker(
+            retention_seconds=settings.usage_retention_seconds,
+            max_events=settings.usage_max_events,
+            max_callers=settings.usage_max_callers,
+        )
+
+        if settings.rate_limit_rpm > 0:
+            self._admission = AdmissionController(
+                requests_per_minute=settings.rate_limit_rpm,
+                tokens_per_minute=settings.rate_limit_tpm,
+                max_queue=settings.admission_queue_size,
+                max_wait_seconds=settings.admission_max_wait_seconds,
+                backend=self._state,
+                tenant_requests_per_minute=settings.tenant_rpm,
+                tenant_tokens_per_minute=settings.tenant_tpm,
+                tenant_max_queue=settings.tenant_max_queue,
+                tenant_weights=settings.tenant_weights,
+                fair_quantum=settings.fair_quantum_tokens,
+            )
+        else:
+            self._admission = None
     
-    def _create_generation_config(self) -> genai.types.GenerationConfig:
+    def _create_generation_config(self, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Create generation configuration for Gemini."""
-        return genai.types.GenerationConfig(
-            temperature=settings.model_temperature,
-            top_p=settings.model_top_p,
-            top_k=settings.model_top_k,
-            max_output_tokens=settings.model_max_tokens,
+        config = {
+            "temperature": settings.model_temperature,
+            "topP": settings.model_top_p,
+            "topK": settings.model_top_k,
+            "maxOutputTokens": settings.model_max_tokens,
+        }
+        if overrides:
+            config.update(overrides)
+        return config
+
+    def cache_key_for(
+        self,
+        prompt: RenderedPrompt,
+        generation_overrides: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Return the cache/coalescing key generate_content uses for a prompt."""
+        return make_cache_key(
+            prompt.text,
+            settings.model_name,
+            self._create_generation_config(generation_overrides),
+            prompt.system_instruction,
         )
     
-    def create_comprehensive_context_prompt(self, request: AIGenerateRequest) -> str:
+    def create_comprehensive_context_prompt(self, request: AIGenerateRequest) -> RenderedPrompt:
         """Create a detailed context prompt for Gemini."""
-        
         task = request.task
-        
-        # Build the base prompt
-        prompt = f"""
-You are an expert project management assistant. Generate a detailed, actionable task description.
+        existing = ""
+        if task.description and task.description.strip():
+            existing = f"\n- Existing Description: {task.description}"
+        return get_template("generate", task.stage).render(
+            title=task.title, stage=task.stage, existing=existing
+        )
+    
+    def create_structured_prompt(self, request: AIGenerateRequest) -> RenderedPrompt:
+        """Create the prompt asking for the description as purpose / requirements / acceptance criteria JSON."""
+        task = request.task
+        existing = ""
+        if task.description and task.description.strip():
+            existing = f"\n- Existing Description: {task.description}"
+        return get_template("generate_structured", task.stage).render(
+            title=task.title, stage=task.stage, existing=existing
+        )
 
-CRITICAL REQUIREMENT: The description MUST be concise, between 250-400 characters, and focus ONLY on the specific task scope (no project-wide objectives).
+    def description_cache_key(self, request: AIGenerateRequest) -> str:
+        """Return the cache key generate_description first looks up for a request."""
+        if settings.structured_output:
+            return self.cache_key_for(self.create_structured_prompt(request), STRUCTURED_OVERRIDES)
+        return self.cache_key_for(self.create_comprehensive_context_prompt(request))
 
-TASK DETAILS:
-- Title: {task.title}
-- Current Stage: {task.stage}"""
+    @staticmethod
+    def semantic_query_for(task: TaskContext, structured: bool = False) -> SemanticQuery:
+        """Near-duplicate tasks are matched on title and description within a stage category."""
+        group = stage_category(task.stage)
+        return SemanticQuery(
+            # Structured answers are JSON, so they never stand in for free-text ones
+            group=f"structured:{group}" if structured else group,
+            text=f"{task.title}\n{task.description or ''}",
+        )
 
-        # Include existing description if provided
-        if task.description and task.description.strip():
-            prompt += f"""
-- Existing Description: {task.description}"""
+    async def warm_up(self):
+        """Do first-request work ahead of traffic: load lazy modules and open the upstream connection."""
+        started = time.perf_counter()
+        if self._semantic_cache is not None:
+            self._semantic_cache.warm_up()
+        if self._client is not None:
+            try:
+                await self._client.warm_up(settings.model_name)
+            except GeminiAPIError as e:
+                logger.warning(f"⚠️  Upstream warm-up failed: {e}")
+        logger.info(f"🔥 Warm-up finished in {time.perf_counter() - started:.2f}s")
 
-        prompt += f"""
+    async def aclose(self):
+        """Release pooled upstream connections and the shared state backend."""
+        if self._client is not None:
+            await self._client.aclose()
+        await self._state.aclose()
 
-INSTRUCTIONS:
-Write a laconic, well-scoped description that is actionable for the assignee.
-IMPORTANT: Keep the final description between 250-400 characters total.
+    def usage_report(self, windows: List[int]) -> Dict[str, Any]:
+        """Return cumulative token usage plus usage over each requested window (seconds)."""
+        return {
+            "cumulative": self._usage.cumulative(),
+            "windows": {str(seconds): self._usage.window(seconds) for seconds in windows},
+        }
 
-"""
+    def upstream_stats(self) -> Dict[str, Any]:
+        """Return per-model latency, error, hedge and fallback statistics."""
+        return {**self._router.stats(), "circuit": self.circuit_stats(), "traffic": self.traffic_stats()}
 
-        # Add stage-specific instructions
-        if task.stage.lower() in ['to do', 'todo', 'planned', 'backlog']:
-            prompt += f"""Since this task is in "{task.stage}" stage, focus on:
-- Planning and preparation steps
-- Requirements analysis
-- Dependency identification
-- Initial approach definition"""
-        elif task.stage.lower() in ['in progress', 'development', 'working', 'active']:
-            prompt += f"""Since this task is in "{task.stage}" stage, focus on:
-- Current implementation details
-- Progress tracking
-- Active development steps
-- Immediate next actions"""
-        elif task.stage.lower() in ['in review', 'review', 'testing', 'qa']:
-            prompt += f"""Since this task is in "{task.stage}" stage, focus on:
-- Review criteria and checklist
-- Testing requirements
-- Quality assurance steps
-- Approval process"""
-        elif task.stage.lower() in ['done', 'completed', 'finished']:
-            prompt += f"""Since this task is in "{task.stage}" stage, focus on:
-- Completion verification
-- Final deliverables
-- Documentation updates
-- Closure activities"""
-        else:
-            prompt += f"""Since this task is in "{task.stage}" stage, provide appropriate guidance for this specific stage."""
+    def traffic_stats(self) -> Optional[Dict[str, Any]]:
+        """Return record/replay counters, or None when calls go straight to Gemini."""
+        if isinstance(self._client, (RecordingClient, ReplayClient)):
+            return self._client.stats()
+        return None
 
-        prompt += """
+    @property
+    def caching(self) -> bool:
+        """Whether generated results are kept for later identical requests."""
+        return self._cache is not None
 
-Create a comprehensive task description that includes:
+    def upstream_available(self) -> bool:
+        """Whether upstream calls are being let through (the circuit is not open or probing)."""
+        return self._breaker is None or self._breaker.is_closed()
 
-1. **Purpose & Objective**: What needs to be accomplished and why
-2. **Specific Requirements**: Clear, actionable steps or deliverables
-3. **Acceptance Criteria**: How to know when the task is complete
-4. **Technical Considerations**: Implementation details, dependencies, or constraints
+    def circuit_stats(self) -> Optional[Dict[str, Any]]:
+        """Return the circuit breaker's state, error rate and latency, or None if it is disabled."""
+        if self._breaker is None:
+            return None
+        return self._breaker.stats()
 
-Guidelines:
-- Be specific and actionable, not generic
-- Include concrete steps or deliverables
-- Build upon any existing description provided
-- Make it immediately actionable for a developer/team member
-- Focus on practical implementation details
-- Avoid vague phrases like "provide feedback" or "based on requirements"
-- CRITICAL: Final description must be 250-400 characters (count carefully!)
+    def admission_stats(self) -> Dict[str, Any]:
+        """Return admission control (rate limiter) statistics."""
+        if self._admission is None:
+            return {"enabled": False}
+        return {"enabled": True, **self._admission.stats()}
 
-Generate a professional, detailed description that a team member can immediately understand and act upon.
-"""
-        
-        return prompt
-    
-    async def generate_content(self, prompt: str, max_retries: int = None) -> Dict[str, Any]:
-        """Generate content using Google Gemini with retry logic."""
+    def refine_stats(self) -> Dict[str, Any]:
+        """Return refine session store statistics."""
+        return self._sessions.stats()
+
+    def tenant_stats(self) -> Dict[str, Any]:
+        """Return per-tenant admission, quota and queue-wait statistics."""
+        if self._admission is None:
+            return {"enabled": False}
+        return {"enabled": True, **self._admission.tenant_stats()}
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Return response cache, semantic cache and request coalescing statistics."""
+        stats = {"enabled": False}
+        if self._cache is not None:
+            stats = {"enabled": True, **self._cache.stats()}
+        stats["semantic"] = {"enabled": False}
+        if self._semantic_cache is not None:
+            stats["semantic"] = {"enabled": True, **self._semantic_cache.stats()}
+        stats["singleflight"] = self._inflight.stats()
+        stats["state_backend"] = self._state.name
+        if self._shared_inflight is not None:
+            stats["singleflight"]["shared"] = self._shared_inflight.stats()
+        return stats
+
+    async def generate_content(
+        self,
+        prompt: str,
+        max_retries: int = None,
+        cache_mode: str = "use",
+        generation_overrides: Optional[Dict[str, Any]] = None,
+        operation: str = "generate",
+        caller: str = "anonymous",
+        system_instruction: Optional[str] = None,
+        semantic_query: Optional[SemanticQuery] = None,
+        background: bool = False,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate content using Google Gemini, serving repeated prompts from the cache.
+
+        cache_mode is "use" (read and write), "refresh" (skip the lookup but store
+        the new result) or "bypass" (neither read nor write). operation and caller
+        label metrics and usage accounting. system_instruction carries static
+        instructions separately from the per-request prompt. With semantic_query,
+        an exact-cache miss falls back to the closest near-duplicate result.
+        background calls only take admission budget no interactive caller is waiting for.
+        history holds earlier chat turns ({"role": "user"|"model", "text": ...}) sent before prompt.
+        """
         
         if not settings.is_configured:
             raise HTTPException(status_code=500, detail="Google API key not configured")
         
+        generation_config = self._create_generation_config(generation_overrides)
+        request_key = make_cache_key(
+            prompt, settings.model_name, generation_config, system_instruction, history
+        )
+
+        cached = await self._cache_lookup(request_key, cache_mode, operation)
+        if cached is not None:
+            self._record_cache_hit(prompt, generation_config, system_instruction, history)
+            return cached
+
+        if semantic_query is not None and self._semantic_cache is None:
+            semantic_query = None
+        if semantic_query is not None and cache_mode == "use":
+            with tracing.span("semantic_cache_lookup"):
+                similar = self._semantic_cache.lookup(semantic_query)
+            metrics.CACHE_LOOKUPS.labels(
+                operation, "semantic_hit" if similar is not None else "semantic_miss"
+            ).inc()
+            if similar is not None:
+                self._record_cache_hit(prompt, generation_config, system_instruction)
+                return {**similar, "cached": True, "cache_match": "semantic"}
+
+        store = self._cache is not None and cache_mode != "bypass"
+
+        async def generate() -> Dict[str, Any]:
+            async with self._circuit() as probe:
+                # A half-open probe gets a single attempt, so a still-failing upstream is caught quickly
+                return await self._generate_with_retries(
+                    prompt, generation_config, 1 if probe is not None else max_retries,
+                    operation, caller, system_instruction, background, history
+                )
+
+        async def call_upstream() -> Dict[str, Any]:
+            if self._shared_inflight is not None:
+                # Workers in other processes making the same call wait for this one
+                result = await self._shared_inflight.do(request_key, generate)
+            else:
+                result = await generate()
+            if store:
+                await self._cache.set(request_key, result)
+            if semantic_query is not None and cache_mode != "bypass":
+                self._semantic_cache.add(semantic_query, result)
+            return result
+
+        # Identical prompts already in flight share a single upstream call. The shared
+        # call runs under the first caller's deadline; each caller stops waiting at its own.
+        coalesced = self._inflight.in_flight(request_key)
+        if coalesced:
+            metrics.COALESCED.labels(operation).inc()
+        async with enforce_deadline():
+            with tracing.span("upstream", coalesced=coalesced):
+                result = await self._inflight.do(request_key, call_upstream)
+        return {**result, "cached": False}
+
+    async def _generate_with_retries(
+        self,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        max_retries: int = None,
+        operation: str = "generate",
+        caller: str = "anonymous",
+        system_instruction: Optional[str] = None,
+        background: bool = False,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
+        """Call Gemini through admission control with jittered retries, hedging and model fallback."""
         if max_retries is None:
             max_retries = settings.max_retries
+        billed_prompt = self._billed_prompt(prompt, system_instruction, history)
+        failed_model = None
         
         for attempt in range(max_retries):
+            if attempt > 0:
+                metrics.RETRIES.labels(operation).inc()
+            model = self._router.choose_model(failed_model)
+            started = time.perf_counter()
             try:
-                # Configure generation parameters
-                generation_config = self._create_generation_config()
-                
-                # Generate content
-                response = await asyncio.to_thread(
-                    self._model.generate_content,
-                    prompt,
-                    generation_config=generation_config
-                )
-                
-                if response and response.text:
-                    return {
-                        "success": True,
-                        "content": response.text.strip(),
-                        "usage_info": UsageInfo(
-                            model=settings.model_name,
-                            prompt_tokens=len(prompt.split()),
-                            completion_tokens=len(response.text.split()) if response.text else 0
-                        ).dict()
-                    }
-                else:
-                    raise Exception("Empty response from Gemini")
+                async with enforce_deadline():
+                    await self._admit(billed_prompt, operation, background)
+                    # Generate content
+                    async with self._upstream_slot(operation):
+                        started = time.perf_counter()
+                        response = await self._generate_hedged(
+                            model, prompt, generation_config, system_instruction, billed_prompt, history,
+                            operation=operation,
+                            # Nobody is waiting on background calls, so a faster copy buys nothing
+                            hedge=not background and operation not in UNHEDGED_OPERATIONS
+                        )
                     
-            except Exception as e:
+            except GeminiAPIError as e:
+                failed_model = model if e.status_code in RETRYABLE_STATUS_CODES else None
+                metrics.UPSTREAM_LATENCY.labels(operation, "error").observe(
+                    time.perf_counter() - started
+                )
                 logger.error(f"Gemini API attempt {attempt + 1} failed: {e}")
-                if attempt == max_retries - 1:
+                self._record_upstream_error(e)
+                last_attempt = attempt == max_retries - 1
+                if e.status_code == 429 and last_attempt:
+                    raise UpstreamUnavailableError(
+                        "AI model quota exceeded, please retry later", retry_after=e.retry_after
+                    ) from e
+                if last_attempt or e.status_code not in RETRYABLE_STATUS_CODES:
                     raise HTTPException(
                         status_code=500, 
-                        detail=f"AI generation failed after {max_retries} attempts: {str(e)}"
-                    )
-                await asyncio.sleep(2 ** attempt)  # Exponential backoff
+                        detail=f"AI generation failed after {attempt + 1} attempts: {str(e)}"
+                    ) from e
+                # No point backing off for a retry the circuit breaker would reject
+                rejection = self._breaker.rejection() if self._breaker is not None else None
+                if rejection is not None:
+                    raise rejection from e
+                delay = self._retry_delay(attempt, e.retry_after)
+                time_left = remaining()
+                if time_left is not None and delay >= time_left:
+                    # Backing off would overrun the caller's deadline, so give up now
+                    if e.status_code == 429:
+                        raise UpstreamUnavailableError(
+                            "AI model quota exceeded, please retry later", retry_after=e.retry_after
+                        ) from e
+                    raise DeadlineExceededError(
+                        f"Request deadline exceeded after {attempt + 1} attempts: {str(e)}"
+                    ) from e
+                with tracing.span("retry_backoff", attempt=attempt + 1, status=e.status_code):
+                    await asyncio.sleep(delay)
+                continue
+
+            metrics.UPSTREAM_LATENCY.labels(operation, "success").observe(
+                time.perf_counter() - started
+            )
+            content = response["text"].strip()
+            usage = self._account_usage(
+                model, billed_prompt, content, response["usage_metadata"], operation, caller
+            )
+            return {
+                "success": True,
+                "content": content,
+                "usage_info": usage.dict()
+            }
         
         raise HTTPException(status_code=500, detail="AI generation failed")
+
+    async def _generate_hedged(
+        self,
+        model: str,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        system_instruction: Optional[str],
+        billed_prompt: str,
+        history: Optional[List[Dict[str, str]]] = None,
+        operation: str = "generate",
+        hedge: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Call model, sending a duplicate if the first call outlives the hedge delay for its operation.
+
+        The first successful answer wins and the other call is cancelled. The
+        duplicate only goes out if an upstream slot and admission budget are free
+        right away, so hedging never queues behind (or ahead of) other requests.
+        With hedge=False the call is made once.
+        """
+        started = time.perf_counter()
+        original = asyncio.ensure_future(
+            self._timed_generate(model, prompt, generation_config, system_instruction, history, operation)
+        )
+        duplicate = None
+        try:
+            delay = self._router.hedge_delay(model, operation) if hedge else None
+            if delay is None:
+                return await original
+            done, _ = await asyncio.wait({original}, timeout=delay)
+            if done or not await self._reserve_hedge(billed_prompt):
+                return await original
+
+            duplicate = asyncio.ensure_future(
+                self._hedge_call(model, prompt, generation_config, system_instruction, history, operation)
+            )
+            pending = {original, duplicate}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for call in done:
+                    if call.exception() is None:
+                        self._router.record_hedge(model, hedge_won=call is duplicate)
+                        if call is duplicate and not original.done():
+                            # The original is cancelled below; it took at least this long
+                            self._router.record_censored(model, time.perf_counter() - started, operation)
+                        return call.result()
+                    error = call.exception()
+            self._router.record_hedge(model, hedge_won=False)
+            raise error
+        finally:
+            for call in (original, duplicate):
+                if call is not None and not call.done():
+                    call.cancel()
+
+    async def _timed_generate(
+        self,
+        model: str,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        system_instruction: Optional[str],
+        history: Optional[List[Dict[str, str]]] = None,
+        operation: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """One upstream call, recorded in the router's per-model and per-operation statistics."""
+        started = time.perf_counter()
+        try:
+            with tracing.span("gemini_call", model=model):
+                response = await self._client.generate(
+                    model, prompt, generation_config, system_instruction, history=history
+                )
+            if not response["text"]:
+                raise GeminiAPIError("Empty response from Gemini")
+        except GeminiAPIError as e:
+            if e.status_code in RETRYABLE_STATUS_CODES:
+                self._router.record(model, time.perf_counter() - started, ok=False, operation=operation)
+            raise
+        self._router.record(model, time.perf_counter() - started, ok=True, operation=operation)
+        return response
+
+    async def _reserve_hedge(self, billed_prompt: str) -> bool:
+        """Take an upstream slot and admission budget for a hedge, only if both are free now."""
+        if self._upstream_slots.locked():
+            return False
+        # Hedging a half-open probe would skew the probe's verdict
+        if self._breaker is not None and self._breaker.state != CLOSED:
+            return False
+        # Not locked, so this returns without waiting
+        await self._upstream_slots.acquire()
+        if self._admission is not None and not await self._admission.try_acquire(estimate_tokens(billed_prompt)):
+            self._upstream_slots.release()
+            return False
+        metrics.UPSTREAM_SLOTS_IN_USE.inc()
+        return True
+
+    async def _hedge_call(
+        self,
+        model: str,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        system_instruction: Optional[str],
+        history: Optional[List[Dict[str, str]]] = None,
+        operation: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Run a hedged duplicate in the slot reserved for it."""
+        try:
+            return await self._timed_generate(
+                model, prompt, generation_config, system_instruction, history, operation
+            )
+        finally:
+            self._upstream_slots.release()
+            metrics.UPSTREAM_SLOTS_IN_USE.dec()
+
+    @staticmethod
+    def _billed_prompt(
+        prompt: str,
+        system_instruction: Optional[str],
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> str:
+        """All input text sent upstream, for local token estimates."""
+        parts = [system_instruction] if system_instruction else []
+        parts.extend(turn["text"] for turn in history or ())
+        parts.append(prompt)
+        return "\n".join(parts)
+
+    def _account_usage(
+        self,
+        model: str,
+        prompt: str,
+        content: str,
+        usage_metadata: Optional[Dict[str, Any]],
+        operation: str,
+        caller: str,
+        tenant: Optional[str] = None
+    ) -> UsageInfo:
+        """Record a successful upstream call's token usage everywhere it is tracked."""
+        usage = build_usage_info(model, prompt, content, usage_metadata)
+        self._usage.record(operation, caller, usage)
+        metrics.TOKENS.labels(operation, "prompt").inc(usage.prompt_tokens)
+        metrics.TOKENS.labels(operation, "completion").inc(usage.completion_tokens)
+        if self._admission is not None:
+            self._admission.on_success()
+            # Admission charged an estimate of the prompt; settle up with the real count
+            self._admission.charge(usage.total_tokens - estimate_tokens(prompt), tenant=tenant or current_tenant())
+        return usage
+
+    async def _cache_lookup(
+        self,
+        request_key: str,
+        cache_mode: str,
+        operation: str
+    ) -> Optional[Dict[str, Any]]:
+        """Return a cached result for the key if the cache mode allows reading it."""
+        if self._cache is None:
+            return None
+        if cache_mode != "use":
+            self._cache.record_bypass()
+            metrics.CACHE_LOOKUPS.labels(operation, "bypass").inc()
+            return None
+        with tracing.span("cache_lookup") as span:
+            cached = await self._cache.get(request_key)
+            span["hit"] = cached is not None
+        metrics.CACHE_LOOKUPS.labels(operation, "hit" if cached is not None else "miss").inc()
+        if cached is not None:
+            cached["cached"] = True
+            cached["cache_match"] = "exact"
+        return cached
+
+    def _record_cache_hit(
+        self,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        system_instruction: Optional[str],
+        history: Optional[List[Dict[str, str]]] = None
+    ):
+        """In record mode, log a cache-served request too, so replays see the full request stream."""
+        if isinstance(self._client, RecordingClient):
+            self._client.record_cache_hit(
+                settings.model_name, prompt, generation_config, system_instruction, history
+            )
+
+    async def _admit(self, prompt: str, operation: str, background: bool = False):
+        """Wait for the tenant's quota and the shared request/token budget before an upstream call."""
+        if self._admission is not None:
+            started = time.perf_counter()
+            try:
+                with tracing.span("admission_wait"):
+                    await self._admission.acquire(
+                        estimate_tokens(prompt), background=background, tenant=current_tenant()
+                    )
+            except TenantQuotaExceededError:
+                metrics.TENANT_QUOTA_REJECTIONS.labels(operation).inc()
+                raise
+            metrics.ADMISSION_WAIT.labels(operation).observe(time.perf_counter() - started)
+
+    @asynccontextmanager
+    async def _circuit(self, timed: bool = True):
+        """
+        Pass one request through the circuit breaker, failing fast while it is open.
+
+        Yields the half-open probe ticket (or None). Only failures that point at
+        upstream being down count against the circuit; timed=False leaves the
+        request out of the latency statistics (streams).
+        """
+        if self._breaker is None:
+            yield None
+            return
+        probe = self._breaker.acquire()
+        started = time.perf_counter()
+        try:
+            yield probe
+        except Exception as e:
+            if self._is_outage(e):
+                self._breaker.record(probe, ok=False)
+            else:
+                self._breaker.release(probe)
+            raise
+        except BaseException:
+            self._breaker.release(probe)
+            raise
+        self._breaker.record(probe, ok=True, latency=time.perf_counter() - started if timed else None)
+
+    @staticmethod
+    def _is_outage(error: BaseException) -> bool:
+        """Whether a failed request points at upstream being down rather than at quota, deadlines or the input."""
+        if isinstance(error, DeadlineExceededError):
+            # The caller's deadline, not upstream, cut the request short
+            return False
+        cause = error if isinstance(error, GeminiAPIError) else error.__cause__
+        return isinstance(cause, GeminiAPIError) and (cause.status_code is None or cause.status_code >= 500)
+
+    @asynccontextmanager
+    async def _upstream_slot(self, operation: str):
+        """Hold one of the bounded upstream concurrency slots."""
+        started = time.perf_counter()
+        with tracing.span("slot_wait"):
+            await self._upstream_slots.acquire()
+        try:
+            metrics.UPSTREAM_SLOT_WAIT.labels(operation).observe(time.perf_counter() - started)
+            metrics.UPSTREAM_SLOTS_IN_USE.inc()
+            try:
+                yield
+            finally:
+                metrics.UPSTREAM_SLOTS_IN_USE.dec()
+        finally:
+            self._upstream_slots.release()
+
+    def _record_upstream_error(self, error: GeminiAPIError):
+        """Feed rate-limit signals from upstream back into admission control."""
+        if error.status_code == 429 and self._admission is not None:
+            self._admission.on_rate_limited(error.retry_after)
+
+    @staticmethod
+    def _retry_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+        """Exponential backoff with jitter so concurrent retries do not fire together."""
+        ceiling = min(settings.retry_max_delay, settings.retry_base_delay * 2 ** attempt)
+        delay = ceiling / 2 + random.uniform(0, ceiling / 2)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
     
-    async def generate_description(self, request: AIGenerateRequest) -> Dict[str, Any]:
+    async def stream_content(
+        self,
+        prompt: str,
+        max_chars: Optional[int] = None,
+        cache_mode: str = "use",
+        operation: str = "generate",
+        caller: str = "anonymous",
+        system_instruction: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream content from Gemini as it is generated.
+
+        Yields {"type": "chunk", "content": ...} events followed by a single
+        {"type": "done", ...} event carrying the full result. When max_chars is
+        set, the upstream stream is abandoned once that many characters arrived.
+        """
+        if not settings.is_configured:
+            raise HTTPException(status_code=500, detail="Google API key not configured")
+
+        generation_config = self._create_generation_config()
+        request_key = make_cache_key(
+            prompt, settings.model_name, generation_config, system_instruction
+        )
+
+        cached = await self._cache_lookup(request_key, cache_mode, operation)
+        if cached is not None:
+            self._record_cache_hit(prompt, generation_config, system_instruction)
+            yield {"type": "chunk", "content": cached["content"]}
+            yield {"type": "done", **cached}
+            return
+
+        parts = []
+        received = 0
+        truncated = False
+        usage_metadata = None
+        billed_prompt = self._billed_prompt(prompt, system_instruction)
+
+        # The generator may be resumed from another task than the one that started
+        # it, so the deadline and tenant are captured now; the deadline is checked
+        # explicitly between chunks
+        deadline = current_deadline()
+        tenant = current_tenant()
+
+        # Streams are not hedged, but they do follow the router's fallback decision
+        model = self._router.choose_model()
+        async with self._circuit(timed=False):
+            async with enforce_deadline(deadline):
+                await self._admit(billed_prompt, operation)
+            async with self._upstream_slot(operation):
+                started = time.perf_counter()
+                outcome = "error"
+                time_left = remaining(deadline)
+                if time_left is not None and time_left <= 0:
+                    raise DeadlineExceededError()
+                chunks = self._client.stream(
+                    model, prompt, generation_config, system_instruction, timeout=time_left
+                )
+                try:
+                    async for chunk in chunks:
+                        # Usage counts are cumulative; the last chunk carrying them wins
+                        usage_metadata = chunk["usage_metadata"] or usage_metadata
+                        text = chunk["text"]
+                        if not text:
+                            # Chunks without text parts (e.g. safety metadata only)
+                            continue
+                        if not parts:
+                            metrics.TIME_TO_FIRST_TOKEN.labels(operation).observe(
+                                time.perf_counter() - started
+                            )
+                        parts.append(text)
+                        received += len(text)
+                        yield {"type": "chunk", "content": text}
+                        if max_chars is not None and received >= max_chars:
+                            truncated = True
+                            break
+                        if deadline is not None and remaining(deadline) <= 0:
+                            raise DeadlineExceededError()
+                    outcome = "success"
+                    self._router.record(model, None, ok=True)
+                except GeminiAPIError as e:
+                    self._record_upstream_error(e)
+                    if deadline is not None and remaining(deadline) <= 0:
+                        raise DeadlineExceededError() from e
+                    if e.status_code in RETRYABLE_STATUS_CODES:
+                        self._router.record(model, None, ok=False)
+                    if e.status_code == 429:
+                        raise UpstreamUnavailableError(
+                            "AI model quota exceeded, please retry later", retry_after=e.retry_after
+                        ) from e
+                    raise
+                finally:
+                    # Closing the stream drops the connection and stops upstream generation
+                    await chunks.aclose()
+                    metrics.UPSTREAM_LATENCY.labels(operation, outcome).observe(
+                        time.perf_counter() - started
+                    )
+
+        content = "".join(parts).strip()
+        if not content:
+            raise HTTPException(status_code=500, detail="Empty response from Gemini")
+
+        usage = self._account_usage(model, billed_prompt, content, usage_metadata, operation, caller, tenant)
+        result = {
+            "success": True,
+            "content": content,
+            "usage_info": usage.dict()
+        }
+
+        # A stream cut short by max_chars is not a complete answer, so it is not cached
+        if self._cache is not None and cache_mode != "bypass" and not truncated:
+            await self._cache.set(request_key, result)
+
+        yield {"type": "done", **result, "cached": False}
+
+    @staticmethod
+    def truncate_description(content: str) -> str:
+        """Truncate a description to the database limit at a word boundary."""
+        if len(content) <= MAX_DESCRIPTION_LENGTH:
+            return content
+
+        # Truncate at word boundary to avoid cutting mid-word
+        content = content[:380]
+        last_space = content.rfind(' ')
+        if last_space > 300:  # Ensure we don't cut too much
+            return content[:last_space] + "..."
+        return content[:380] + "..."
+
+    async def generate_description(
+        self,
+        request: AIGenerateRequest,
+        cache_mode: str = "use",
+        caller: str = "anonymous",
+        background: bool = False
+    ) -> Dict[str, Any]:
         """Generate task description using Gemini AI."""
         if not settings.is_configured:
             return {
@@ -168,76 +875,456 @@ Generate a professional, detailed description that a team member can immediately
             }
         
         try:
-            prompt = self.create_comprehensive_context_prompt(request)
-            result = await self.generate_content(prompt)
+            if settings.structured_output:
+                result = await self._generate_structured(request, cache_mode, caller, background)
+                if result is not None:
+                    return result
+
+            with metrics.PROMPT_BUILD_TIME.labels("generate").time(), tracing.span("prompt_build"):
+                prompt = self.create_comprehensive_context_prompt(request)
+            result = await self.generate_content(
+                prompt.text,
+                cache_mode=cache_mode,
+                operation="generate",
+                caller=caller,
+                system_instruction=prompt.system_instruction,
+                semantic_query=self.semantic_query_for(request.task),
+                background=background
+            )
             
             if result["success"]:
                 # Ensure the description doesn't exceed database limits
-                content = result["content"]
-                if len(content) > 400:
-                    # Truncate at word boundary to avoid cutting mid-word
-                    content = content[:380]
-                    last_space = content.rfind(' ')
-                    if last_space > 300:  # Ensure we don't cut too much
-                        content = content[:last_space] + "..."
-                    else:
-                        content = content[:380] + "..."
-                
+                content = self.truncate_description(result["content"])
                 result["content"] = content
                 result["character_count"] = len(content)
             
             return result
             
+        except (UpstreamUnavailableError, DeadlineExceededError):
+            raise
         except Exception as e:
             logger.error(f"Error generating description: {e}")
             return {
                 "success": False,
                 "error": f"Failed to generate description: {str(e)}"
             }
+
+    async def _generate_structured(
+        self,
+        request: AIGenerateRequest,
+        cache_mode: str,
+        caller: str,
+        background: bool
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Generate the description as validated JSON fields rendered to text.
+
+        An answer over the length limit is compacted locally. Returns None if
+        the answer is unusable (invalid, or too long even after compaction), in
+        which case the caller falls back to a free-text generation.
+        """
+        with metrics.PROMPT_BUILD_TIME.labels("generate").time(), tracing.span("prompt_build"):
+            prompt = self.create_structured_prompt(request)
+        result = await self.generate_content(
+            prompt.text,
+            cache_mode=cache_mode,
+            generation_overrides=STRUCTURED_OVERRIDES,
+            operation="generate",
+            caller=caller,
+            system_instruction=prompt.system_instruction,
+            semantic_query=self.semantic_query_for(request.task, structured=True),
+            background=background
+        )
+        description, outcome = parse_description(result["content"], MAX_DESCRIPTION_LENGTH)
+        metrics.STRUCTURED_OUTPUTS.labels(outcome).inc()
+        if description is None:
+            logger.warning(f"Structured answer unusable ({outcome}), falling back to free text")
+            return None
+        content = render_description(description)
+        return {
+            **result,
+            "content": content,
+            "character_count": len(content),
+            "structured": description.model_dump(),
+        }
+
+    async def generate_descriptions_batch(
+        self,
+        tasks: List[TaskContext],
+        pack: bool = False,
+        cache_mode: str = "use",
+        caller: str = "anonymous"
+    ) -> List[Dict[str, Any]]:
+        """
+        Generate descriptions for many tasks, returning one result per task in order.
+
+        Identical tasks are generated once. With pack=True, tasks are grouped into
+        multi-task prompts with JSON output so N tasks cost fewer upstream calls.
+        """
+        keys = [task.model_dump_json() for task in tasks]
+        unique = dict(zip(keys, tasks))
+
+        if pack:
+            results = await self._generate_packed(unique, cache_mode, caller)
+        else:
+            slots = asyncio.Semaphore(settings.batch_max_concurrency)
+
+            async def generate_one(task: TaskContext) -> Dict[str, Any]:
+                async with slots:
+                    return await self._generate_batch_item(task, cache_mode, caller)
+
+            outcomes = await asyncio.gather(*[generate_one(task) for task in unique.values()])
+            results = dict(zip(unique.keys(), outcomes))
+
+        return [dict(results[key]) for key in keys]
+
+    async def _generate_batch_item(
+        self,
+        task: TaskContext,
+        cache_mode: str,
+        caller: str
+    ) -> Dict[str, Any]:
+        """Generate one batch item, reporting capacity errors per item instead of failing the batch."""
+        try:
+            return await self.generate_description(
+                AIGenerateRequest(task=task), cache_mode=cache_mode, caller=caller
+            )
+        except (UpstreamUnavailableError, DeadlineExceededError) as e:
+            return {"success": False, "error": e.detail}
+
+    def create_packed_prompt(self, tasks: List[TaskContext]) -> RenderedPrompt:
+        """Create a single prompt that asks for descriptions of several tasks as JSON."""
+        lines = []
+        for index, task in enumerate(tasks):
+            line = f"[{index}] Title: {task.title} | Stage: {task.stage}"
+            if task.description and task.description.strip():
+                line += f" | Existing Description: {task.description}"
+            lines.append(line)
+        return get_template("batch").render(task_list="\n".join(lines))
+
+    async def _generate_packed(
+        self,
+        unique: Dict[str, TaskContext],
+        cache_mode: str,
+        caller: str
+    ) -> Dict[str, Dict[str, Any]]:
+        """Generate descriptions for several tasks per upstream call."""
+        results: Dict[str, Dict[str, Any]] = {}
+        pending: Dict[str, TaskContext] = {}
+
+        # Serve tasks that were generated before (individually or packed) from the cache
+        for key, task in unique.items():
+            single_prompt = self.create_comprehensive_context_prompt(AIGenerateRequest(task=task))
+            cached = None
+            if self._cache is not None and cache_mode == "use":
+                cached = await self._cache.get(self.cache_key_for(single_prompt))
+            if cached is not None:
+                content = self.truncate_description(cached["content"])
+                results[key] = {
+                    **cached,
+                    "content": content,
+                    "character_count": len(content),
+                    "cached": True,
+                    "cache_match": "exact",
+                }
+            else:
+                pending[key] = task
+
+        pending_keys = list(pending.keys())
+        size = settings.batch_pack_size
+        groups = [pending_keys[i:i + size] for i in range(0, len(pending_keys), size)]
+        slots = asyncio.Semaphore(settings.batch_max_concurrency)
+
+        async def generate_group(group: List[str]):
+            async with slots:
+                packed = await self._generate_pack(
+                    [pending[key] for key in group], cache_mode, caller
+                )
+            missing = []
+            for key, result in zip(group, packed):
+                if result is None:
+                    missing.append(key)
+                else:
+                    results[key] = result
+            # Anything the packed answer did not cover is generated on its own
+            for key in missing:
+                async with slots:
+                    results[key] = await self._generate_batch_item(pending[key], cache_mode, caller)
+
+        await asyncio.gather(*[generate_group(group) for group in groups])
+        return results
+
+    async def _generate_pack(
+        self,
+        tasks: List[TaskContext],
+        cache_mode: str,
+        caller: str
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Run one multi-task prompt; returns None for tasks missing from the answer."""
+        overrides = {
+            "responseMimeType": "application/json",
+            "responseSchema": {
+                "type": "ARRAY",
+                "items": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "index": {"type": "INTEGER"},
+                        "description": {"type": "STRING"},
+                    },
+                    "required": ["index", "description"],
+                },
+            },
+            "maxOutputTokens": max(settings.model_max_tokens, 200 * len(tasks)),
+        }
+        try:
+            with metrics.PROMPT_BUILD_TIME.labels("batch").time(), tracing.span("prompt_build"):
+                prompt = self.create_packed_prompt(tasks)
+            result = await self.generate_content(
+                prompt.text,
+                cache_mode=cache_mode,
+                generation_overrides=overrides,
+                operation="batch",
+                caller=caller,
+                system_instruction=prompt.system_instruction
+            )
+            items = json.loads(result["content"])
+        except Exception as e:
+            logger.error(f"Packed generation for {len(tasks)} tasks failed: {e}")
+            return [None] * len(tasks)
+
+        descriptions: Dict[int, str] = {}
+        if isinstance(items, list):
+            for item in items:
+                if isinstance(item, dict) and isinstance(item.get("description"), str):
+                    try:
+                        descriptions[int(item.get("index"))] = item["description"].strip()
+                    except (TypeError, ValueError):
+                        continue
+
+        # The pack's usage is split over the tasks it answered, by answer length, so summing items adds up
+        answered = [index for index in range(len(tasks)) if descriptions.get(index)]
+        shares = dict(zip(answered, split_usage(
+            dict(result.get("usage_info") or {}, packed_tasks=len(tasks)),
+            [len(descriptions[index]) for index in answered]
+        )))
+        packed: List[Optional[Dict[str, Any]]] = []
+        for index, task in enumerate(tasks):
+            description = descriptions.get(index)
+            if not description:
+                packed.append(None)
+                continue
+            usage_info = shares[index]
+            # Park each answer under the single-task key so later individual calls hit
+            single_prompt = self.create_comprehensive_context_prompt(AIGenerateRequest(task=task))
+            if self._cache is not None and cache_mode != "bypass":
+                await self._cache.set(
+                    self.cache_key_for(single_prompt),
+                    {"success": True, "content": description, "usage_info": usage_info},
+                )
+            content = self.truncate_description(description)
+            packed.append({
+                "success": True,
+                "content": content,
+                "character_count": len(content),
+                "usage_info": usage_info,
+                "cached": result.get("cached", False),
+            })
+        return packed
+
+    async def stream_description(
+        self,
+        request: AIGenerateRequest,
+        cache_mode: str = "use",
+        caller: str = "anonymous"
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a task description, stopping upstream once the length budget is reached."""
+        with metrics.PROMPT_BUILD_TIME.labels("generate").time(), tracing.span("prompt_build"):
+            prompt = self.create_comprehensive_context_prompt(request)
+        async for event in self.stream_content(
+            prompt.text,
+            max_chars=MAX_DESCRIPTION_LENGTH,
+            cache_mode=cache_mode,
+            operation="generate",
+            caller=caller,
+            system_instruction=prompt.system_instruction
+        ):
+            if event["type"] == "done":
+                content = self.truncate_description(event["content"])
+                event["content"] = content
+                event["character_count"] = len(content)
+            yield event
     
-    async def shorten_description(self, description: str) -> Dict[str, Any]:
+    def create_shorten_prompt(self, description: str) -> RenderedPrompt:
+        """Create the prompt for shortening a task description."""
+        return get_template("shorten").render(description=description)
+
+    async def shorten_description(
+        self,
+        description: str,
+        cache_mode: str = "use",
+        caller: str = "anonymous"
+    ) -> Dict[str, Any]:
         """Shorten an existing task description while preserving key information."""
-        prompt = f"""
-    Shorten the following task description while preserving all critical information:
-
-    ORIGINAL DESCRIPTION:
-    {description}
-
-    INSTRUCTIONS:
-    - Keep all essential requirements and acceptance criteria
-    - Maintain technical specifications
-    - Preserve important deadlines or constraints
-    - Use bullet points or concise paragraphs
-    - Target 50-150 words
-    - Ensure actionability is retained
-
-    Provide a concise but complete version:
-    """
-        
-        return await self.generate_content(prompt)
-    
-    async def expand_description(self, description: str) -> Dict[str, Any]:
+        with metrics.PROMPT_BUILD_TIME.labels("shorten").time(), tracing.span("prompt_build"):
+            prompt = self.create_shorten_prompt(description)
+        return await self.generate_content(
+            prompt.text,
+            cache_mode=cache_mode,
+            operation="shorten",
+            caller=caller,
+            system_instruction=prompt.system_instruction
+        )
+
+    def create_expand_prompt(self, description: str) -> RenderedPrompt:
+        """Create the prompt for expanding a task description."""
+        return get_template("expand").render(description=description)
+
+    async def expand_description(
+        self,
+        description: str,
+        cache_mode: str = "use",
+        caller: str = "anonymous",
+        background: bool = False
+    ) -> Dict[str, Any]:
         """Expand an existing task description with additional details and considerations."""
-        prompt = f"""
-    Expand the following task description with additional technical details and considerations:
-
-    ORIGINAL DESCRIPTION:
-    {description}
-
-    INSTRUCTIONS:
-    Add relevant details such as:
-    - Technical implementation considerations
-    - Potential edge cases and error scenarios
-    - Testing strategies and validation steps
-    - Dependencies and integration points
-    - Performance and security considerations
-    - Documentation requirements
-    - Risk assessment and mitigation
-    - Timeline and milestone suggestions
-
-    Keep the original content and enhance it with professional insights. Target 200-500 words.
-
-    Provide the expanded version:
-    """
-        
-        return await self.generate_content(prompt) 
\ No newline at end of file
+        with metrics.PROMPT_BUILD_TIME.labels("expand").time(), tracing.span("prompt_build"):
+            prompt = self.create_expand_prompt(description)
+        return await self.generate_content(
+            prompt.text,
+            cache_mode=cache_mode,
+            operation="expand",
+            caller=caller,
+            system_instruction=prompt.system_instruction,
+            background=background
+        )
+
+    async def stream_expanded_description(
+        self,
+        description: str,
+        cache_mode: str = "use",
+        caller: str = "anonymous"
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream an expanded task description."""
+        with metrics.PROMPT_BUILD_TIME.labels("expand").time(), tracing.span("prompt_build"):
+            prompt = self.create_expand_prompt(description)
+        async for event in self.stream_content(
+            prompt.text,
+            cache_mode=cache_mode,
+            operation="expand",
+            caller=caller,
+            system_instruction=prompt.system_instruction
+        ):
+            yield event
+
+    def _refine_view(self, session: Dict[str, Any], result: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        view = {
+            "session_id": session["id"],
+            "version": session["version"],
+            "content": session["draft"],
+            "turns": session["turn_count"],
+            "expires_in_seconds": settings.refine_session_ttl_seconds,
+        }
+        if result is not None:
+            view.update(usage_info=result.get("usage_info"), cached=result.get("cached", False))
+        return view
+
+    async def _load_refine_session(self, session_id: str, caller: str) -> Dict[str, Any]:
+        session = await self._sessions.get(session_id)
+        # Someone else's session is reported as missing, not forbidden
+        if session is None or session["owner"] != caller:
+            raise HTTPException(status_code=404, detail="Refine session not found or expired")
+        return session
+
+    async def start_refine_session(
+        self,
+        content: str,
+        caller: str = "anonymous",
+        instruction: Optional[str] = None,
+        cache_mode: str = "use"
+    ) -> Dict[str, Any]:
+        """Open a refine session on a description; with an instruction, run the first turn too."""
+        session = new_session(caller, content)
+        await self._sessions.create(session)
+        if instruction is None:
+            return self._refine_view(session)
+        return await self.refine_description(session["id"], caller, instruction=instruction, cache_mode=cache_mode)
+
+    async def get_refine_session(self, session_id: str, caller: str = "anonymous") -> Dict[str, Any]:
+        """Return a refine session's current draft and version."""
+        return self._refine_view(await self._load_refine_session(session_id, caller))
+
+    async def end_refine_session(self, session_id: str, caller: str = "anonymous"):
+        """Drop a refine session before it expires."""
+        await self._load_refine_session(session_id, caller)
+        await self._sessions.delete(session_id)
+
+    async def refine_description(
+        self,
+        session_id: str,
+        caller: str = "anonymous",
+        instruction: Optional[str] = None,
+        edits: Optional[List[Dict[str, str]]] = None,
+        base_version: Optional[int] = None,
+        cache_mode: str = "use"
+    ) -> Dict[str, Any]:
+        """
+        Run one refine turn: apply the user's edits to the draft, then send the instruction as a chat turn.
+
+        While the draft is the model's own last answer, only the instruction is
+        new: the last refine_max_turns exchanges go along as chat history, and
+        the draft is already in it. After the user edits the draft, the history
+        is dropped and the edited draft is sent once instead. Edits alone are
+        applied without calling the model.
+        """
+        if not instruction and not edits:
+            raise HTTPException(status_code=422, detail="A refine turn needs an instruction, edits or both")
+        session = await self._load_refine_session(session_id, caller)
+        version = session["version"]
+        if base_version is not None and base_version != version:
+            raise HTTPException(
+                status_code=409, detail=f"Session is at version {version}, not {base_version}; reload it"
+            )
+
+        if edits:
+            try:
+                session["draft"] = apply_edits(session["draft"], edits)
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+            session["draft_edited"] = True
+
+        result = None
+        if instruction:
+            with metrics.PROMPT_BUILD_TIME.labels("refine").time(), tracing.span("prompt_build"):
+                if session["turns"] and not session["draft_edited"]:
+                    kind, history = "followup", session["turns"]
+                    prompt = get_template("refine_followup").render(instruction=instruction)
+                else:
+                    kind, history = "full", []
+                    prompt = get_template("refine").render(description=session["draft"], instruction=instruction)
+            metrics.REFINE_TURNS.labels(kind).inc()
+            result = await self.generate_content(
+                prompt.text,
+                cache_mode=cache_mode,
+                operation="refine",
+                caller=caller,
+                system_instruction=prompt.system_instruction,
+                history=history or None
+            )
+            turns = history + [
+                {"role": "user", "text": prompt.text},
+                {"role": "model", "text": result["content"]},
+            ]
+            keep = 2 * settings.refine_max_turns
+            session["turns"] = turns[-keep:] if keep > 0 else []
+            session["draft"] = result["content"]
+            session["draft_edited"] = False
+        else:
+            metrics.REFINE_TURNS.labels("edit_only").inc()
+
+        session["version"] = version + 1
+        session["turn_count"] += 1
+        if not await self._sessions.save(session, version):
+            raise HTTPException(
+                status_code=409, detail="Session was changed by another request; reload it and retry"
+            )
+        return self._refine_view(session, result)
@@ -0,0 +1,191 @@
+"""
+Response cache module for AI generation results.
+Provides an in-process LRU cache with TTL, an optional SQLite tier and an optional shared-state tier.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+from . import tracing
+from .shared_state import StateBackend
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so formatting-only differences share a cache entry."""
+    return " ".join(prompt.split())
+
+
+def make_cache_key(
+    prompt: str,
+    model: str,
+    config: Dict[str, Any],
+    system_instruction: Optional[str] = None,
+    history: Optional[List[Dict[str, str]]] = None
+) -> str:
+    """Build a content-addressed key from the prompt, system instruction, model, generation config and chat history."""
+    fields = {
+        "system": normalize_prompt(system_instruction or ""),
+        "prompt": normalize_prompt(prompt),
+        "model": model,
+        "config": config,
+    }
+    if history:
+        fields["history"] = [[turn["role"], normalize_prompt(turn["text"])] for turn in history]
+    payload = json.dumps(fields, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache for generation results with optional on-disk and shared tiers.
+
+    The shared tier lives in a state backend used by every worker, so a result
+    generated by one worker is served by all of them.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: int,
+        sqlite_path: Optional[str] = None,
+        backend: Optional[StateBackend] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.sqlite_path = sqlite_path
+        self._shared = backend if backend is not None and backend.shared else None
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._stats = {
+            "hits": 0,
+            "disk_hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evictions": 0,
+            "writes": 0,
+            "bypassed": 0,
+        }
+        self._db = None
+        if sqlite_path:
+            self._db = self._open_db(sqlite_path)
+
+    def _open_db(self, path: str) -> Optional[sqlite3.Connection]:
+        """Open (and create if needed) the SQLite cache table."""
+        try:
+            db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            logger.info(f"💾 Response cache persisted to {path}")
+            return db
+        except sqlite3.Error as e:
+            logger.error(f"Failed to open response cache database {path}: {e}")
+            return None
+
+    def _disk_get(self, key: str) -> Optional[tuple]:
+        row = self._db.execute(
+            "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] <= time.time():
+            self._db.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            return None
+        return json.loads(row[0]), row[1]
+
+    def _disk_set(self, key: str, value: Dict[str, Any], expires_at: float):
+        self._db.execute(
+            "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), expires_at),
+        )
+
+    def _remember(self, key: str, value: Dict[str, Any], expires_at: float):
+        """Insert into the in-memory tier, evicting the least recently used entries."""
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a cached result or None if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return dict(value)
+            del self._entries[key]
+            self._stats["expired"] += 1
+
+        if self._db is not None:
+            try:
+                disk_entry = await tracing.in_thread("cache_disk_read", self._disk_get, key)
+            except sqlite3.Error as e:
+                logger.error(f"Response cache read failed: {e}")
+                disk_entry = None
+            if disk_entry is not None:
+                value, expires_at = disk_entry
+                self._remember(key, value, expires_at)
+                self._stats["disk_hits"] += 1
+                return dict(value)
+
+        if self._shared is not None:
+            try:
+                shared_entry = await self._shared.get(f"cache:{key}")
+            except Exception as e:
+                logger.error(f"Shared response cache read failed: {e}")
+                shared_entry = None
+            if shared_entry is not None:
+                self._remember(key, shared_entry["value"], shared_entry["expires_at"])
+                self._stats["shared_hits"] += 1
+                return dict(shared_entry["value"])
+
+        self._stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        """Store a result in memory and, when enabled, on disk."""
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(key, value, expires_at)
+        self._stats["writes"] += 1
+        if self._db is not None:
+            try:
+                await tracing.in_thread("cache_disk_write", self._disk_set, key, value, expires_at)
+            except sqlite3.Error as e:
+                logger.error(f"Response cache write failed: {e}")
+        if self._shared is not None:
+            try:
+                await self._shared.set(
+                    f"cache:{key}", {"value": value, "expires_at": expires_at}, self.ttl_seconds
+                )
+            except Exception as e:
+                logger.error(f"Shared response cache write failed: {e}")
+
+    def record_bypass(self):
+        """Count a request that explicitly skipped the cache."""
+        self._stats["bypassed"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache hit/miss counters and sizing information."""
+        hits = self._stats["hits"] + self._stats["disk_hits"] + self._stats["shared_hits"]
+        lookups = hits + self._stats["misses"]
+        return {
+            **self._stats,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent": self._db is not None,
+            "shared": self._shared is not None,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,157 @@
+"""
+Circuit breaker module for the Gemini upstream.
+Fails requests fast while upstream is down and lets a few probes through before restoring traffic.
+"""
+
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from . import metrics
+from .errors import CircuitOpenError
+from .upstream_router import ModelStats
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker over upstream request outcomes.
+
+    While closed, outcomes feed a rolling error rate. Once at least min_calls
+    in the window fail at or above error_rate, the circuit opens and every
+    request is rejected for open_seconds. It then goes half-open and lets
+    probe_calls requests through: if they all succeed the circuit closes,
+    and any failure opens it again.
+    """
+
+    def __init__(
+        self,
+        error_rate: float = 0.5,
+        min_calls: int = 10,
+        window_seconds: float = 30,
+        open_seconds: float = 15,
+        probe_calls: int = 3,
+        latency_window: int = 200
+    ):
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.probe_calls = max(1, probe_calls)
+        self.latency_window = latency_window
+        self.state = CLOSED
+        self._outcomes = ModelStats(latency_window, window_seconds)
+        self._opened_at = 0.0
+        # Each half-open period gets a new generation, so probes from an earlier one are ignored
+        self._generation = 0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.counters = {"opened": 0, "rejected": 0}
+        metrics.CIRCUIT_STATE.set(STATE_CODES[CLOSED])
+
+    def _set_state(self, state: str):
+        logger.warning(f"🔌 Upstream circuit {self.state} -> {state}")
+        self.state = state
+        metrics.CIRCUIT_STATE.set(STATE_CODES[state])
+        metrics.CIRCUIT_TRANSITIONS.labels(state).inc()
+
+    def _open(self):
+        self._opened_at = time.monotonic()
+        self.counters["opened"] += 1
+        self._set_state(OPEN)
+
+    def _close(self):
+        # Failures from before the outage ended must not trip the circuit again
+        self._outcomes = ModelStats(self.latency_window, self.window_seconds)
+        self._set_state(CLOSED)
+
+    def _open_for(self) -> float:
+        """Seconds until an open circuit goes half-open."""
+        return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def _refresh(self):
+        if self.state == OPEN and self._open_for() <= 0:
+            self._generation += 1
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+            self._set_state(HALF_OPEN)
+
+    def is_closed(self) -> bool:
+        """Whether requests flow normally (an open circuit past its cool-down goes half-open first)."""
+        self._refresh()
+        return self.state == CLOSED
+
+    def rejection(self) -> Optional[CircuitOpenError]:
+        """The error to fail a request with if the circuit rejects requests right now, else None."""
+        self._refresh()
+        if self.state == OPEN:
+            retry_after = self._open_for()
+        elif self.state == HALF_OPEN and self._probes_in_flight >= self.probe_calls:
+            retry_after = 1.0
+        else:
+            return None
+        self.counters["rejected"] += 1
+        metrics.CIRCUIT_REJECTIONS.inc()
+        return CircuitOpenError(retry_after=retry_after)
+
+    def acquire(self) -> Optional[int]:
+        """
+        Let one request through or raise CircuitOpenError.
+
+        Returns a probe ticket while half-open (None otherwise); pass it back
+        to record() or release() when the request ends.
+        """
+        error = self.rejection()
+        if error is not None:
+            raise error
+        if self.state == HALF_OPEN:
+            self._probes_in_flight += 1
+            return self._generation
+        return None
+
+    def _is_current_probe(self, probe: Optional[int]) -> bool:
+        return probe is not None and probe == self._generation and self.state == HALF_OPEN
+
+    def record(self, probe: Optional[int], ok: bool, latency: Optional[float] = None):
+        """Record a request that reached upstream; ok=False means upstream failed it."""
+        self._outcomes.record(latency, ok)
+        if self._is_current_probe(probe):
+            self._probes_in_flight -= 1
+            if not ok:
+                self._open()
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.probe_calls:
+                self._close()
+            return
+        if not ok and self.state == CLOSED and self._tripped():
+            self._open()
+
+    def release(self, probe: Optional[int]):
+        """End a request whose outcome says nothing about upstream health (cancelled, quota, deadline)."""
+        if self._is_current_probe(probe):
+            self._probes_in_flight -= 1
+
+    def _tripped(self) -> bool:
+        if self._outcomes.recent_calls() < self.min_calls:
+            return False
+        return self._outcomes.recent_error_rate() >= self.error_rate
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the state, rolling error rate and upstream latency."""
+        self._refresh()
+        error_rate = self._outcomes.recent_error_rate()
+        p50, p95 = self._outcomes.latency_quantile(0.5), self._outcomes.latency_quantile(0.95)
+        return {
+            "state": self.state,
+            "error_rate": round(error_rate, 4) if error_rate is not None else None,
+            "recent_calls": self._outcomes.recent_calls(),
+            "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "retry_after_seconds": round(self._open_for(), 1) if self.state == OPEN else None,
+            **self.counters,
+        }
@@ -0,0 +1,136 @@
+"""
+Response compression module for the AI service.
+ASGI middleware that negotiates brotli or gzip for buffered responses above a size threshold.
+"""
+
+import gzip
+from typing import Dict, List, Optional, Tuple
+
+# Streams must reach the client chunk by chunk, so they are never compressed
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+
+def _brotli():
+    """The brotli module, or None if it is not installed."""
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Map each coding in an Accept-Encoding header to its quality value."""
+    codings = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        quality = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        codings[coding.strip().lower()] = quality
+    return codings
+
+
+class CompressionMiddleware:
+    """
+    Compress complete (non-streamed) responses with brotli or gzip.
+
+    The coding is picked from Accept-Encoding, preferring brotli when the
+    package is installed. Bodies under minimum_size, server-sent event streams
+    and responses that already carry a Content-Encoding pass through untouched.
+    Strong ETags become weak on compressed responses, since the bytes differ
+    from the identity encoding.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self._brotli = _brotli()
+
+    def _choose(self, accept_encoding: str) -> Optional[str]:
+        codings = parse_accept_encoding(accept_encoding)
+        wildcard = codings.get("*", 0.0)
+        candidates = (["br"] if self._brotli is not None else []) + ["gzip"]
+        best, best_quality = None, 0.0
+        for coding in candidates:
+            quality = codings.get(coding, wildcard)
+            if quality > best_quality:
+                best, best_quality = coding, quality
+        return best
+
+    def _compress(self, coding: str, body: bytes) -> bytes:
+        if coding == "br":
+            return self._brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        coding = self._choose(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                response_headers = {key.lower(): value for key, value in message.get("headers", [])}
+                content_type = response_headers.get(b"content-type", b"").decode("latin-1")
+                passthrough = (
+                    b"content-encoding" in response_headers
+                    or message["status"] in (204, 304)
+                    or content_type.startswith(UNCOMPRESSED_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False):
+                # Streamed responses are sent as they are produced
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            response_headers: List[Tuple[bytes, bytes]] = [
+                (key, value) for key, value in start.get("headers", []) if key.lower() != b"vary"
+            ]
+            vary = [value for key, value in start.get("headers", []) if key.lower() == b"vary"]
+            if not any(b"accept-encoding" in value.lower() for value in vary):
+                vary.append(b"Accept-Encoding")
+            response_headers.append((b"vary", b", ".join(vary)))
+            if len(body) >= self.minimum_size:
+                body = self._compress(coding, body)
+                response_headers = [
+                    (key, self._weaken(value) if key.lower() == b"etag" else value)
+                    for key, value in response_headers
+                    if key.lower() != b"content-length"
+                ]
+                response_headers.append((b"content-encoding", coding.encode("latin-1")))
+                response_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+            await send({**start, "headers": response_headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    def _weaken(etag: bytes) -> bytes:
+        return etag if etag.startswith(b"W/") else b"W/" + etag
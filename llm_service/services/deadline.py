@@ -0,0 +1,63 @@
+"""
+Request deadline module.
+Carries the caller's deadline through the call stack so retries and waits can respect it.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from .errors import DeadlineExceededError
+
+# Absolute deadline on the monotonic clock (the event loop's clock), or None
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(timeout_seconds: Optional[float]):
+    """Set a deadline timeout_seconds from now; tasks created inside inherit it."""
+    if timeout_seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + timeout_seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def current_deadline() -> Optional[float]:
+    """Return the active absolute deadline, if any."""
+    return _deadline.get()
+
+
+def remaining(deadline: Optional[float] = None) -> Optional[float]:
+    """Seconds left before the deadline (the active one by default), or None without one."""
+    if deadline is None:
+        deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+@asynccontextmanager
+async def enforce_deadline(deadline: Optional[float] = None):
+    """Cancel the enclosed block when the deadline passes and raise DeadlineExceededError."""
+    if deadline is None:
+        deadline = _deadline.get()
+    if deadline is None:
+        yield
+        return
+    if deadline <= time.monotonic():
+        raise DeadlineExceededError()
+    try:
+        async with asyncio.timeout_at(deadline):
+            yield
+    except TimeoutError:
+        raise DeadlineExceededError()
@@ -0,0 +1,40 @@
+"""
+Error types shared by the AI service components.
+"""
+
+from typing import Optional
+
+from fastapi import HTTPException
+
+
+class UpstreamUnavailableError(HTTPException):
+    """The upstream model cannot take the request right now; the caller should retry later."""
+
+    def __init__(self, detail: str, retry_after: Optional[float] = None):
+        headers = None
+        if retry_after is not None:
+            headers = {"Retry-After": str(max(1, int(round(retry_after))))}
+        super().__init__(status_code=503, detail=detail, headers=headers)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(UpstreamUnavailableError):
+    """The circuit breaker is rejecting calls because the upstream model is failing."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("AI model is temporarily unavailable, please retry later", retry_after=retry_after)
+
+
+class TenantQuotaExceededError(UpstreamUnavailableError):
+    """The caller's tenant has used up its own request or token quota."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Quota exceeded for this tenant, please retry later", retry_after=retry_after)
+        self.status_code = 429
+
+
+class DeadlineExceededError(HTTPException):
+    """The caller's request deadline passed before an answer was ready."""
+
+    def __init__(self, detail: str = "Request deadline exceeded"):
+        super().__init__(status_code=504, detail=detail)
@@ -0,0 +1,101 @@
+"""
+Fair queueing module for admission control.
+Deficit round-robin over per-tenant FIFO queues, so no single tenant can monopolize the upstream quota.
+"""
+
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+
+class DeficitRoundRobin:
+    """
+    Deficit round-robin over per-tenant FIFO queues.
+
+    Tenants with queued items take turns. Each turn adds quantum * weight to
+    the tenant's deficit, and its items are served while their cost fits.
+    Costs are estimated tokens, so a tenant sending large prompts gets fewer
+    requests per turn. Over time every backlogged tenant gets a share of
+    throughput proportional to its weight.
+    """
+
+    def __init__(self, quantum: float, weights: Optional[Dict[str, float]] = None):
+        self.quantum = quantum
+        self.weights = weights or {}
+        # A tenant whose turns add nothing to its deficit would make pop() spin forever
+        assert quantum > 0, "quantum must be above 0"
+        assert all(weight > 0 for weight in self.weights.values()), "tenant weights must be above 0"
+        self._queues: Dict[str, Deque[Tuple[float, Any]]] = {}
+        self._deficits: Dict[str, float] = {}
+        self._ring: Deque[str] = deque()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def weight(self, tenant: str) -> float:
+        return self.weights.get(tenant, 1.0)
+
+    def queued(self, tenant: str) -> int:
+        """Items the tenant has waiting."""
+        queue = self._queues.get(tenant)
+        return len(queue) if queue is not None else 0
+
+    def tenants_queued(self) -> int:
+        """Tenants with at least one item waiting."""
+        return len(self._ring)
+
+    def _start_turn(self, tenant: str):
+        self._deficits[tenant] += self.quantum * self.weight(tenant)
+
+    def push(self, tenant: str, item: Any, cost: float):
+        """Queue an item at the back of the tenant's queue."""
+        queue = self._queues.get(tenant)
+        if queue is None:
+            queue = self._queues[tenant] = deque()
+            self._deficits[tenant] = 0.0
+            self._ring.append(tenant)
+            if len(self._ring) == 1:
+                self._start_turn(tenant)
+        queue.append((cost, item))
+        self._size += 1
+
+    def pop(self) -> Optional[Any]:
+        """Remove and return the next item to serve, or None if nothing is queued."""
+        while self._ring:
+            tenant = self._ring[0]
+            queue = self._queues[tenant]
+            cost = queue[0][0]
+            if self._deficits[tenant] >= cost:
+                _, item = queue.popleft()
+                self._size -= 1
+                self._deficits[tenant] -= cost
+                if not queue:
+                    self._drop(tenant)
+                return item
+            # Turn over: the next tenant's turn starts
+            self._ring.rotate(-1)
+            self._start_turn(self._ring[0])
+        return None
+
+    def remove(self, tenant: str, item: Any) -> bool:
+        """Take an item out of the queue before it is served (e.g. its caller went away)."""
+        queue = self._queues.get(tenant)
+        if queue is None:
+            return False
+        for index, (_, queued) in enumerate(queue):
+            if queued is item:
+                del queue[index]
+                self._size -= 1
+                if not queue:
+                    self._drop(tenant)
+                return True
+        return False
+
+    def _drop(self, tenant: str):
+        """Forget a tenant whose queue emptied; an idle tenant does not bank deficit."""
+        was_current = self._ring[0] == tenant
+        self._ring.remove(tenant)
+        del self._queues[tenant]
+        del self._deficits[tenant]
+        if was_current and self._ring:
+            self._start_turn(self._ring[0])
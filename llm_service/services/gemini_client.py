@@ -0,0 +1,197 @@
+"""
+Gemini REST client module.
+Async access to the Gemini generateContent API over a pooled HTTP connection.
+httpx is imported, and the connection pool built, on first use to keep startup fast.
+"""
+
+import json
+import logging
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, Any, AsyncIterator, List, Optional
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class GeminiAPIError(Exception):
+    """Error returned by (or while talking to) the Gemini API."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        delta = parsedate_to_datetime(value) - datetime.now(timezone.utc)
+        return max(0.0, delta.total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def extract_text(payload: Dict[str, Any]) -> str:
+    """Concatenate the text parts of the first candidate."""
+    candidates = payload.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts)
+
+
+class GeminiClient:
+    """Async client for the Gemini REST API with keep-alive connection reuse."""
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        timeout_seconds: float,
+        max_connections: int,
+        max_keepalive_connections: int
+    ):
+        self._api_key = api_key
+        self._base_url = base_url.rstrip("/")
+        self._timeout_seconds = timeout_seconds
+        self._max_connections = max_connections
+        self._max_keepalive_connections = max_keepalive_connections
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    def _http(self) -> "httpx.AsyncClient":
+        """Return the pooled HTTP client, creating it on first use."""
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self._timeout_seconds, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=self._max_connections,
+                    max_keepalive_connections=self._max_keepalive_connections,
+                ),
+                headers={"x-goog-api-key": self._api_key},
+            )
+        return self._client
+
+    def _url(self, model: str, method: str) -> str:
+        return f"{self._base_url}/v1beta/models/{model}:{method}"
+
+    @staticmethod
+    def _body(
+        prompt: str,
+        generation_config: Dict[str, Any],
+        system_instruction: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
+        contents = [{"role": turn["role"], "parts": [{"text": turn["text"]}]} for turn in history or ()]
+        body = {
+            "contents": contents + [{"role": "user", "parts": [{"text": prompt}]}],
+            "generationConfig": generation_config,
+        }
+        if system_instruction:
+            body["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+        return body
+
+    @staticmethod
+    def _raise_for_status(response: "httpx.Response", body: bytes):
+        if response.status_code < 400:
+            return
+        message = body.decode("utf-8", errors="replace")
+        try:
+            message = json.loads(message)["error"]["message"]
+        except (ValueError, KeyError, TypeError):
+            pass
+        raise GeminiAPIError(
+            f"Gemini API returned {response.status_code}: {message}",
+            status_code=response.status_code,
+            retry_after=parse_retry_after(response.headers.get("retry-after")),
+        )
+
+    async def generate(
+        self,
+        model: str,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        system_instruction: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
+        """Run a single generateContent call and return the parsed payload; history holds earlier chat turns."""
+        import httpx
+
+        try:
+            response = await self._http().post(
+                self._url(model, "generateContent"),
+                json=self._body(prompt, generation_config, system_instruction, history),
+            )
+        except httpx.HTTPError as e:
+            raise GeminiAPIError(f"Gemini request failed: {e!r}") from e
+
+        self._raise_for_status(response, response.content)
+        payload = response.json()
+        return {
+            "text": extract_text(payload),
+            "usage_metadata": payload.get("usageMetadata"),
+            "prompt_feedback": payload.get("promptFeedback"),
+        }
+
+    async def stream(
+        self,
+        model: str,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        system_instruction: Optional[str] = None,
+        timeout: Optional[float] = None,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a streamGenerateContent call, yielding one parsed payload per SSE event.
+
+        Leaving the iteration early closes the connection, which stops generation upstream.
+        timeout overrides the client's per-operation timeout for this call.
+        """
+        import httpx
+
+        try:
+            async with self._http().stream(
+                "POST",
+                self._url(model, "streamGenerateContent"),
+                params={"alt": "sse"},
+                json=self._body(prompt, generation_config, system_instruction, history),
+                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+            ) as response:
+                if response.status_code >= 400:
+                    self._raise_for_status(response, await response.aread())
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    payload = json.loads(line[5:].strip())
+                    yield {
+                        "text": extract_text(payload),
+                        "usage_metadata": payload.get("usageMetadata"),
+                    }
+        except httpx.HTTPError as e:
+            raise GeminiAPIError(f"Gemini stream failed: {e!r}") from e
+
+    async def warm_up(self, model: str):
+        """Open a pooled connection (DNS, TLS) ahead of the first request by fetching the model's metadata."""
+        import httpx
+
+        try:
+            response = await self._http().get(f"{self._base_url}/v1beta/models/{model}")
+        except httpx.HTTPError as e:
+            raise GeminiAPIError(f"Gemini warm-up failed: {e!r}") from e
+        self._raise_for_status(response, response.content)
+
+    async def aclose(self):
+        """Close pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
@@ -0,0 +1,396 @@
+"""
+Background job queue module for long-running generations.
+A bounded worker pool runs queued jobs by priority, with an optional SQLite store so jobs survive restarts
+and can be shared by several service workers.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, Optional
+
+from . import metrics
+from .errors import UpstreamUnavailableError
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first; jobs with the same priority run in submission order
+JOB_PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+FINISHED_STATUSES = {"succeeded", "failed"}
+
+JobHandler = Callable[[Dict[str, Any], str], Awaitable[Dict[str, Any]]]
+
+
+class Job:
+    """One queued generation and its outcome."""
+
+    def __init__(
+        self,
+        operation: str,
+        payload: Dict[str, Any],
+        caller: str,
+        priority: str = "normal",
+        job_id: Optional[str] = None,
+        status: str = "queued",
+        created_at: Optional[float] = None,
+        started_at: Optional[float] = None,
+        finished_at: Optional[float] = None,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None
+    ):
+        self.id = job_id or uuid.uuid4().hex
+        self.operation = operation
+        self.payload = payload
+        self.caller = caller
+        self.priority = priority
+        self.status = status
+        self.created_at = created_at or time.time()
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.result = result
+        self.error = error
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def set_status(self, status: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        """Move to a new status and wake everyone watching the job."""
+        self.status = status
+        if status == "running":
+            self.started_at = time.time()
+        elif status in FINISHED_STATUSES:
+            self.finished_at = time.time()
+        self.result = result
+        self.error = error
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    @property
+    def changed(self) -> asyncio.Event:
+        """Event set on the job's next status change."""
+        return self._changed
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Public view of the job (no payload or caller)."""
+        return {
+            "job_id": self.id,
+            "operation": self.operation,
+            "priority": self.priority,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobStore:
+    """
+    SQLite persistence for jobs; every status change is written through.
+
+    Several processes may share one store. A job runs in whichever process
+    claims it first, and any process can report its status.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, operation TEXT NOT NULL, payload TEXT NOT NULL, caller TEXT NOT NULL, "
+            "priority TEXT NOT NULL, status TEXT NOT NULL, created_at REAL NOT NULL, started_at REAL, "
+            "finished_at REAL, result TEXT, error TEXT)"
+        )
+
+    def save(self, job: Job):
+        self._db.execute(
+            "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                job.id, job.operation, json.dumps(job.payload), job.caller, job.priority, job.status,
+                job.created_at, job.started_at, job.finished_at,
+                json.dumps(job.result) if job.result is not None else None, job.error,
+            ),
+        )
+
+    @staticmethod
+    def _job(row) -> Job:
+        return Job(
+            operation=row[1], payload=json.loads(row[2]), caller=row[3], priority=row[4],
+            job_id=row[0], status=row[5], created_at=row[6], started_at=row[7],
+            finished_at=row[8], result=json.loads(row[9]) if row[9] else None, error=row[10],
+        )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._db.execute(
+            "SELECT id, operation, payload, caller, priority, status, created_at, started_at, "
+            "finished_at, result, error FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        return self._job(row) if row else None
+
+    def load_pending(self, stale_before: float) -> list:
+        """
+        Return queued jobs, oldest first. Jobs marked running since before
+        stale_before belonged to a process that died, so they are queued again.
+        """
+        self._db.execute(
+            "UPDATE jobs SET status = 'queued', started_at = NULL "
+            "WHERE status = 'running' AND started_at < ?",
+            (stale_before,),
+        )
+        rows = self._db.execute(
+            "SELECT id, operation, payload, caller, priority, status, created_at, started_at, "
+            "finished_at, result, error FROM jobs WHERE status = 'queued' ORDER BY created_at"
+        ).fetchall()
+        return [self._job(row) for row in rows]
+
+    def claim(self, job_id: str, started_at: float) -> bool:
+        """Mark a queued job as running; False if another process got to it first."""
+        cursor = self._db.execute(
+            "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ? AND status = 'queued'",
+            (started_at, job_id),
+        )
+        return cursor.rowcount == 1
+
+    def requeue(self, job_ids: list):
+        """Put jobs interrupted by a shutdown back in the queue."""
+        self._db.executemany(
+            "UPDATE jobs SET status = 'queued', started_at = NULL WHERE id = ? AND status = 'running'",
+            [(job_id,) for job_id in job_ids],
+        )
+
+    def delete_finished(self, finished_before: float):
+        self._db.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at <= ?", (finished_before,))
+
+
+class JobQueue:
+    """
+    Priority queue of background jobs served by a fixed pool of workers.
+
+    The worker count bounds how much upstream capacity background work can take
+    at once. Finished jobs are kept for result_ttl_seconds so callers can poll
+    for them. Submitting beyond max_queued raises a 503. With a store, a job
+    left running for stale_after_seconds by a process that died is run again.
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, JobHandler],
+        workers: int,
+        max_queued: int,
+        result_ttl_seconds: int,
+        sqlite_path: Optional[str] = None,
+        stale_after_seconds: float = 300,
+        poll_interval: float = 0.5
+    ):
+        self.handlers = handlers
+        self.worker_count = workers
+        self.max_queued = max_queued
+        self.result_ttl_seconds = result_ttl_seconds
+        self.stale_after_seconds = stale_after_seconds
+        self.poll_interval = poll_interval
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._sequence = itertools.count()
+        self._workers = []
+        self._queued = 0
+        self._queued_by_operation: Dict[str, int] = {operation: 0 for operation in handlers}
+        self._stats = {"submitted": 0, "succeeded": 0, "failed": 0, "rejected": 0, "recovered": 0}
+        self._store = None
+        if sqlite_path:
+            try:
+                self._store = JobStore(sqlite_path)
+                logger.info(f"💾 Job queue persisted to {sqlite_path}")
+            except sqlite3.Error as e:
+                logger.error(f"Failed to open job database {sqlite_path}: {e}")
+
+    async def start(self):
+        """Start the workers and re-queue jobs left unfinished by a previous run."""
+        self._queue = asyncio.PriorityQueue()
+        self._queued = 0
+        for operation in self.handlers:
+            self._queued_by_operation[operation] = 0
+            metrics.JOBS_QUEUED.labels(operation).set(0)
+        if self._store is not None:
+            try:
+                jobs = await asyncio.to_thread(self._store.load_pending, time.time() - self.stale_after_seconds)
+            except sqlite3.Error as e:
+                logger.error(f"Failed to load persisted jobs: {e}")
+                jobs = []
+            for job in jobs:
+                self._jobs[job.id] = job
+        recovered = 0
+        for job in self._jobs.values():
+            if not job.finished:
+                # A job that was running when the worker stopped starts over
+                job.status = "queued"
+                self._enqueue(job)
+                recovered += 1
+        if recovered:
+            self._stats["recovered"] += recovered
+            logger.info(f"♻️  Re-queued {recovered} unfinished jobs")
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        """Cancel the workers; with a store, interrupted jobs are queued again for the next start."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        interrupted = [job.id for job in self._jobs.values() if job.status == "running"]
+        if interrupted and self._store is not None:
+            try:
+                await asyncio.to_thread(self._store.requeue, interrupted)
+            except sqlite3.Error as e:
+                logger.error(f"Failed to re-queue interrupted jobs: {e}")
+
+    def _enqueue(self, job: Job):
+        self._queued += 1
+        self._queued_by_operation[job.operation] += 1
+        metrics.JOBS_QUEUED.labels(job.operation).inc()
+        self._queue.put_nowait((JOB_PRIORITIES[job.priority], next(self._sequence), job.id))
+
+    async def submit(
+        self,
+        operation: str,
+        payload: Dict[str, Any],
+        caller: str,
+        priority: str = "normal",
+        limit: Optional[int] = None
+    ) -> Job:
+        """Queue a job and return it immediately; limit caps queued jobs of this operation."""
+        if self._queue is None:
+            raise UpstreamUnavailableError("Job queue is not running")
+        if self._queued >= self.max_queued or (
+            limit is not None and self._queued_by_operation[operation] >= limit
+        ):
+            self._stats["rejected"] += 1
+            raise UpstreamUnavailableError("Job queue is full, please retry later", retry_after=30)
+
+        await self._expire()
+        job = Job(operation, payload, caller, priority)
+        self._jobs[job.id] = job
+        await self._persist(job)
+        self._enqueue(job)
+        self._stats["submitted"] += 1
+        return job
+
+    async def get(self, job_id: str, caller: Optional[str] = None) -> Optional[Job]:
+        """Return a job; with caller set, only if that caller submitted it."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = await self._load(job_id)
+        if job is None or (caller is not None and job.caller != caller):
+            return None
+        return job
+
+    async def _load(self, job_id: str) -> Optional[Job]:
+        """Read a job held by another process (or finished before a restart) from the store."""
+        if self._store is None:
+            return None
+        try:
+            return await asyncio.to_thread(self._store.get, job_id)
+        except sqlite3.Error as e:
+            logger.error(f"Job store read failed: {e}")
+            return None
+
+    async def watch(self, job: Job) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the job's state now and after every change until it finishes."""
+        while True:
+            changed = job.changed
+            yield job.to_dict()
+            if job.finished:
+                return
+            if job.id in self._jobs:
+                await changed.wait()
+                continue
+            # Held by another process: poll the store for changes
+            status = job.status
+            while job.status == status:
+                await asyncio.sleep(self.poll_interval)
+                job = await self._load(job.id) or job
+
+    async def _worker(self):
+        while True:
+            _, _, job_id = await self._queue.get()
+            self._queued -= 1
+            job = self._jobs[job_id]
+            self._queued_by_operation[job.operation] -= 1
+            metrics.JOBS_QUEUED.labels(job.operation).dec()
+            if not await self._claim(job):
+                # Another worker sharing the store is running it
+                del self._jobs[job_id]
+                continue
+            metrics.JOB_QUEUE_WAIT.labels(job.operation).observe(time.time() - job.created_at)
+            await self._run(job)
+
+    async def _claim(self, job: Job) -> bool:
+        if self._store is None:
+            return True
+        try:
+            return await asyncio.to_thread(self._store.claim, job.id, time.time())
+        except sqlite3.Error as e:
+            logger.error(f"Job store claim failed: {e}")
+            return False
+
+    async def _run(self, job: Job):
+        job.set_status("running")
+        try:
+            result = await self.handlers[job.operation](job.payload, job.caller)
+            job.set_status("succeeded", result=result)
+            self._stats["succeeded"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e)
+            logger.error(f"Job {job.id} ({job.operation}) failed: {detail}")
+            job.set_status("failed", error=detail)
+            self._stats["failed"] += 1
+        metrics.JOBS_FINISHED.labels(job.operation, job.status).inc()
+        await self._persist(job)
+
+    async def _persist(self, job: Job):
+        if self._store is None:
+            return
+        try:
+            await asyncio.to_thread(self._store.save, job)
+        except sqlite3.Error as e:
+            logger.error(f"Job store write failed: {e}")
+
+    async def _expire(self):
+        """Drop finished jobs older than the result TTL."""
+        cutoff = time.time() - self.result_ttl_seconds
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and job.finished_at <= cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if expired and self._store is not None:
+            try:
+                await asyncio.to_thread(self._store.delete_finished, cutoff)
+            except sqlite3.Error as e:
+                logger.error(f"Job store cleanup failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth, worker count and job outcome counters."""
+        running = sum(1 for job in self._jobs.values() if job.status == "running")
+        return {
+            **self._stats,
+            "queued": self._queued,
+            "queued_by_operation": dict(self._queued_by_operation),
+            "running": running,
+            "workers": self.worker_count,
+            "max_queued": self.max_queued,
+            "persistent": self._store is not None,
+        }
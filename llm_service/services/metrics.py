@@ -0,0 +1,204 @@
+"""
+Prometheus metrics for the AI service.
+All latency metrics are labeled by operation (generate/shorten/expand/batch).
+"""
+
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from . import tracing
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+FAST_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+
+REQUEST_LATENCY = Histogram(
+    "ai_request_duration_seconds",
+    "End-to-end request latency",
+    ["operation", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_LATENCY = Histogram(
+    "ai_upstream_duration_seconds",
+    "Latency of individual Gemini calls",
+    ["operation", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+MODEL_LATENCY = Histogram(
+    "ai_model_duration_seconds",
+    "Latency of Gemini calls by model, including hedged duplicates",
+    ["model", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "ai_time_to_first_token_seconds",
+    "Time from starting a streamed Gemini call to its first text chunk",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+PROMPT_BUILD_TIME = Histogram(
+    "ai_prompt_build_seconds",
+    "Time spent building prompts",
+    ["operation"],
+    buckets=FAST_BUCKETS,
+)
+UPSTREAM_SLOT_WAIT = Histogram(
+    "ai_upstream_slot_wait_seconds",
+    "Time spent waiting for a free upstream concurrency slot",
+    ["operation"],
+    buckets=FAST_BUCKETS + LATENCY_BUCKETS[4:],
+)
+ADMISSION_WAIT = Histogram(
+    "ai_admission_wait_seconds",
+    "Time spent waiting for rate-limit admission",
+    ["operation"],
+    buckets=FAST_BUCKETS + LATENCY_BUCKETS[4:],
+)
+JOB_QUEUE_WAIT = Histogram(
+    "ai_job_queue_wait_seconds",
+    "Time background jobs spend queued before a worker picks them up",
+    ["operation"],
+    buckets=FAST_BUCKETS + LATENCY_BUCKETS[4:],
+)
+
+RETRIES = Counter(
+    "ai_upstream_retries_total",
+    "Gemini calls retried after a failed attempt",
+    ["operation"],
+)
+CACHE_LOOKUPS = Counter(
+    "ai_cache_lookups_total",
+    "Response cache lookups by result (hit/miss/bypass)",
+    ["operation", "result"],
+)
+TOKENS = Counter(
+    "ai_tokens_total",
+    "Upstream tokens consumed, by kind (prompt/completion)",
+    ["operation", "kind"],
+)
+HEDGED_REQUESTS = Counter(
+    "ai_hedged_requests_total",
+    "Upstream calls that were hedged, by which copy answered first (original/hedge)",
+    ["model", "winner"],
+)
+MODEL_FALLBACKS = Counter(
+    "ai_model_fallbacks_total",
+    "Attempts routed to the fallback model",
+    ["model"],
+)
+CANCELLED_REQUESTS = Counter(
+    "ai_cancelled_requests_total",
+    "Requests whose upstream work was abandoned, by reason (disconnect/deadline)",
+    ["operation", "reason"],
+)
+JOBS_FINISHED = Counter(
+    "ai_jobs_finished_total",
+    "Background jobs finished, by status (succeeded/failed)",
+    ["operation", "status"],
+)
+CIRCUIT_REJECTIONS = Counter(
+    "ai_circuit_rejections_total",
+    "Requests failed fast because the upstream circuit was open",
+)
+TENANT_QUOTA_REJECTIONS = Counter(
+    "ai_tenant_quota_rejections_total",
+    "Requests rejected because their tenant used up its own quota",
+    ["operation"],
+)
+REFINE_TURNS = Counter(
+    "ai_refine_turns_total",
+    "Refine session turns by prompt kind (full draft, follow-up instruction, or edits only)",
+    ["kind"],
+)
+CIRCUIT_TRANSITIONS = Counter(
+    "ai_circuit_transitions_total",
+    "Upstream circuit state changes, by the state entered (closed/open/half_open)",
+    ["state"],
+)
+PREGENERATIONS = Counter(
+    "ai_pregenerations_total",
+    "Task events received for speculative generation, by event and result (queued/skipped reason)",
+    ["event", "result"],
+)
+NOT_MODIFIED = Counter(
+    "ai_not_modified_total",
+    "Requests answered with 304 because the caller already held content for the prompt",
+    ["operation"],
+)
+STRUCTURED_OUTPUTS = Counter(
+    "ai_structured_outputs_total",
+    "Structured generate answers by result (valid/compacted/invalid/too_long)",
+    ["result"],
+)
+COALESCED = Counter(
+    "ai_coalesced_requests_total",
+    "Requests that joined an identical call already in flight",
+    ["operation"],
+)
+
+REQUESTS_IN_FLIGHT = Gauge(
+    "ai_requests_in_flight",
+    "Requests currently being handled",
+    ["operation"],
+)
+UPSTREAM_SLOTS_IN_USE = Gauge(
+    "ai_upstream_slots_in_use",
+    "Upstream concurrency slots currently held",
+)
+UPSTREAM_SLOTS_LIMIT = Gauge(
+    "ai_upstream_slots_limit",
+    "Configured maximum concurrent upstream calls",
+)
+JOBS_QUEUED = Gauge(
+    "ai_jobs_queued",
+    "Background jobs waiting for a worker",
+    ["operation"],
+)
+CIRCUIT_STATE = Gauge(
+    "ai_circuit_state",
+    "Upstream circuit state: 0 closed, 1 half-open, 2 open",
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "ai_admission_queue_depth",
+    "Callers waiting for rate-limit admission",
+    multiprocess_mode="livesum",
+)
+TENANTS_QUEUED = Gauge(
+    "ai_admission_tenants_queued",
+    "Tenants with at least one caller waiting for admission",
+    multiprocess_mode="livesum",
+)
+
+
+class RequestTracker:
+    """Track one request's in-flight gauge and end-to-end latency."""
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self._started = time.perf_counter()
+        self._finished = False
+        REQUESTS_IN_FLIGHT.labels(operation).inc()
+        tracing.mark_handler(operation)
+
+    def finish(self, status: str):
+        """Record the request as finished with the given status (success/error/cancelled)."""
+        if self._finished:
+            return
+        self._finished = True
+        REQUESTS_IN_FLIGHT.labels(self.operation).dec()
+        REQUEST_LATENCY.labels(self.operation, status).observe(time.perf_counter() - self._started)
+
+
+@contextmanager
+def track_request(operation: str):
+    """Record end-to-end latency and in-flight count for a request, and its handler span when traced."""
+    tracker = RequestTracker(operation)
+    try:
+        with tracing.span("handler", operation=operation):
+            yield tracker
+    except BaseException as e:
+        # 499: the client went away, which is not a service error
+        tracker.finish("cancelled" if getattr(e, "status_code", None) == 499 else "error")
+        raise
+    tracker.finish("success")
@@ -0,0 +1,117 @@
+"""
+Request profiling module for the AI service.
+Runs pyinstrument's sampling profiler over the next N requests on demand and keeps their reports.
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _pyinstrument():
+    """The pyinstrument module, or None if it is not installed."""
+    try:
+        import pyinstrument
+    except ImportError:
+        return None
+    return pyinstrument
+
+
+class RequestProfiler:
+    """
+    Sampling profiler for a requested number of upcoming requests.
+
+    arm(n) profiles the next n requests (optionally only paths under a
+    prefix). pyinstrument runs one profiler per thread, so requests arriving
+    while one is being profiled are skipped and do not use up the count.
+    Profiling is in async mode: time the request spends awaiting is shown as
+    such rather than attributed to whatever else the event loop ran. The last
+    max_reports reports are kept in memory.
+    """
+
+    def __init__(self, max_reports: int = 20, interval_ms: float = 1.0):
+        self._pyinstrument = _pyinstrument()
+        self.max_reports = max_reports
+        self.interval_ms = interval_ms
+        self.remaining = 0
+        self.path_prefix: Optional[str] = None
+        self._active = False
+        self._reports: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    @property
+    def available(self) -> bool:
+        return self._pyinstrument is not None
+
+    def arm(self, requests: int, interval_ms: Optional[float] = None, path_prefix: Optional[str] = None):
+        """Profile the next requests requests, replacing any earlier arming."""
+        if not self.available:
+            raise RuntimeError("Request profiling requires pyinstrument (pip install pyinstrument)")
+        self.remaining = requests
+        self.interval_ms = interval_ms or self.interval_ms
+        self.path_prefix = path_prefix
+        logger.info(f"🔬 Profiling the next {requests} requests" + (f" under {path_prefix}" if path_prefix else ""))
+
+    def disarm(self):
+        self.remaining = 0
+        self.path_prefix = None
+
+    def start(self, path: str):
+        """Start profiling a request if armed and no other request is being profiled; return the profiler or None."""
+        if not self.remaining or self._active:
+            return None
+        if self.path_prefix and not path.startswith(self.path_prefix):
+            return None
+        self.remaining -= 1
+        self._active = True
+        profiler = self._pyinstrument.Profiler(interval=self.interval_ms / 1000, async_mode="enabled")
+        try:
+            profiler.start()
+        except Exception:
+            self._active = False
+            raise
+        return profiler
+
+    def finish(self, profiler, trace):
+        """Stop profiling a request and keep its report under the request's trace id."""
+        try:
+            session = profiler.stop()
+        finally:
+            self._active = False
+        self._reports[trace.trace_id] = {
+            "summary": {
+                "id": trace.trace_id,
+                "name": trace.name,
+                "operation": trace.operation,
+                "status": trace.status,
+                "started_at": round(trace.started_at, 3),
+                "duration_ms": trace.duration_ms,
+                "samples": session.sample_count,
+            },
+            "profiler": profiler,
+        }
+        while len(self._reports) > self.max_reports:
+            self._reports.popitem(last=False)
+
+    def reports(self) -> List[Dict[str, Any]]:
+        """Kept reports, newest first."""
+        return [report["summary"] for report in reversed(self._reports.values())]
+
+    def render(self, report_id: str, html: bool = False) -> Optional[str]:
+        """A report as text or as a self-contained HTML page, or None if it is unknown."""
+        report = self._reports.get(report_id)
+        if report is None:
+            return None
+        if html:
+            return report["profiler"].output_html()
+        return report["profiler"].output_text(unicode=True, color=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": self.available,
+            "remaining": self.remaining,
+            "path_prefix": self.path_prefix,
+            "interval_ms": self.interval_ms,
+            "reports": len(self._reports),
+        }
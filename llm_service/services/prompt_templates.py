@@ -0,0 +1,190 @@
+"""
+Prompt template module for AI generation.
+Static instructions are built once per operation and stage category and sent as the system instruction.
+"""
+
+from typing import Dict, NamedTuple, Optional, Tuple
+
+
+class RenderedPrompt(NamedTuple):
+    """A prompt split into its static system instruction and per-request text."""
+
+    system_instruction: str
+    text: str
+
+
+class PromptTemplate:
+    """Precompiled prompt: a fixed system instruction plus a small per-request body."""
+
+    __slots__ = ("system_instruction", "_body")
+
+    def __init__(self, system_instruction: str, body: str):
+        self.system_instruction = system_instruction
+        self._body = body
+
+    def render(self, **fields: str) -> RenderedPrompt:
+        """Fill the per-request fields."""
+        return RenderedPrompt(self.system_instruction, self._body.format(**fields))
+
+
+# Stage names (lowercased) to the category that selects stage-specific guidance
+STAGE_CATEGORIES: Dict[str, str] = {
+    **dict.fromkeys(["to do", "todo", "planned", "backlog"], "planning"),
+    **dict.fromkeys(["in progress", "development", "working", "active"], "development"),
+    **dict.fromkeys(["in review", "review", "testing", "qa"], "review"),
+    **dict.fromkeys(["done", "completed", "finished"], "done"),
+}
+
+DEFAULT_STAGE_CATEGORY = "other"
+
+STAGE_FOCUS: Dict[str, str] = {
+    "planning": """Focus on:
+- Planning and preparation steps
+- Requirements analysis
+- Dependency identification
+- Initial approach definition""",
+    "development": """Focus on:
+- Current implementation details
+- Progress tracking
+- Active development steps
+- Immediate next actions""",
+    "review": """Focus on:
+- Review criteria and checklist
+- Testing requirements
+- Quality assurance steps
+- Approval process""",
+    "done": """Focus on:
+- Completion verification
+- Final deliverables
+- Documentation updates
+- Closure activities""",
+    DEFAULT_STAGE_CATEGORY: "Provide appropriate guidance for the task's specific stage.",
+}
+
+GENERATE_INSTRUCTION = """You are an expert project management assistant. Generate a detailed, actionable task description.
+
+CRITICAL REQUIREMENT: The description MUST be concise, between 250-400 characters, and focus ONLY on the specific task scope (no project-wide objectives).
+
+Write a laconic, well-scoped description that is actionable for the assignee.
+
+STAGE GUIDANCE:
+{stage_focus}
+
+Create a comprehensive task description that includes:
+
+1. **Purpose & Objective**: What needs to be accomplished and why
+2. **Specific Requirements**: Clear, actionable steps or deliverables
+3. **Acceptance Criteria**: How to know when the task is complete
+4. **Technical Considerations**: Implementation details, dependencies, or constraints
+
+Guidelines:
+- Be specific and actionable, not generic
+- Include concrete steps or deliverables
+- Build upon any existing description provided
+- Make it immediately actionable for a developer/team member
+- Focus on practical implementation details
+- Avoid vague phrases like "provide feedback" or "based on requirements"
+- CRITICAL: Final description must be 250-400 characters (count carefully!)
+
+Generate a professional, detailed description that a team member can immediately understand and act upon."""
+
+STRUCTURED_GENERATE_INSTRUCTION = """You are an expert project management assistant. Describe the task you are given as JSON with three fields.
+
+CRITICAL REQUIREMENT: Rendered as text, the whole description MUST stay under 400 characters, so every field has to be terse
+and focus ONLY on the specific task scope (no project-wide objectives).
+
+STAGE GUIDANCE:
+{stage_focus}
+
+Fields:
+- purpose: one sentence on what needs to be accomplished and why (under 120 characters)
+- requirements: 2-4 concrete, actionable steps or deliverables (under 60 characters each)
+- acceptance_criteria: 1-3 checkable conditions for when the task is complete (under 60 characters each)
+
+Guidelines:
+- Be specific and actionable, not generic
+- Build upon any existing description provided
+- Avoid vague phrases like "provide feedback" or "based on requirements"
+- No markdown, numbering or bullet characters inside the fields"""
+
+BATCH_INSTRUCTION = """You are an expert project management assistant. Generate a detailed, actionable description for EACH task you are given.
+
+CRITICAL REQUIREMENT: Each description MUST be concise, between 250-400 characters, and focus ONLY on that task's scope.
+
+For each task cover its purpose, concrete requirements and acceptance criteria, tailored to its current stage
+(planning for to-do/backlog, implementation for in-progress, review and testing for review/QA, verification and closure for done).
+Build upon any existing description. Avoid vague phrases like "provide feedback" or "based on requirements".
+
+Return a JSON array with exactly one object per task, in the same order: [{"index": 0, "description": "..."}]"""
+
+SHORTEN_INSTRUCTION = """Shorten the task description you are given while preserving all critical information:
+- Keep all essential requirements and acceptance criteria
+- Maintain technical specifications
+- Preserve important deadlines or constraints
+- Use bullet points or concise paragraphs
+- Target 50-150 words
+- Ensure actionability is retained
+
+Provide a concise but complete version."""
+
+EXPAND_INSTRUCTION = """Expand the task description you are given with additional technical details and considerations.
+
+Add relevant details such as:
+- Technical implementation considerations
+- Potential edge cases and error scenarios
+- Testing strategies and validation steps
+- Dependencies and integration points
+- Performance and security considerations
+- Documentation requirements
+- Risk assessment and mitigation
+- Timeline and milestone suggestions
+
+Keep the original content and enhance it with professional insights. Target 200-500 words.
+
+Provide the expanded version."""
+
+REFINE_INSTRUCTION = """You are helping a user iteratively edit a task description.
+
+Each user message is an instruction for changing the current description: the one in the message, or else your previous answer.
+- Apply the instruction and keep everything it does not ask to change
+- Keep requirements, acceptance criteria, technical specifications and deadlines unless told otherwise
+- Reply with the complete revised description only, without commentary"""
+
+TASK_BODY = """TASK DETAILS:
+- Title: {title}
+- Current Stage: {stage}{existing}"""
+
+TEMPLATES: Dict[Tuple[str, Optional[str]], PromptTemplate] = {
+    **{
+        ("generate", category): PromptTemplate(
+            GENERATE_INSTRUCTION.format(stage_focus=focus), TASK_BODY
+        )
+        for category, focus in STAGE_FOCUS.items()
+    },
+    **{
+        ("generate_structured", category): PromptTemplate(
+            STRUCTURED_GENERATE_INSTRUCTION.format(stage_focus=focus), TASK_BODY
+        )
+        for category, focus in STAGE_FOCUS.items()
+    },
+    ("batch", None): PromptTemplate(BATCH_INSTRUCTION, "TASKS:\n{task_list}"),
+    ("shorten", None): PromptTemplate(SHORTEN_INSTRUCTION, "ORIGINAL DESCRIPTION:\n{description}"),
+    ("expand", None): PromptTemplate(EXPAND_INSTRUCTION, "ORIGINAL DESCRIPTION:\n{description}"),
+    # First refine turn, or the first after the user edited the draft: carries the whole draft
+    ("refine", None): PromptTemplate(
+        REFINE_INSTRUCTION, "CURRENT DESCRIPTION:\n{description}\n\nINSTRUCTION:\n{instruction}"
+    ),
+    # Later turns: the draft is the model's previous answer in the chat history
+    ("refine_followup", None): PromptTemplate(REFINE_INSTRUCTION, "INSTRUCTION:\n{instruction}"),
+}
+
+
+def stage_category(stage: str) -> str:
+    """Map a free-form stage name to its guidance category."""
+    return STAGE_CATEGORIES.get(stage.strip().lower(), DEFAULT_STAGE_CATEGORY)
+
+
+def get_template(operation: str, stage: Optional[str] = None) -> PromptTemplate:
+    """Return the precompiled template for an operation (and stage, for generate and generate_structured)."""
+    category = stage_category(stage) if stage is not None else None
+    return TEMPLATES[(operation, category)]
@@ -0,0 +1,569 @@
+"""
+Admission control module for the Gemini quota.
+Token buckets for requests/min and tokens/min with AIMD rate adaptation and per-tenant fair queueing.
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Dict, Any, Optional
+
+from . import metrics
+from .errors import TenantQuotaExceededError, UpstreamUnavailableError
+from .fair_queue import DeficitRoundRobin
+from .shared_state import StateBackend
+from .tenant import ANONYMOUS_TENANT
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate."""
+
+    def __init__(self, rate_per_minute: float):
+        self.base_rate = rate_per_minute
+        self.rate = rate_per_minute
+        self.capacity = rate_per_minute
+        self._tokens = rate_per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate / 60)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 if available now)."""
+        self._refill()
+        # Requests larger than the bucket only need it to be full
+        needed = min(amount, self.capacity) - self._tokens
+        if needed <= 0:
+            return 0.0
+        return needed * 60 / self.rate
+
+    def take(self, amount: float):
+        """Remove tokens; the balance may go negative to charge actual usage after the fact."""
+        self._refill()
+        self._tokens -= amount
+
+    def scale(self, factor: float):
+        """Set the refill rate to a fraction of the configured rate."""
+        self._refill()
+        self.rate = self.base_rate * factor
+
+
+class SharedBudget:
+    """
+    Request and token budget kept in a shared state backend, so every worker
+    draws from one quota.
+
+    The AIMD rate factor and any Retry-After pause are shared as well. Times are
+    wall-clock so they mean the same thing in every process.
+    """
+
+    KEY = "admission:budget"
+    TTL_SECONDS = 24 * 3600
+
+    def __init__(
+        self,
+        backend: StateBackend,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        min_rate_factor: float,
+        key: str = KEY
+    ):
+        self.backend = backend
+        self.key = key
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.min_rate_factor = min_rate_factor
+        # Last values seen, for stats
+        self.factor = 1.0
+        self.blocked_until = 0.0
+
+    def _refill(self, state: Optional[Dict[str, Any]], now: float) -> Dict[str, Any]:
+        if state is None:
+            state = {
+                "requests": self.requests_per_minute,
+                "tokens": self.tokens_per_minute,
+                "updated": now,
+                "factor": 1.0,
+                "blocked_until": 0.0,
+                "last_decrease": 0.0,
+            }
+        elapsed = max(0.0, now - state["updated"])
+        state["requests"] = min(
+            self.requests_per_minute,
+            state["requests"] + elapsed * self.requests_per_minute * state["factor"] / 60,
+        )
+        state["tokens"] = min(
+            self.tokens_per_minute,
+            state["tokens"] + elapsed * self.tokens_per_minute * state["factor"] / 60,
+        )
+        state["updated"] = now
+        return state
+
+    def _wait_time(self, state: Dict[str, Any], estimated_tokens: float) -> float:
+        def bucket_wait(available: float, capacity: float, amount: float) -> float:
+            needed = min(amount, capacity) - available
+            return max(0.0, needed * 60 / (capacity * state["factor"]))
+
+        return max(
+            state["blocked_until"] - state["updated"],
+            bucket_wait(state["requests"], self.requests_per_minute, 1),
+            bucket_wait(state["tokens"], self.tokens_per_minute, estimated_tokens),
+        )
+
+    def _remember(self, state: Dict[str, Any]):
+        self.factor = state["factor"]
+        self.blocked_until = state["blocked_until"]
+
+    async def take(self, estimated_tokens: float) -> float:
+        """Take budget and return 0, or return the seconds to wait without taking anything."""
+        def fn(state):
+            state = self._refill(state, time.time())
+            wait = self._wait_time(state, estimated_tokens)
+            if wait <= 0:
+                state["requests"] -= 1
+                state["tokens"] -= estimated_tokens
+            return state, (wait, state)
+
+        wait, state = await self.backend.update(self.key, fn, self.TTL_SECONDS)
+        self._remember(state)
+        return wait
+
+    async def charge(self, tokens: float):
+        def fn(state):
+            state = self._refill(state, time.time())
+            state["tokens"] -= tokens
+            return state, state
+
+        self._remember(await self.backend.update(self.key, fn, self.TTL_SECONDS))
+
+    async def adjust(self, rate_limited: bool, retry_after: Optional[float] = None) -> bool:
+        """Apply AIMD to the shared factor; return True if this call halved it."""
+        def fn(state):
+            now = time.time()
+            state = self._refill(state, now)
+            halved = False
+            if not rate_limited:
+                state["factor"] = min(1.0, state["factor"] + 0.05)
+            else:
+                if retry_after:
+                    state["blocked_until"] = max(state["blocked_until"], now + retry_after)
+                # A burst of 429s from calls in flight across all workers counts as one signal
+                if now - state["last_decrease"] >= 1.0:
+                    state["last_decrease"] = now
+                    state["factor"] = max(self.min_rate_factor, state["factor"] / 2)
+                    halved = True
+            return state, (halved, state)
+
+        halved, state = await self.backend.update(self.key, fn, self.TTL_SECONDS)
+        self._remember(state)
+        return halved
+
+
+# Rate standing in for "no limit" on a tenant quota dimension
+UNLIMITED = 1e12
+
+
+class TenantQuota:
+    """
+    One tenant's own request and token budget, checked before it joins the shared queue.
+
+    A quota of 0 leaves that dimension unlimited. With a shared backend the
+    buckets live in the backend, so a tenant's quota holds across workers.
+    """
+
+    def __init__(
+        self,
+        tenant: str,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        backend: Optional[StateBackend] = None
+    ):
+        requests_per_minute = requests_per_minute or UNLIMITED
+        tokens_per_minute = tokens_per_minute or UNLIMITED
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._shared = None
+        if backend is not None and backend.shared:
+            self._shared = SharedBudget(
+                backend, requests_per_minute, tokens_per_minute, 1.0, key=f"admission:tenant:{tenant}"
+            )
+
+    async def take(self, estimated_tokens: float) -> float:
+        """Take budget and return 0, or return the seconds to wait without taking anything."""
+        if self._shared is not None:
+            return await self._shared.take(estimated_tokens)
+        wait = max(self._requests.wait_time(1), self._tokens.wait_time(estimated_tokens))
+        if wait <= 0:
+            self._requests.take(1)
+            self._tokens.take(estimated_tokens)
+        return wait
+
+    def charge(self, tokens: float) -> Optional[Awaitable]:
+        """Charge tokens; returns the backend update to run when the quota is shared."""
+        if self._shared is not None:
+            return self._shared.charge(tokens)
+        self._tokens.take(tokens)
+        return None
+
+
+class TenantState:
+    """Quota, queue-wait samples and counters for one tenant."""
+
+    def __init__(self, quota: Optional[TenantQuota]):
+        self.quota = quota
+        self.wait_times = deque(maxlen=200)
+        self.counters = {"admitted": 0, "rejected": 0, "quota_rejected": 0, "tokens": 0.0}
+
+
+class _Waiter:
+    """A foreground caller queued for admission."""
+
+    __slots__ = ("tokens", "started", "future")
+
+    def __init__(self, tokens: float):
+        self.tokens = tokens
+        self.started = time.monotonic()
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class AdmissionController:
+    """
+    Shared admission control in front of the upstream model.
+
+    Callers queue per tenant (bearer token or project) for request and token
+    budget, and a dispatcher hands budget out across tenants by deficit
+    round-robin weighted on estimated tokens, so one busy tenant cannot starve
+    the others. A tenant may also have its own requests/min and tokens/min
+    quota; a foreground caller over it gets a 429. A 429 from upstream halves
+    the allowed rate and pauses admission for Retry-After; each success adds
+    back a slice of it. When the wait queue (or the tenant's share of it) is
+    full, new callers are rejected with a 503. Background callers never join
+    the queue: they only take budget nobody is waiting for. With a shared
+    budget, the buckets live in a state backend shared by all workers; each
+    worker still schedules its own callers.
+    """
+
+    # Idle tenants beyond this many are forgotten, oldest first
+    MAX_TENANTS = 10000
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        max_queue: int,
+        max_wait_seconds: float,
+        min_rate_factor: float = 0.05,
+        backend: Optional[StateBackend] = None,
+        tenant_requests_per_minute: float = 0,
+        tenant_tokens_per_minute: float = 0,
+        tenant_max_queue: Optional[int] = None,
+        tenant_weights: Optional[Dict[str, float]] = None,
+        fair_quantum: float = 1000
+    ):
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.min_rate_factor = min_rate_factor
+        self._factor = 1.0
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._backend = backend
+        self._shared = None
+        if backend is not None and backend.shared:
+            self._shared = SharedBudget(backend, requests_per_minute, tokens_per_minute, min_rate_factor)
+        self._pending_updates = set()
+        self.tenant_requests_per_minute = tenant_requests_per_minute
+        self.tenant_tokens_per_minute = tenant_tokens_per_minute
+        self.tenant_max_queue = tenant_max_queue or max_queue
+        self._fair = DeficitRoundRobin(fair_quantum, tenant_weights)
+        self._tenants: "OrderedDict[str, TenantState]" = OrderedDict()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._waiting = 0
+        self._background_waiting = 0
+        self._wait_times = deque(maxlen=1000)
+        self._stats = {
+            "admitted": 0,
+            "rejected": 0,
+            "quota_rejected": 0,
+            "rate_limited": 0,
+            "background_admitted": 0,
+        }
+
+    def _retry_after_estimate(self) -> float:
+        """Rough time for the current queue to drain."""
+        if self._shared is not None:
+            per_second = max(self._requests.base_rate * self._shared.factor / 60, 1e-6)
+            paused = max(0.0, self._shared.blocked_until - time.time())
+        else:
+            per_second = max(self._requests.rate / 60, 1e-6)
+            paused = max(0.0, self._blocked_until - time.monotonic())
+        return paused + (self._waiting + 1) / per_second
+
+    def _tenant(self, tenant: str) -> TenantState:
+        state = self._tenants.get(tenant)
+        if state is not None:
+            self._tenants.move_to_end(tenant)
+            return state
+        quota = None
+        if self.tenant_requests_per_minute or self.tenant_tokens_per_minute:
+            quota = TenantQuota(
+                tenant, self.tenant_requests_per_minute, self.tenant_tokens_per_minute, self._backend
+            )
+        state = self._tenants[tenant] = TenantState(quota)
+        if len(self._tenants) > self.MAX_TENANTS:
+            for name in list(self._tenants):
+                if not self._fair.queued(name) and name != tenant:
+                    del self._tenants[name]
+                    break
+        return state
+
+    async def acquire(self, estimated_tokens: float, background: bool = False, tenant: str = ANONYMOUS_TENANT):
+        """Wait for the tenant's quota and the shared budget, or raise UpstreamUnavailableError."""
+        state = self._tenant(tenant)
+        if background:
+            await self._take_quota(state, estimated_tokens, background)
+            await self._acquire_background(estimated_tokens, state)
+            return
+        # Check capacity first, so a caller turned away with a 503 keeps its tenant quota
+        if self._waiting >= self.max_queue or self._fair.queued(tenant) >= self.tenant_max_queue:
+            self._stats["rejected"] += 1
+            state.counters["rejected"] += 1
+            raise UpstreamUnavailableError(
+                "AI service is at capacity, please retry later",
+                retry_after=self._retry_after_estimate(),
+            )
+        await self._take_quota(state, estimated_tokens, background)
+
+        waiter = _Waiter(estimated_tokens)
+        self._waiting += 1
+        self._fair.push(tenant, waiter, estimated_tokens)
+        self._report_queue()
+        if self._dispatcher is None or self._dispatcher.done():
+            # A fresh context, so the dispatcher does not carry the first caller's trace or deadline
+            self._dispatcher = asyncio.create_task(self._dispatch(), context=contextvars.Context())
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            self._fair.remove(tenant, waiter)
+            raise
+        except UpstreamUnavailableError:
+            state.counters["rejected"] += 1
+            raise
+        finally:
+            self._waiting -= 1
+            self._report_queue()
+        self._admitted(state, estimated_tokens, time.monotonic() - waiter.started)
+
+    def _report_queue(self):
+        """Set the queue gauges; set explicitly so they survive multiprocess metrics."""
+        metrics.ADMISSION_QUEUE_DEPTH.set(self._waiting)
+        metrics.TENANTS_QUEUED.set(self._fair.tenants_queued())
+
+    async def _dispatch(self):
+        """Hand budget to queued callers in fair-share order until the queue is empty."""
+        while True:
+            waiter = self._fair.pop()
+            if waiter is None:
+                return
+            try:
+                while not waiter.future.done():
+                    wait = await self._take(waiter.tokens)
+                    if wait <= 0:
+                        if not waiter.future.done():
+                            waiter.future.set_result(None)
+                        break
+                    if time.monotonic() + wait - waiter.started > self.max_wait_seconds:
+                        self._stats["rejected"] += 1
+                        waiter.future.set_exception(UpstreamUnavailableError(
+                            "AI service quota exhausted, please retry later",
+                            retry_after=wait,
+                        ))
+                        break
+                    await asyncio.sleep(wait)
+            except Exception as e:
+                if not waiter.future.done():
+                    waiter.future.set_exception(e)
+
+    async def _take_quota(self, state: TenantState, estimated_tokens: float, background: bool):
+        """Take the tenant's own budget; foreground callers over quota get a 429, background ones wait."""
+        if state.quota is None:
+            return
+        while True:
+            wait = await state.quota.take(estimated_tokens)
+            if wait <= 0:
+                return
+            if not background:
+                self._stats["quota_rejected"] += 1
+                state.counters["quota_rejected"] += 1
+                raise TenantQuotaExceededError(retry_after=wait)
+            await asyncio.sleep(wait)
+
+    def _admitted(self, state: TenantState, estimated_tokens: float, waited: float):
+        self._wait_times.append(waited)
+        state.wait_times.append(waited)
+        self._stats["admitted"] += 1
+        state.counters["admitted"] += 1
+        state.counters["tokens"] += estimated_tokens
+
+    async def _acquire_background(self, estimated_tokens: float, state: TenantState):
+        """Wait, without a time limit, until budget is free and no foreground caller is queued."""
+        started = time.monotonic()
+        self._background_waiting += 1
+        try:
+            while True:
+                # Poll while foreground callers are queued; they go first
+                if self._waiting:
+                    wait = 0.05
+                else:
+                    wait = await self._take(estimated_tokens)
+                    if wait <= 0:
+                        break
+                await asyncio.sleep(max(wait, 0.05))
+        finally:
+            self._background_waiting -= 1
+        self._admitted(state, estimated_tokens, time.monotonic() - started)
+        self._stats["background_admitted"] += 1
+
+    async def _take(self, estimated_tokens: float) -> float:
+        """Take request and token budget and return 0, or return the seconds to wait."""
+        if self._shared is not None:
+            return await self._shared.take(estimated_tokens)
+        wait = max(
+            self._blocked_until - time.monotonic(),
+            self._requests.wait_time(1),
+            self._tokens.wait_time(estimated_tokens),
+        )
+        if wait <= 0:
+            self._requests.take(1)
+            self._tokens.take(estimated_tokens)
+        return wait
+
+    async def try_acquire(self, estimated_tokens: float) -> bool:
+        """Admit immediately if budget is available and nobody is queued; never waits."""
+        if self._waiting:
+            return False
+        if await self._take(estimated_tokens) > 0:
+            return False
+        self._stats["admitted"] += 1
+        return True
+
+    def _update_shared(self, update):
+        """Apply a shared-budget update in the background; callers never wait on it."""
+        # Not tied to the request that triggered it, so it does not inherit its trace
+        task = asyncio.create_task(update, context=contextvars.Context())
+        self._pending_updates.add(task)
+        task.add_done_callback(self._update_done)
+
+    def _update_done(self, task: asyncio.Future):
+        self._pending_updates.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Shared admission budget update failed: {task.exception()}")
+
+    def charge(self, tokens: float, tenant: str = ANONYMOUS_TENANT):
+        """Charge tokens consumed beyond the admission estimate, to the shared budget and the tenant."""
+        if tokens <= 0:
+            return
+        if self._shared is not None:
+            self._update_shared(self._shared.charge(tokens))
+        else:
+            self._tokens.take(tokens)
+        state = self._tenants.get(tenant)
+        if state is None:
+            return
+        state.counters["tokens"] += tokens
+        if state.quota is not None:
+            update = state.quota.charge(tokens)
+            if update is not None:
+                self._update_shared(update)
+
+    def on_success(self):
+        """Additive increase after a successful upstream call."""
+        if self._shared is not None:
+            if self._shared.factor < 1.0:
+                self._update_shared(self._shared.adjust(rate_limited=False))
+        elif self._factor < 1.0:
+            self._set_factor(self._factor + 0.05)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        """Multiplicative decrease (and a pause) after a 429 from upstream."""
+        self._stats["rate_limited"] += 1
+        if self._shared is not None:
+            self._update_shared(self._shared_rate_limited(retry_after))
+            return
+        now = time.monotonic()
+        if retry_after:
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+        # A burst of 429s from calls that were already in flight counts as one signal
+        if now - self._last_decrease < 1.0:
+            return
+        self._last_decrease = now
+        self._set_factor(self._factor / 2)
+        logger.warning(
+            f"⏳ Upstream rate limited; admission rate now {self._factor:.0%} of configured"
+        )
+
+    async def _shared_rate_limited(self, retry_after: Optional[float]):
+        if await self._shared.adjust(rate_limited=True, retry_after=retry_after):
+            logger.warning(
+                f"⏳ Upstream rate limited; shared admission rate now {self._shared.factor:.0%} of configured"
+            )
+
+    def _set_factor(self, factor: float):
+        self._factor = min(1.0, max(self.min_rate_factor, factor))
+        self._requests.scale(self._factor)
+        self._tokens.scale(self._factor)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth, wait-time and adaptation metrics."""
+        waits = sorted(self._wait_times)
+        if self._shared is not None:
+            factor = self._shared.factor
+            paused = self._shared.blocked_until - time.time()
+        else:
+            factor = self._factor
+            paused = self._blocked_until - time.monotonic()
+        return {
+            **self._stats,
+            "queue_depth": self._waiting,
+            "tenants_queued": self._fair.tenants_queued(),
+            "background_waiting": self._background_waiting,
+            "max_queue": self.max_queue,
+            "shared": self._shared is not None,
+            "rate_factor": round(factor, 3),
+            "requests_per_minute": round(self._requests.base_rate * factor, 1),
+            "tokens_per_minute": round(self._tokens.base_rate * factor, 1),
+            "paused_for_seconds": round(max(0.0, paused), 2),
+            "wait_seconds_avg": round(sum(waits) / len(waits), 4) if waits else 0.0,
+            "wait_seconds_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 4) if waits else 0.0,
+            "wait_seconds_max": round(waits[-1], 4) if waits else 0.0,
+        }
+
+    def tenant_stats(self, limit: int = 50) -> Dict[str, Any]:
+        """Return per-tenant usage, quota rejections and queue-wait stats for the busiest tenants."""
+        busiest = sorted(self._tenants.items(), key=lambda item: item[1].counters["tokens"], reverse=True)
+        tenants = {}
+        for name, state in busiest[:limit]:
+            waits = sorted(state.wait_times)
+            tenants[name] = {
+                **state.counters,
+                "tokens": round(state.counters["tokens"]),
+                "weight": self._fair.weight(name),
+                "queued": self._fair.queued(name),
+                "wait_seconds_avg": round(sum(waits) / len(waits), 4) if waits else 0.0,
+                "wait_seconds_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 4) if waits else 0.0,
+            }
+        return {
+            "tracked": len(self._tenants),
+            "requests_per_minute": self.tenant_requests_per_minute or None,
+            "tokens_per_minute": self.tenant_tokens_per_minute or None,
+            "max_queue": self.tenant_max_queue,
+            "quantum": self._fair.quantum,
+            "tenants": tenants,
+        }
@@ -0,0 +1,132 @@
+"""
+Semantic cache module for near-duplicate task descriptions.
+Embeds task text with a hashed n-gram vectorizer and matches it against a NumPy index per stage category.
+NumPy is imported when the cache is first used, so a disabled cache costs nothing at startup.
+"""
+
+import re
+import time
+import zlib
+from typing import TYPE_CHECKING, Dict, Any, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class SemanticQuery(NamedTuple):
+    """What a generation is matched on: a group (stage category) and free text."""
+
+    group: str
+    text: str
+
+
+class HashedNgramVectorizer:
+    """Embed text as L2-normalized hashed character n-grams plus word unigrams."""
+
+    def __init__(self, dim: int = 512, ngram: int = 4):
+        self.dim = dim
+        self.ngram = ngram
+
+    def _features(self, text: str):
+        words = re.findall(r"[a-z0-9]+", text.lower())
+        for word in words:
+            yield f"w:{word}"
+        padded = f" {' '.join(words)} "
+        for start in range(len(padded) - self.ngram + 1):
+            yield padded[start:start + self.ngram]
+
+    def embed(self, text: str) -> "np.ndarray":
+        """Return a unit vector (all zeros for text without any features)."""
+        import numpy as np
+
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            # crc32 is stable across processes, unlike the salted built-in hash()
+            digest = zlib.crc32(feature.encode("utf-8"))
+            vector[digest % self.dim] += 1.0 if digest & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+
+class _Index:
+    """Fixed-capacity ring of vectors and results for one group."""
+
+    def __init__(self, capacity: int, dim: int):
+        import numpy as np
+
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.results = [None] * capacity
+        self.expires_at = np.zeros(capacity, dtype=np.float64)
+        self.size = 0
+        self.next_slot = 0
+
+    def add(self, vector: "np.ndarray", result: Dict[str, Any], expires_at: float):
+        slot = self.next_slot
+        self.vectors[slot] = vector
+        self.results[slot] = result
+        self.expires_at[slot] = expires_at
+        self.next_slot = (slot + 1) % len(self.results)
+        self.size = min(self.size + 1, len(self.results))
+
+
+class SemanticCache:
+    """
+    Near-duplicate lookup for generation results.
+
+    Results are indexed per group; a lookup returns the most similar live result
+    in the same group when its cosine similarity reaches the threshold.
+    """
+
+    def __init__(self, threshold: float, max_entries_per_group: int, ttl_seconds: int, dim: int = 512):
+        self.threshold = threshold
+        self.max_entries_per_group = max_entries_per_group
+        self.ttl_seconds = ttl_seconds
+        self._vectorizer = HashedNgramVectorizer(dim=dim)
+        self._indexes: Dict[str, _Index] = {}
+        self._stats = {"hits": 0, "misses": 0, "writes": 0}
+
+    def lookup(self, query: SemanticQuery) -> Optional[Dict[str, Any]]:
+        """Return a copy of the closest cached result with its similarity, or None."""
+        import numpy as np
+
+        index = self._indexes.get(query.group)
+        if index is None or index.size == 0:
+            self._stats["misses"] += 1
+            return None
+
+        vector = self._vectorizer.embed(query.text)
+        scores = index.vectors[:index.size] @ vector
+        scores[index.expires_at[:index.size] <= time.time()] = -1.0
+        best = int(np.argmax(scores))
+        similarity = float(scores[best])
+        if similarity < self.threshold:
+            self._stats["misses"] += 1
+            return None
+
+        self._stats["hits"] += 1
+        return {**index.results[best], "similarity": round(similarity, 4)}
+
+    def add(self, query: SemanticQuery, result: Dict[str, Any]):
+        """Index a fresh result under its group."""
+        index = self._indexes.get(query.group)
+        if index is None:
+            index = _Index(self.max_entries_per_group, self._vectorizer.dim)
+            self._indexes[query.group] = index
+        index.add(self._vectorizer.embed(query.text), dict(result), time.time() + self.ttl_seconds)
+        self._stats["writes"] += 1
+
+    def warm_up(self):
+        """Load NumPy and the vectorizer ahead of the first lookup."""
+        self._vectorizer.embed("warm up")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and index sizes per group."""
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "threshold": self.threshold,
+            "entries": {group: index.size for group, index in self._indexes.items()},
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,162 @@
+"""
+Refine session store module.
+Keeps refine conversations (current draft and recent chat turns) server-side in a bounded LRU store with TTL.
+"""
+
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from .shared_state import StateBackend
+
+logger = logging.getLogger(__name__)
+
+
+def new_session(owner: str, draft: str) -> Dict[str, Any]:
+    """A fresh session for owner, starting from draft."""
+    now = time.time()
+    return {
+        "id": secrets.token_urlsafe(16),
+        "owner": owner,
+        "draft": draft,
+        "version": 1,
+        "turns": [],
+        "turn_count": 0,
+        # Set when the draft changed outside the conversation, so the next turn resends it
+        "draft_edited": False,
+        "created": now,
+        "updated": now,
+    }
+
+
+def apply_edits(draft: str, edits: List[Dict[str, str]]) -> str:
+    """
+    Apply find/replace edits to the draft in order.
+
+    Each find must occur exactly once in the text it is applied to, so an
+    edit made against an older draft fails instead of landing in the wrong place.
+    """
+    for number, edit in enumerate(edits, 1):
+        occurrences = draft.count(edit["find"])
+        if occurrences != 1:
+            where = "not found" if occurrences == 0 else f"found {occurrences} times"
+            raise ValueError(f"Edit {number}: text to replace is {where} in the current draft")
+        draft = draft.replace(edit["find"], edit["replace"])
+    return draft
+
+
+class SessionStore:
+    """
+    LRU + TTL store for refine sessions.
+
+    In memory, sessions are bounded to max_sessions (least recently used out
+    first) and expire ttl_seconds after their last change. With a shared
+    backend they live there instead, under the same TTL, so any worker can
+    continue a session; a shared index of last-change times bounds them to
+    max_sessions across all workers, least recently changed out first. Saves
+    are compare-and-swap on the session version, so two overlapping turns on
+    one session cannot both win.
+    """
+
+    KEY_PREFIX = "refine:"
+    INDEX_KEY = "refine-index"
+
+    def __init__(self, max_sessions: int, ttl_seconds: float, backend: Optional[StateBackend] = None):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._shared = backend if backend is not None and backend.shared else None
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._stats = {"created": 0, "expired": 0, "evictions": 0, "conflicts": 0, "deleted": 0}
+
+    def _expired(self, session: Dict[str, Any]) -> bool:
+        return session["updated"] + self.ttl_seconds <= time.time()
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the session, or None if it is unknown or expired."""
+        if self._shared is not None:
+            return await self._shared.get(self.KEY_PREFIX + session_id)
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if self._expired(session):
+            del self._sessions[session_id]
+            self._stats["expired"] += 1
+            return None
+        self._sessions.move_to_end(session_id)
+        return {**session, "turns": list(session["turns"])}
+
+    async def create(self, session: Dict[str, Any]):
+        """Store a new session."""
+        self._stats["created"] += 1
+        if self._shared is not None:
+            await self._shared.set(self.KEY_PREFIX + session["id"], session, self.ttl_seconds)
+            await self._index(session["id"], session["updated"])
+            return
+        self._sessions[session["id"]] = session
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    async def save(self, session: Dict[str, Any], expected_version: int) -> bool:
+        """Store the session if nobody saved it since expected_version; return False on a conflict."""
+        session = {**session, "updated": time.time()}
+        if self._shared is not None:
+            def fn(current):
+                if current is None or current["version"] != expected_version:
+                    return None, False
+                return session, True
+
+            saved = await self._shared.update(self.KEY_PREFIX + session["id"], fn, self.ttl_seconds)
+            if saved:
+                await self._index(session["id"], session["updated"])
+        else:
+            current = self._sessions.get(session["id"])
+            saved = current is not None and current["version"] == expected_version
+            if saved:
+                self._sessions[session["id"]] = session
+                self._sessions.move_to_end(session["id"])
+        if not saved:
+            self._stats["conflicts"] += 1
+        return saved
+
+    async def delete(self, session_id: str):
+        self._stats["deleted"] += 1
+        if self._shared is not None:
+            await self._shared.delete(self.KEY_PREFIX + session_id)
+            await self._index(session_id, None)
+        else:
+            self._sessions.pop(session_id, None)
+
+    async def _index(self, session_id: str, updated: Optional[float]):
+        """Record a session's last change (or its deletion) in the shared index and evict past max_sessions."""
+        def fn(index):
+            now = time.time()
+            sessions = {
+                other: changed for other, changed in (index or {}).get("sessions", {}).items()
+                if changed + self.ttl_seconds > now
+            }
+            if updated is None:
+                sessions.pop(session_id, None)
+            else:
+                sessions[session_id] = updated
+            evicted = sorted(sessions, key=sessions.get)[:max(0, len(sessions) - self.max_sessions)]
+            for other in evicted:
+                del sessions[other]
+            return {"sessions": sessions}, evicted
+
+        evicted = await self._shared.update(self.INDEX_KEY, fn, self.ttl_seconds)
+        for other in evicted:
+            await self._shared.delete(self.KEY_PREFIX + other)
+        self._stats["evictions"] += len(evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return session counts and limits (active is this worker's sessions when not shared)."""
+        return {
+            **self._stats,
+            "active": None if self._shared is not None else len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+            "shared": self._shared is not None,
+        }
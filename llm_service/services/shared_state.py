@@ -0,0 +1,291 @@
+"""
+Shared state module for multi-worker deployments.
+Pluggable key-value backends (memory, SQLite file, Redis) used to share the cache, single-flight locks and admission budget.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import secrets
+import socket
+import sqlite3
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+# Identifies the process holding a lock
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# update() callbacks get the current value (None if absent) and return (new value, result);
+# a new value of None leaves the key unchanged
+Updater = Callable[[Optional[Dict[str, Any]]], Tuple[Dict[str, Any], Any]]
+
+
+class StateBackend:
+    """
+    Key-value store with TTLs and atomic read-modify-write.
+
+    Values are JSON-serializable dicts. update() runs its callback atomically
+    with respect to every other process using the same backend; the callback
+    must be a pure function of the value it is given, since it may be retried.
+    """
+
+    name = "base"
+    shared = True
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Dict[str, Any], ttl_seconds: float):
+        raise NotImplementedError
+
+    async def set_if_absent(self, key: str, value: Dict[str, Any], ttl_seconds: float) -> bool:
+        """Store value only if key is missing or expired; return True if stored."""
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def update(self, key: str, fn: Updater, ttl_seconds: float) -> Any:
+        """Atomically replace key's value with fn(value)[0] and return fn(value)[1]."""
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+
+class MemoryBackend(StateBackend):
+    """Process-local backend; the default for single-worker deployments and tests."""
+
+    name = "memory"
+    shared = False
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[Dict[str, Any], float]] = {}
+
+    def _live(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            del self._values[key]
+            return None
+        return entry[0]
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._live(key)
+        return json.loads(json.dumps(value)) if value is not None else None
+
+    async def set(self, key: str, value: Dict[str, Any], ttl_seconds: float):
+        self._values[key] = (json.loads(json.dumps(value)), time.time() + ttl_seconds)
+
+    async def set_if_absent(self, key: str, value: Dict[str, Any], ttl_seconds: float) -> bool:
+        if self._live(key) is not None:
+            return False
+        await self.set(key, value, ttl_seconds)
+        return True
+
+    async def delete(self, key: str):
+        self._values.pop(key, None)
+
+    async def update(self, key: str, fn: Updater, ttl_seconds: float) -> Any:
+        value, result = fn(await self.get(key))
+        if value is not None:
+            await self.set(key, value, ttl_seconds)
+        return result
+
+
+class SQLiteBackend(StateBackend):
+    """Backend in a SQLite file, shared by all workers on one host."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Shared state is a coordination aid, not a record: skip the fsync on every commit
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS shared_state ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        # One connection per process, used from worker threads one call at a time
+        self._lock = asyncio.Lock()
+        self._writes = 0
+
+    def _get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        row = self._db.execute(
+            "SELECT value FROM shared_state WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _put(self, key: str, value: Dict[str, Any], expires_at: float):
+        self._db.execute(
+            "INSERT OR REPLACE INTO shared_state (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), expires_at),
+        )
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            self._db.execute("DELETE FROM shared_state WHERE expires_at <= ?", (time.time(),))
+
+    def _transaction(self, key: str, fn: Updater, ttl_seconds: float) -> Any:
+        # BEGIN IMMEDIATE takes the write lock up front, so read-modify-write is atomic across processes
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            value, result = fn(self._get(key, now))
+            if value is not None:
+                self._put(key, value, now + ttl_seconds)
+            self._db.execute("COMMIT")
+            return result
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    async def _run(self, fn, *args):
+        async with self._lock:
+            return await tracing.in_thread("shared_state_sqlite", fn, *args)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._get, key, time.time())
+
+    async def set(self, key: str, value: Dict[str, Any], ttl_seconds: float):
+        await self._run(self._put, key, value, time.time() + ttl_seconds)
+
+    async def set_if_absent(self, key: str, value: Dict[str, Any], ttl_seconds: float) -> bool:
+        return await self._run(
+            self._transaction, key, lambda current: (value, True) if current is None else (None, False), ttl_seconds
+        )
+
+    async def delete(self, key: str):
+        await self._run(self._db.execute, "DELETE FROM shared_state WHERE key = ?", (key,))
+
+    async def update(self, key: str, fn: Updater, ttl_seconds: float) -> Any:
+        return await self._run(self._transaction, key, fn, ttl_seconds)
+
+    async def aclose(self):
+        self._db.close()
+
+
+class RedisBackend(StateBackend):
+    """Backend in Redis, shared by workers on any host. Requires the redis package."""
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "ai:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("AI_STATE_BACKEND=redis requires the redis package (pip install redis)") from e
+        self._redis = redis.from_url(url)
+        self._watch_error = redis.WatchError
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = await self._redis.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Dict[str, Any], ttl_seconds: float):
+        await self._redis.set(self.prefix + key, json.dumps(value), px=max(1, int(ttl_seconds * 1000)))
+
+    async def set_if_absent(self, key: str, value: Dict[str, Any], ttl_seconds: float) -> bool:
+        return bool(await self._redis.set(
+            self.prefix + key, json.dumps(value), px=max(1, int(ttl_seconds * 1000)), nx=True
+        ))
+
+    async def delete(self, key: str):
+        await self._redis.delete(self.prefix + key)
+
+    async def update(self, key: str, fn: Updater, ttl_seconds: float) -> Any:
+        name = self.prefix + key
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    # Optimistic transaction: retried if another process writes the key meanwhile
+                    await pipe.watch(name)
+                    raw = await pipe.get(name)
+                    value, result = fn(json.loads(raw) if raw is not None else None)
+                    if value is None:
+                        await pipe.unwatch()
+                        return result
+                    pipe.multi()
+                    pipe.set(name, json.dumps(value), px=max(1, int(ttl_seconds * 1000)))
+                    await pipe.execute()
+                    return result
+                except self._watch_error:
+                    continue
+
+    async def aclose(self):
+        await self._redis.aclose()
+
+
+def create_backend(kind: str, sqlite_path: str = "", redis_url: str = "") -> StateBackend:
+    """Build the backend named by AI_STATE_BACKEND."""
+    kind = (kind or "memory").lower()
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        logger.info(f"🔗 Sharing state across workers through {sqlite_path}")
+        return SQLiteBackend(sqlite_path)
+    if kind == "redis":
+        logger.info("🔗 Sharing state across workers through Redis")
+        return RedisBackend(redis_url)
+    raise ValueError(f"Unknown AI_STATE_BACKEND: {kind}")
+
+
+class SharedSingleFlight:
+    """
+    Coalesce identical calls across workers.
+
+    The first worker to take a key's lock makes the call and publishes the
+    result; other workers poll for that result instead of calling upstream.
+    If the lock holder fails or dies, the lock expires and the next waiter
+    takes over. Each flight has its own token, and waiters only accept a
+    result published under the token of the flight they waited on, never one
+    left over from an earlier flight of the same key.
+    """
+
+    def __init__(self, backend: StateBackend, lock_ttl_seconds: float, poll_interval: float = 0.05):
+        self.backend = backend
+        self.lock_ttl_seconds = lock_ttl_seconds
+        self.poll_interval = poll_interval
+        self._stats = {"leaders": 0, "followers": 0, "takeovers": 0}
+
+    async def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        lock_key, result_key = f"flight:lock:{key}", f"flight:result:{key}"
+        waited = False
+        while True:
+            flight = secrets.token_hex(8)
+            if await self.backend.set_if_absent(
+                lock_key, {"owner": WORKER_ID, "flight": flight}, self.lock_ttl_seconds
+            ):
+                self._stats["takeovers" if waited else "leaders"] += 1
+                try:
+                    result = await fn()
+                    # Kept briefly so waiters in other workers can pick it up
+                    await self.backend.set(result_key, {"flight": flight, "result": result}, self.lock_ttl_seconds)
+                    return result
+                finally:
+                    await self.backend.delete(lock_key)
+
+            if not waited:
+                self._stats["followers"] += 1
+                waited = True
+            awaited = None
+            while True:
+                lock = await self.backend.get(lock_key)
+                if lock is None:
+                    break
+                awaited = lock.get("flight")
+                await asyncio.sleep(self.poll_interval)
+            published = await self.backend.get(result_key)
+            if published is not None and awaited is not None and published.get("flight") == awaited:
+                return published["result"]
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats)
@@ -0,0 +1,67 @@
+"""
+Single-flight module for coalescing duplicate concurrent AI requests.
+Identical in-flight calls share one upstream task and its result.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers await the same task."""
+
+    def __init__(self):
+        self._calls: Dict[str, "_Call"] = {}
+        self._stats = {"leaders": 0, "followers": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Execute fn for key, or join the call already in flight for it.
+
+        The upstream task is shared, so a caller that goes away does not cancel
+        it for the others; it is only cancelled once every waiter has left.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self._stats["leaders"] += 1
+        else:
+            self._stats["followers"] += 1
+            logger.debug(f"Coalesced duplicate request for key {key[:12]}")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Forget it first, so a new caller starts a fresh call instead of joining a cancelled one
+                self._forget(key, call)
+                call.task.cancel()
+
+    def in_flight(self, key: str) -> bool:
+        """Return True if a call for key is currently running."""
+        return key in self._calls
+
+    def _forget(self, key: str, call: "_Call"):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return leader/follower counters and the number of calls in flight."""
+        return {**self._stats, "in_flight": len(self._calls)}
+
+
+class _Call:
+    """An in-flight upstream call and the number of callers awaiting it."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
@@ -0,0 +1,149 @@
+"""
+Structured output module for task descriptions.
+Requests purpose / requirements / acceptance criteria as JSON, validates it locally and compacts it to the length limit.
+"""
+
+import json
+import math
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from models import StructuredDescription
+
+# Gemini response schema for generate in structured mode
+DESCRIPTION_SCHEMA: Dict[str, Any] = {
+    "type": "OBJECT",
+    "properties": {
+        "purpose": {
+            "type": "STRING",
+            "description": "One sentence: what the task achieves and why",
+        },
+        "requirements": {
+            "type": "ARRAY",
+            "items": {"type": "STRING", "description": "Short imperative step or deliverable"},
+            "minItems": 1,
+            "maxItems": 4,
+        },
+        "acceptance_criteria": {
+            "type": "ARRAY",
+            "items": {"type": "STRING", "description": "Short, checkable completion condition"},
+            "minItems": 1,
+            "maxItems": 3,
+        },
+    },
+    "required": ["purpose", "requirements", "acceptance_criteria"],
+    "propertyOrdering": ["purpose", "requirements", "acceptance_criteria"],
+}
+
+# Same ratio as usage_tracker.estimate_tokens
+CHARS_PER_TOKEN = 4
+# Room for JSON keys, quotes and brackets, which do not count towards the rendered length
+JSON_OVERHEAD_TOKENS = 48
+# Models overshoot length targets; a cut-off JSON answer is worse than a long one
+BUDGET_HEADROOM = 1.5
+
+# Wording that can go without changing what an item asks for
+FILLER_PATTERNS = [
+    (re.compile(r"^(?:the )?(?:main )?(?:purpose|goal|objective) of this task is (?:to )?", re.I), ""),
+    (re.compile(r"\b(?:please )?(?:make sure|ensure) (?:that )?", re.I), ""),
+    (re.compile(r"\bin order to\b", re.I), "to"),
+    (re.compile(r"\b(?:successfully|properly|appropriately|thoroughly)\s+", re.I), ""),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def output_token_budget(max_chars: int) -> int:
+    """maxOutputTokens that leaves room for a max_chars description plus its JSON wrapping."""
+    return math.ceil(max_chars / CHARS_PER_TOKEN * BUDGET_HEADROOM) + JSON_OVERHEAD_TOKENS
+
+
+def render_description(description: StructuredDescription) -> str:
+    """Plain-text description stored by the backend."""
+    requirements = "\n".join(f"- {item}" for item in description.requirements)
+    criteria = "\n".join(f"- {item}" for item in description.acceptance_criteria)
+    return f"{description.purpose}\n\nRequirements:\n{requirements}\n\nAcceptance criteria:\n{criteria}"
+
+
+def _fits(description: StructuredDescription, max_chars: int) -> bool:
+    return len(render_description(description)) <= max_chars
+
+
+def _tighten(text: str) -> str:
+    for pattern, replacement in FILLER_PATTERNS:
+        text = pattern.sub(replacement, text)
+    text = text.strip().rstrip(".")
+    return text[:1].upper() + text[1:]
+
+
+def _first_sentence(text: str) -> str:
+    return re.split(r"(?<=[.;!?])\s+", text, maxsplit=1)[0].rstrip(".;")
+
+
+def _dedupe(items: List[str]) -> List[str]:
+    seen = set()
+    unique = []
+    for item in items:
+        if item.lower() not in seen:
+            seen.add(item.lower())
+            unique.append(item)
+    return unique
+
+
+def compact_description(description: StructuredDescription, max_chars: int) -> Optional[StructuredDescription]:
+    """
+    Shrink an over-length description locally, or return None if it cannot fit.
+
+    Steps run from least to most lossy, stopping as soon as the description
+    fits: drop filler wording and duplicate items, keep only each field's
+    first sentence, then drop trailing items (keeping at least one of each).
+    """
+    purpose = _tighten(description.purpose)
+    requirements = _dedupe([_tighten(item) for item in description.requirements])
+    criteria = _dedupe([_tighten(item) for item in description.acceptance_criteria])
+    candidate = StructuredDescription(purpose=purpose, requirements=requirements, acceptance_criteria=criteria)
+    if _fits(candidate, max_chars):
+        return candidate
+
+    candidate = StructuredDescription(
+        purpose=_first_sentence(purpose),
+        requirements=[_first_sentence(item) for item in requirements],
+        acceptance_criteria=[_first_sentence(item) for item in criteria],
+    )
+    while not _fits(candidate, max_chars):
+        requirements, criteria = candidate.requirements, candidate.acceptance_criteria
+        if len(requirements) >= len(criteria) and len(requirements) > 1:
+            requirements = requirements[:-1]
+        elif len(criteria) > 1:
+            criteria = criteria[:-1]
+        else:
+            return None
+        candidate = StructuredDescription(
+            purpose=candidate.purpose, requirements=requirements, acceptance_criteria=criteria
+        )
+    return candidate
+
+
+def parse_description(raw: str, max_chars: int) -> Tuple[Optional[StructuredDescription], str]:
+    """
+    Validate a structured answer and bring it within max_chars.
+
+    Returns the description (None if unusable) and the outcome:
+    valid, compacted, invalid (not JSON or missing fields) or too_long
+    (over the limit even after compaction, or emptied by it).
+    """
+    try:
+        description = StructuredDescription.model_validate(json.loads(raw))
+    except (ValueError, ValidationError):
+        return None, "invalid"
+    if _fits(description, max_chars):
+        return description, "valid"
+    try:
+        compacted = compact_description(description, max_chars)
+    except (ValueError, ValidationError):
+        # Tightening left a field empty: nothing usable is left to send
+        compacted = None
+    if compacted is None:
+        return None, "too_long"
+    return compacted, "compacted"
@@ -0,0 +1,30 @@
+"""
+Tenant context module.
+Carries the tenant (caller or project) a request is billed to down to admission control.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+ANONYMOUS_TENANT = "anonymous"
+
+_tenant: ContextVar[str] = ContextVar("request_tenant", default=ANONYMOUS_TENANT)
+
+
+@contextmanager
+def tenant_scope(tenant: Optional[str]):
+    """Bill work started inside the block (including tasks it creates) to tenant."""
+    if tenant is None:
+        yield
+        return
+    token = _tenant.set(tenant)
+    try:
+        yield
+    finally:
+        _tenant.reset(token)
+
+
+def current_tenant() -> str:
+    """Return the tenant the current request is billed to."""
+    return _tenant.get()
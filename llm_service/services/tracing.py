@@ -0,0 +1,371 @@
+"""
+Request tracing module for the AI service.
+Records per-request span timings, exports them to a JSONL file or OpenTelemetry, and keeps the slowest requests.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import secrets
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, TypeVar
+
+import orjson
+
+logger = logging.getLogger(__name__)
+T = TypeVar("T")
+
+EXPORT_NONE, EXPORT_FILE, EXPORT_OTLP = "none", "file", "otlp"
+# Paths never traced or profiled: scrapes, probes, docs and the admin endpoints themselves
+UNTRACED_PATHS = ("/metrics", "/health", "/admin", "/docs", "/redoc", "/openapi.json")
+
+_trace: ContextVar[Optional["Trace"]] = ContextVar("request_trace", default=None)
+# Index of the innermost open span in the current trace, the parent of spans opened inside it
+_parent: ContextVar[Optional[int]] = ContextVar("request_span", default=None)
+
+
+class Trace:
+    """
+    Span timings for one HTTP request.
+
+    Spans are plain dicts appended in the order they open, so a parent always
+    comes before its children. Times are milliseconds since the request arrived.
+    Tasks created during the request inherit the trace, so hedged calls and
+    work run under run_cancellable land in the same trace. Tasks that outlive
+    the request or serve other callers (the admission dispatcher, shared
+    budget updates) start from an empty context instead.
+    """
+
+    def __init__(self, name: str):
+        self.trace_id = secrets.token_hex(16)
+        self.name = name
+        self.operation: Optional[str] = None
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.status: Optional[int] = None
+        self.duration_ms: Optional[float] = None
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._started) * 1000
+
+    def finish(self, status: int):
+        self.status = status
+        self.duration_ms = round(self.elapsed_ms(), 3)
+
+    def breakdown(self) -> Dict[str, float]:
+        """Total milliseconds per span name; spans still open when the request ended count up to its end."""
+        totals: Dict[str, float] = defaultdict(float)
+        for record in self.spans:
+            duration = record.get("duration_ms")
+            if duration is None:
+                duration = (self.duration_ms or self.elapsed_ms()) - record["start_ms"]
+            totals[record["name"]] += duration
+        return {name: round(total, 3) for name, total in totals.items()}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "operation": self.operation,
+            "started_at": round(self.started_at, 3),
+            "status": self.status,
+            "duration_ms": self.duration_ms,
+            "breakdown": self.breakdown(),
+            "spans": self.spans,
+        }
+
+
+def current_trace() -> Optional[Trace]:
+    """Return the trace of the request being handled, if it is traced."""
+    return _trace.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Time the block as a span of the current request's trace.
+
+    Yields the span's attribute dict, so the block can add attributes as it
+    learns them. Outside a traced request this does nothing.
+    """
+    trace = _trace.get()
+    if trace is None:
+        yield attributes
+        return
+    record = {"id": len(trace.spans), "parent": _parent.get(), "name": name, "start_ms": round(trace.elapsed_ms(), 3)}
+    trace.spans.append(record)
+    token = _parent.set(record["id"])
+    try:
+        yield attributes
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        _parent.reset(token)
+        record["duration_ms"] = round(trace.elapsed_ms() - record["start_ms"], 3)
+        if attributes:
+            record["attributes"] = {key: value for key, value in attributes.items() if value is not None}
+
+
+def mark_handler(operation: str):
+    """
+    Note that the route handler for operation started.
+
+    Everything before this point (reading the body, Pydantic validation and
+    dependencies) is recorded as one "parse_and_validate" span.
+    """
+    trace = _trace.get()
+    if trace is None or trace.operation is not None:
+        return
+    trace.operation = operation
+    trace.spans.append({
+        "id": len(trace.spans),
+        "parent": None,
+        "name": "parse_and_validate",
+        "start_ms": 0.0,
+        "duration_ms": round(trace.elapsed_ms(), 3),
+    })
+
+
+async def in_thread(name: str, fn: Callable[..., T], *args: Any) -> T:
+    """asyncio.to_thread in a span that separates waiting for a pool thread (thread_wait_ms) from the work."""
+    if _trace.get() is None:
+        return await asyncio.to_thread(fn, *args)
+    submitted = time.perf_counter()
+    picked_up = None
+
+    def run() -> T:
+        nonlocal picked_up
+        picked_up = time.perf_counter()
+        return fn(*args)
+
+    with span(name) as attributes:
+        try:
+            return await asyncio.to_thread(run)
+        finally:
+            if picked_up is not None:
+                attributes["thread_wait_ms"] = round((picked_up - submitted) * 1000, 3)
+
+
+class FileTraceExporter:
+    """Append finished traces to a JSONL file; a "{pid}" in the path gives each worker its own file."""
+
+    def __init__(self, path: str):
+        self.path = path.format(pid=os.getpid())
+        self._file = None
+
+    def export(self, trace: Trace):
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "ab", buffering=0)
+            logger.info(f"🧵 Writing request traces to {self.path}")
+        self._file.write(orjson.dumps(trace.to_dict()) + b"\n")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class OTelTraceExporter:
+    """
+    Hand finished traces to the OpenTelemetry SDK, with the timestamps they were recorded at.
+
+    Spans go out over OTLP/HTTP in a background thread; the endpoint and
+    headers come from the standard OTEL_EXPORTER_OTLP_* variables. Requires
+    the opentelemetry-sdk and opentelemetry-exporter-otlp-proto-http packages.
+    """
+
+    def __init__(self, service_name: str):
+        try:
+            from opentelemetry import trace as otel_trace
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        except ImportError as e:
+            raise RuntimeError(
+                "AI_TRACE_EXPORT=otlp requires OpenTelemetry "
+                "(pip install opentelemetry-sdk opentelemetry-exporter-otlp-proto-http)"
+            ) from e
+        self._otel = otel_trace
+        self._provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+        self._provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        self._tracer = self._provider.get_tracer(__name__)
+
+    def export(self, trace: Trace):
+        started_ns = int(trace.started_at * 1e9)
+
+        def at(milliseconds: float) -> int:
+            return started_ns + int(milliseconds * 1e6)
+
+        error = self._otel.Status(self._otel.StatusCode.ERROR)
+        root = self._tracer.start_span(trace.name, start_time=started_ns, attributes={
+            "ai.trace_id": trace.trace_id,
+            "ai.operation": trace.operation or "",
+            "http.status_code": trace.status or 0,
+        })
+        contexts = {None: self._otel.set_span_in_context(root)}
+        for record in trace.spans:
+            duration = record.get("duration_ms")
+            if duration is None:
+                duration = trace.duration_ms - record["start_ms"]
+            otel_span = self._tracer.start_span(
+                record["name"],
+                context=contexts.get(record["parent"], contexts[None]),
+                start_time=at(record["start_ms"]),
+                attributes=record.get("attributes"),
+            )
+            if "error" in record:
+                otel_span.set_status(self._otel.Status(self._otel.StatusCode.ERROR, record["error"]))
+            otel_span.end(end_time=at(record["start_ms"] + duration))
+            contexts[record["id"]] = self._otel.set_span_in_context(otel_span)
+        if trace.status is None or trace.status >= 500:
+            root.set_status(error)
+        root.end(end_time=at(trace.duration_ms))
+
+    def close(self):
+        self._provider.shutdown()
+
+
+class SlowRequestLog:
+    """The most recent requests that took at least threshold_ms, with their full span breakdown."""
+
+    def __init__(self, threshold_ms: float, size: int):
+        self.threshold_ms = threshold_ms
+        self._traces: Deque[Dict[str, Any]] = deque(maxlen=size)
+        self.recorded = 0
+
+    def offer(self, trace: Trace) -> bool:
+        """Keep the trace if it was slow; return whether it was."""
+        if trace.duration_ms < self.threshold_ms:
+            return False
+        self._traces.append(trace.to_dict())
+        self.recorded += 1
+        return True
+
+    def entries(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Slow requests, newest first."""
+        newest = list(reversed(self._traces))
+        return newest[:limit] if limit else newest
+
+
+class RequestTracer:
+    """
+    Per-request tracing: starts a trace for each request and decides where it goes when it ends.
+
+    Only requests that reached an AI operation handler are kept. Every such
+    request slower than slow_ms goes to the slow-request log (and a warning
+    with its slowest spans); sample_rate of them go to the exporter, if any.
+    """
+
+    def __init__(
+        self,
+        export: str = EXPORT_NONE,
+        path: str = "traces.jsonl",
+        sample_rate: float = 1.0,
+        slow_ms: float = 0,
+        slow_log_size: int = 50,
+        service_name: str = "projecthub-ai"
+    ):
+        if export == EXPORT_FILE:
+            self._exporter = FileTraceExporter(path)
+        elif export == EXPORT_OTLP:
+            self._exporter = OTelTraceExporter(service_name)
+        else:
+            self._exporter = None
+        self.export = export if self._exporter is not None else EXPORT_NONE
+        self.sample_rate = sample_rate
+        self.slow_log = SlowRequestLog(slow_ms, slow_log_size) if slow_ms > 0 else None
+        self._stats = {"traced": 0, "exported": 0, "export_errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self._exporter is not None or self.slow_log is not None
+
+    def start(self, name: str) -> Trace:
+        return Trace(name)
+
+    def finish(self, trace: Trace, status: int):
+        trace.finish(status)
+        if trace.operation is None:
+            return
+        self._stats["traced"] += 1
+        if self.slow_log is not None and self.slow_log.offer(trace):
+            slowest = sorted(trace.breakdown().items(), key=lambda item: item[1], reverse=True)[:5]
+            logger.warning(
+                f"🐢 Slow {trace.operation} request {trace.trace_id} took {trace.duration_ms:.0f} ms: "
+                + ", ".join(f"{name} {milliseconds:.0f} ms" for name, milliseconds in slowest)
+            )
+        if self._exporter is not None and random.random() < self.sample_rate:
+            try:
+                self._exporter.export(trace)
+                self._stats["exported"] += 1
+            except Exception as e:
+                self._stats["export_errors"] += 1
+                logger.error(f"Trace export failed: {e}")
+
+    def close(self):
+        if self._exporter is not None:
+            self._exporter.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "export": self.export,
+            "sample_rate": self.sample_rate,
+            "slow_threshold_ms": self.slow_log.threshold_ms if self.slow_log is not None else None,
+            "slow_recorded": self.slow_log.recorded if self.slow_log is not None else 0,
+        }
+
+
+class TracingMiddleware:
+    """
+    Open a trace around each HTTP request and run the request profiler when it is armed.
+
+    The trace id is returned in an X-Trace-Id header, so a slow response can be
+    found in the slow-request log or the exported traces.
+    """
+
+    def __init__(self, app, tracer: RequestTracer, profiler=None):
+        self.app = app
+        self.tracer = tracer
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(UNTRACED_PATHS):
+            await self.app(scope, receive, send)
+            return
+        profile = self.profiler.start(scope["path"]) if self.profiler is not None else None
+        if not self.tracer.enabled and profile is None:
+            await self.app(scope, receive, send)
+            return
+
+        trace = self.tracer.start(f"{scope['method']} {scope['path']}")
+        status = 500
+
+        async def send_traced(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", [])) + [(b"x-trace-id", trace.trace_id.encode("latin-1"))],
+                }
+            await send(message)
+
+        token = _trace.set(trace)
+        try:
+            await self.app(scope, receive, send_traced)
+        finally:
+            _trace.reset(token)
+            self.tracer.finish(trace, status)
+            if profile is not None:
+                self.profiler.finish(profile, trace)
@@ -0,0 +1,319 @@
+"""
+Traffic record/replay module for the Gemini upstream.
+Records upstream calls to a JSONL log and serves them back offline with recorded or scaled latencies.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import orjson
+
+from .cache_service import make_cache_key
+from .gemini_client import GeminiAPIError
+
+logger = logging.getLogger(__name__)
+
+# Replay behaviour for a call that is not in the log
+MISS_ERROR, MISS_CYCLE = "error", "cycle"
+# Log entry for a request the cache answered; it carries no upstream answer
+CACHE_HIT = "cache_hit"
+
+
+def _prompt_key(
+    prompt: str,
+    system_instruction: Optional[str],
+    history: Optional[List[Dict[str, str]]] = None
+) -> str:
+    """Looser replay key that ignores the model and generation config, e.g. after a fallback."""
+    return make_cache_key(prompt, "", {}, system_instruction, history)
+
+
+class TrafficRecorder:
+    """
+    Append-only JSONL log of upstream calls.
+
+    Each line is one finished call: prompt, system instruction, model, config,
+    the answer (or error) with its usage, and latency. Requests the cache
+    answered get a "cache_hit" line without an answer. Lines are written with a
+    single unbuffered append, so workers may share a file; a "{pid}" in the
+    path gives each worker its own instead.
+    """
+
+    def __init__(self, path: str):
+        self.path = path.format(pid=os.getpid())
+        self._file = None
+        self.recorded = 0
+
+    def write(self, entry: Dict[str, Any]):
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "ab", buffering=0)
+            logger.info(f"📼 Recording upstream traffic to {self.path}")
+        self._file.write(orjson.dumps({k: v for k, v in entry.items() if v is not None}) + b"\n")
+        self.recorded += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class RecordingClient:
+    """Gemini client wrapper that records every finished call; cancelled calls (e.g. losing hedges) are not logged."""
+
+    def __init__(self, client, recorder: TrafficRecorder):
+        self._client = client
+        self._recorder = recorder
+
+    def _record(
+        self,
+        kind: str,
+        model: str,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        system_instruction: Optional[str],
+        started: float,
+        history: Optional[List[Dict[str, str]]] = None,
+        **result
+    ):
+        elapsed = time.perf_counter() - started
+        self._recorder.write({
+            # When the call was sent, so a replay can reproduce arrival times
+            "t": round(time.time() - elapsed, 3),
+            "kind": kind,
+            "model": model,
+            "prompt": prompt,
+            "system_instruction": system_instruction,
+            "history": history or None,
+            "config": generation_config,
+            "latency_ms": round(elapsed * 1000, 1),
+            **result,
+        })
+
+    def record_cache_hit(
+        self,
+        model: str,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        system_instruction: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None
+    ):
+        """Log a request the service answered from its cache, so a replay sees every request, not just misses."""
+        self._record(
+            CACHE_HIT, model, prompt, generation_config, system_instruction, time.perf_counter(), history
+        )
+
+    async def generate(
+        self,
+        model: str,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        system_instruction: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            response = await self._client.generate(
+                model, prompt, generation_config, system_instruction, history=history
+            )
+        except GeminiAPIError as e:
+            self._record(
+                "generate", model, prompt, generation_config, system_instruction, started, history,
+                error=str(e), status=e.status_code, retry_after=e.retry_after,
+            )
+            raise
+        self._record(
+            "generate", model, prompt, generation_config, system_instruction, started, history,
+            text=response["text"], usage_metadata=response["usage_metadata"],
+        )
+        return response
+
+    async def stream(
+        self,
+        model: str,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        system_instruction: Optional[str] = None,
+        timeout: Optional[float] = None,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        started = time.perf_counter()
+        chunks: List[str] = []
+        usage_metadata = None
+        first_chunk_ms = None
+        error = None
+        finished = False
+        try:
+            async for chunk in self._client.stream(
+                model, prompt, generation_config, system_instruction, timeout=timeout, history=history
+            ):
+                if first_chunk_ms is None:
+                    first_chunk_ms = round((time.perf_counter() - started) * 1000, 1)
+                chunks.append(chunk["text"])
+                usage_metadata = chunk["usage_metadata"] or usage_metadata
+                yield chunk
+            finished = True
+        except GeminiAPIError as e:
+            error = e
+            raise
+        finally:
+            # A stream the caller stopped reading early is logged as far as it got
+            if error is not None:
+                self._record(
+                    "stream", model, prompt, generation_config, system_instruction, started, history,
+                    error=str(error), status=error.status_code, retry_after=error.retry_after,
+                )
+            elif chunks:
+                self._record(
+                    "stream", model, prompt, generation_config, system_instruction, started, history,
+                    chunks=chunks, usage_metadata=usage_metadata, first_chunk_ms=first_chunk_ms,
+                    truncated=None if finished else True,
+                )
+
+    async def warm_up(self, model: str):
+        await self._client.warm_up(model)
+
+    async def aclose(self):
+        await self._client.aclose()
+        self._recorder.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": "record", "path": self._recorder.path, "recorded": self._recorder.recorded}
+
+
+def load_traffic(path: str) -> List[Dict[str, Any]]:
+    """Read a traffic log, skipping a torn last line from a crashed writer."""
+    entries = []
+    with open(path, "rb") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entries.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                logger.warning(f"⚠️  Skipping unreadable traffic log line {number} in {path}")
+    return entries
+
+
+class ReplayClient:
+    """
+    Stand-in for GeminiClient that answers from a recorded traffic log, without network or quota.
+
+    Calls are matched on prompt, system instruction, model and config, falling
+    back to prompt and system instruction alone. Repeated calls for the same
+    key walk through its recorded answers in order (errors included) and wrap
+    around, so a replay is deterministic. Each answer is delayed by its
+    recorded latency times latency_scale. Calls that are not in the log fail
+    with a non-retryable error, or with on_miss="cycle" get the log's entries
+    in turn, which keeps the latency and size distribution of the recording.
+    """
+
+    def __init__(self, path: str, latency_scale: float = 1.0, on_miss: str = MISS_ERROR):
+        self.path = path
+        self.latency_scale = latency_scale
+        self.on_miss = on_miss
+        self._entries = [entry for entry in load_traffic(path) if entry["kind"] != CACHE_HIT]
+        self._by_key: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._by_prompt: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for entry in self._entries:
+            system_instruction, history = entry.get("system_instruction"), entry.get("history")
+            self._by_key[make_cache_key(
+                entry["prompt"], entry["model"], entry.get("config") or {}, system_instruction, history
+            )].append(entry)
+            self._by_prompt[_prompt_key(entry["prompt"], system_instruction, history)].append(entry)
+        self._cursors: Dict[str, int] = defaultdict(int)
+        self._miss_cursor = 0
+        self.counters = {"served": 0, "errors": 0, "misses": 0}
+        logger.info(f"📼 Replaying {len(self._entries)} recorded upstream calls from {path}")
+
+    def _next(
+        self,
+        model: str,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        system_instruction: Optional[str],
+        history: Optional[List[Dict[str, str]]]
+    ) -> Dict[str, Any]:
+        key = make_cache_key(prompt, model, generation_config, system_instruction, history)
+        candidates = self._by_key.get(key)
+        if not candidates:
+            key = _prompt_key(prompt, system_instruction, history)
+            candidates = self._by_prompt.get(key)
+        if candidates:
+            entry = candidates[self._cursors[key] % len(candidates)]
+            self._cursors[key] += 1
+        else:
+            self.counters["misses"] += 1
+            if self.on_miss != MISS_CYCLE or not self._entries:
+                raise GeminiAPIError("Request not found in the replay log", status_code=404)
+            entry = self._entries[self._miss_cursor % len(self._entries)]
+            self._miss_cursor += 1
+        self.counters["served"] += 1
+        return entry
+
+    async def _sleep(self, milliseconds: Optional[float]):
+        if milliseconds and self.latency_scale > 0:
+            await asyncio.sleep(milliseconds / 1000 * self.latency_scale)
+
+    def _raise_if_error(self, entry: Dict[str, Any]):
+        if "error" in entry:
+            self.counters["errors"] += 1
+            raise GeminiAPIError(entry["error"], status_code=entry.get("status"), retry_after=entry.get("retry_after"))
+
+    async def generate(
+        self,
+        model: str,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        system_instruction: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
+        entry = self._next(model, prompt, generation_config, system_instruction, history)
+        await self._sleep(entry.get("latency_ms"))
+        self._raise_if_error(entry)
+        text = entry["text"] if "text" in entry else "".join(entry.get("chunks", []))
+        return {"text": text, "usage_metadata": entry.get("usage_metadata"), "prompt_feedback": None}
+
+    async def stream(
+        self,
+        model: str,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        system_instruction: Optional[str] = None,
+        timeout: Optional[float] = None,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        entry = self._next(model, prompt, generation_config, system_instruction, history)
+        chunks = entry["chunks"] if "chunks" in entry else [entry.get("text", "")]
+        latency_ms = entry.get("latency_ms") or 0.0
+        first_chunk_ms = entry.get("first_chunk_ms", latency_ms)
+        await self._sleep(first_chunk_ms)
+        self._raise_if_error(entry)
+        # Spread the rest of the recorded duration evenly over the remaining chunks
+        gap_ms = (latency_ms - first_chunk_ms) / (len(chunks) - 1) if len(chunks) > 1 else 0.0
+        for index, text in enumerate(chunks):
+            if index:
+                await self._sleep(gap_ms)
+            last = index == len(chunks) - 1
+            yield {"text": text, "usage_metadata": entry.get("usage_metadata") if last else None}
+
+    async def warm_up(self, model: str):
+        """Nothing to connect to."""
+
+    async def aclose(self):
+        """Nothing to close."""
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": "replay",
+            "path": self.path,
+            "entries": len(self._entries),
+            "latency_scale": self.latency_scale,
+            **self.counters,
+        }
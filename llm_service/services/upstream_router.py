@@ -0,0 +1,193 @@
+"""
+Upstream routing module for model selection and hedging.
+Tracks per-model latency and errors to pick a healthy model and a hedge delay.
+"""
+
+import time
+from collections import deque
+from typing import Dict, Any, Optional, Tuple
+
+from . import metrics
+
+
+class ModelStats:
+    """Rolling latency samples and recent outcomes for one model."""
+
+    def __init__(self, latency_window: int, error_window_seconds: float):
+        self.error_window_seconds = error_window_seconds
+        self._latencies = deque(maxlen=latency_window)
+        self._outcomes = deque()
+        self.counters = {"calls": 0, "errors": 0, "censored": 0, "hedges": 0, "hedge_wins": 0, "fallbacks": 0}
+
+    def record(self, latency: Optional[float], ok: bool):
+        now = time.monotonic()
+        self.counters["calls"] += 1
+        if not ok:
+            self.counters["errors"] += 1
+        if ok and latency is not None:
+            self._latencies.append(latency)
+        self._outcomes.append((now, ok))
+        self._expire(now)
+
+    def record_censored(self, elapsed: float):
+        """
+        Record a call cancelled after elapsed seconds without an answer (a hedge loser).
+
+        Its real latency is at least elapsed, so elapsed goes into the window as
+        a lower bound. Leaving these calls out would keep only the fast ones,
+        and the hedge delay would drift down while the hedge rate climbs.
+        """
+        self.counters["calls"] += 1
+        self.counters["censored"] += 1
+        self._latencies.append(elapsed)
+
+    def _expire(self, now: float):
+        cutoff = now - self.error_window_seconds
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
+
+    def recent_error_rate(self) -> Optional[float]:
+        """Error rate over the error window, or None with no recent calls."""
+        self._expire(time.monotonic())
+        if not self._outcomes:
+            return None
+        return sum(1 for _, ok in self._outcomes if not ok) / len(self._outcomes)
+
+    def recent_calls(self) -> int:
+        return len(self._outcomes)
+
+    def latency_samples(self) -> int:
+        return len(self._latencies)
+
+    def latency_quantile(self, quantile: float) -> Optional[float]:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * quantile))]
+
+
+class UpstreamRouter:
+    """
+    Choose which model serves a call and when to hedge it.
+
+    Calls go to the primary model unless it is erroring (recent error rate at or
+    above the threshold) or the previous attempt on it just failed; then the
+    fallback model is used. A call that runs past the recent latency quantile
+    of its model and operation gets a hedged duplicate. Latency is kept per
+    operation because a long expand call is not slow by the standard of short
+    generate calls.
+    """
+
+    def __init__(
+        self,
+        primary_model: str,
+        fallback_model: Optional[str] = None,
+        hedge_enabled: bool = True,
+        hedge_quantile: float = 0.95,
+        hedge_min_delay: float = 0.2,
+        hedge_default_delay: float = 3.0,
+        hedge_min_samples: int = 20,
+        fallback_error_rate: float = 0.5,
+        fallback_min_calls: int = 5,
+        error_window_seconds: float = 60,
+        latency_window: int = 200
+    ):
+        self.primary_model = primary_model
+        self.fallback_model = fallback_model if fallback_model != primary_model else None
+        self.hedge_enabled = hedge_enabled
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.fallback_error_rate = fallback_error_rate
+        self.fallback_min_calls = fallback_min_calls
+        self.latency_window = latency_window
+        self.error_window_seconds = error_window_seconds
+        self._models: Dict[str, ModelStats] = {}
+        # Latency per (model, operation), for hedge delays; operations are a small fixed set
+        self._operations: Dict[Tuple[str, str], ModelStats] = {}
+        for model in filter(None, [primary_model, self.fallback_model]):
+            self._models[model] = ModelStats(latency_window, error_window_seconds)
+
+    def _healthy(self, model: str) -> bool:
+        stats = self._models[model]
+        if stats.recent_calls() < self.fallback_min_calls:
+            return True
+        return stats.recent_error_rate() < self.fallback_error_rate
+
+    def choose_model(self, failed_model: Optional[str] = None) -> str:
+        """Pick the model for the next attempt; failed_model is the one the previous attempt used."""
+        if self.fallback_model is None:
+            return self.primary_model
+        if failed_model == self.primary_model or not self._healthy(self.primary_model):
+            self._models[self.fallback_model].counters["fallbacks"] += 1
+            metrics.MODEL_FALLBACKS.labels(self.fallback_model).inc()
+            return self.fallback_model
+        return self.primary_model
+
+    def _operation_stats(self, model: str, operation: Optional[str]) -> ModelStats:
+        """Latency stats for model's calls of one operation (all of its calls if operation is None)."""
+        if operation is None:
+            return self._models[model]
+        stats = self._operations.get((model, operation))
+        if stats is None:
+            stats = self._operations[(model, operation)] = ModelStats(self.latency_window, self.error_window_seconds)
+        return stats
+
+    def hedge_delay(self, model: str, operation: Optional[str] = None) -> Optional[float]:
+        """Seconds to wait before hedging a call of operation to model, or None to not hedge."""
+        if not self.hedge_enabled:
+            return None
+        stats = self._operation_stats(model, operation)
+        if stats.latency_samples() < self.hedge_min_samples:
+            return self.hedge_default_delay
+        return max(self.hedge_min_delay, stats.latency_quantile(self.hedge_quantile))
+
+    def record(self, model: str, latency: Optional[float], ok: bool, operation: Optional[str] = None):
+        """Record one upstream call's outcome; latency is None for calls not comparable to the rest (streams)."""
+        self._models[model].record(latency, ok)
+        if operation is not None:
+            self._operation_stats(model, operation).record(latency, ok)
+        if latency is not None:
+            metrics.MODEL_LATENCY.labels(model, "success" if ok else "error").observe(latency)
+
+    def record_censored(self, model: str, elapsed: float, operation: Optional[str] = None):
+        """Record a call to model that was cancelled after elapsed seconds because its hedge answered first."""
+        self._models[model].record_censored(elapsed)
+        if operation is not None:
+            self._operation_stats(model, operation).record_censored(elapsed)
+
+    def record_hedge(self, model: str, hedge_won: bool):
+        """Record that a call was hedged and which copy answered first."""
+        counters = self._models[model].counters
+        counters["hedges"] += 1
+        if hedge_won:
+            counters["hedge_wins"] += 1
+        metrics.HEDGED_REQUESTS.labels(model, "hedge" if hedge_won else "original").inc()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per-model call, error, latency, hedge and fallback figures."""
+        models = {}
+        for model, stats in self._models.items():
+            calls = stats.counters["calls"]
+            p50, p95 = stats.latency_quantile(0.5), stats.latency_quantile(0.95)
+            recent_error_rate = stats.recent_error_rate()
+            models[model] = {
+                **stats.counters,
+                "role": "primary" if model == self.primary_model else "fallback",
+                "healthy": self._healthy(model),
+                "recent_error_rate": round(recent_error_rate, 4) if recent_error_rate is not None else None,
+                "hedge_rate": round(stats.counters["hedges"] / calls, 4) if calls else 0.0,
+                "latency_p50_seconds": round(p50, 4) if p50 is not None else None,
+                "latency_p95_seconds": round(p95, 4) if p95 is not None else None,
+                "hedge_delay_seconds": self.hedge_delay(model),
+                "operations": {
+                    operation: {
+                        "latency_samples": op_stats.latency_samples(),
+                        "hedge_delay_seconds": self.hedge_delay(model, operation),
+                    }
+                    for (op_model, operation), op_stats in self._operations.items()
+                    if op_model == model
+                },
+            }
+        return {"hedging": self.hedge_enabled, "models": models}
@@ -0,0 +1,151 @@
+"""
+Token usage accounting module.
+Tracks upstream token consumption per operation and per caller over time.
+"""
+
+import time
+from collections import defaultdict, deque
+from typing import Dict, Any, Iterable, List, Optional
+
+from models import UsageInfo
+
+# Cumulative usage bucket for callers beyond UsageTracker.max_callers
+OTHER_CALLERS = "other"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate (~4 characters per token) for when no count is available."""
+    return max(1, len(text) // 4)
+
+
+def build_usage_info(
+    model: str,
+    prompt: str,
+    completion: str,
+    usage_metadata: Optional[Dict[str, Any]] = None
+) -> UsageInfo:
+    """Build UsageInfo from Gemini usage metadata, estimating counts it does not provide."""
+    metadata = usage_metadata or {}
+    prompt_tokens = metadata.get("promptTokenCount")
+    completion_tokens = metadata.get("candidatesTokenCount")
+    estimated = prompt_tokens is None or completion_tokens is None
+    if prompt_tokens is None:
+        prompt_tokens = estimate_tokens(prompt)
+    if completion_tokens is None:
+        completion_tokens = estimate_tokens(completion)
+    return UsageInfo(
+        model=model,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=None if estimated else metadata.get("totalTokenCount"),
+        estimated=estimated,
+    )
+
+
+def split_usage(usage_info: Dict[str, Any], weights: List[int]) -> List[Dict[str, Any]]:
+    """
+    Split one call's usage across the items it produced, in proportion to weights (e.g. output length).
+
+    Token counts are divided by largest remainder, so the shares add up to the call's usage exactly.
+    """
+    if not weights:
+        return []
+    if sum(weights) <= 0:
+        weights = [1] * len(weights)
+    shares = [dict(usage_info) for _ in weights]
+    for field in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        total = usage_info.get(field)
+        if total is None:
+            continue
+        exact = [total * weight / sum(weights) for weight in weights]
+        counts = [int(value) for value in exact]
+        by_remainder = sorted(range(len(weights)), key=lambda i: exact[i] - counts[i], reverse=True)
+        for i in by_remainder[:total - sum(counts)]:
+            counts[i] += 1
+        for share, count in zip(shares, counts):
+            share[field] = count
+    return shares
+
+
+class UsageTracker:
+    """
+    Cumulative and windowed token usage keyed by operation and caller.
+
+    Callers are chosen by clients (any bearer token is a new caller), so
+    cumulative usage names at most max_callers of them and sums the rest
+    under "other". Windowed usage is bounded by max_events.
+    """
+
+    def __init__(self, retention_seconds: int, max_events: int, max_callers: int = 1000):
+        self.retention_seconds = retention_seconds
+        self.max_callers = max_callers
+        self._events = deque(maxlen=max_events)
+        self._started = time.time()
+        self._cumulative = {
+            "by_operation": defaultdict(_empty_totals),
+            "by_caller": defaultdict(_empty_totals),
+        }
+
+    def record(self, operation: str, caller: str, usage: UsageInfo):
+        """Record one upstream call's token usage."""
+        now = time.time()
+        event = (now, operation, caller, usage.prompt_tokens, usage.completion_tokens, usage.estimated)
+        self._events.append(event)
+        _add(self._cumulative["by_operation"][operation], event)
+        by_caller = self._cumulative["by_caller"]
+        if caller not in by_caller and len(by_caller) >= self.max_callers:
+            caller = OTHER_CALLERS
+        _add(by_caller[caller], event)
+        self._expire(now)
+
+    def _expire(self, now: float):
+        cutoff = now - self.retention_seconds
+        while self._events and self._events[0][0] < cutoff:
+            self._events.popleft()
+
+    def window(self, seconds: int) -> Dict[str, Any]:
+        """Aggregate usage over the last `seconds` seconds."""
+        cutoff = time.time() - seconds
+        return _aggregate(event for event in self._events if event[0] >= cutoff)
+
+    def cumulative(self) -> Dict[str, Any]:
+        """Usage since the service started."""
+        by_operation = dict(self._cumulative["by_operation"])
+        return {
+            "since": self._started,
+            "totals": _sum_totals(by_operation.values()),
+            "by_operation": by_operation,
+            "by_caller": dict(self._cumulative["by_caller"]),
+        }
+
+
+def _empty_totals() -> Dict[str, int]:
+    return {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "estimated_requests": 0}
+
+
+def _add(totals: Dict[str, int], event: tuple):
+    _, _, _, prompt_tokens, completion_tokens, estimated = event
+    totals["requests"] += 1
+    totals["prompt_tokens"] += prompt_tokens
+    totals["completion_tokens"] += completion_tokens
+    totals["total_tokens"] += prompt_tokens + completion_tokens
+    totals["estimated_requests"] += int(estimated)
+
+
+def _sum_totals(items: Iterable[Dict[str, int]]) -> Dict[str, int]:
+    result = _empty_totals()
+    for totals in items:
+        for key, value in totals.items():
+            result[key] += value
+    return result
+
+
+def _aggregate(events: Iterable[tuple]) -> Dict[str, Any]:
+    totals = _empty_totals()
+    by_operation = defaultdict(_empty_totals)
+    by_caller = defaultdict(_empty_totals)
+    for event in events:
+        _add(totals, event)
+        _add(by_operation[event[1]], event)
+        _add(by_caller[event[2]], event)
+    return {"totals": totals, "by_operation": dict(by_operation), "by_caller": dict(by_caller)}
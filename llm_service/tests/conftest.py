@@ -0,0 +1,84 @@
+"""
+Shared pytest configuration for the AI service tests.
+Puts the service directory on the import path and runs async tests on asyncio via anyio's plugin.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# config validates the key at import; the tests never reach Gemini
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class FakeGemini:
+    """
+    Stand-in for GeminiClient that answers every call with reply(prompt).
+
+    calls records (model, prompt, history) for each generate or stream call.
+    """
+
+    def __init__(self, reply=lambda prompt: "A description", delay: float = 0.0):
+        self.reply = reply
+        self.delay = delay
+        self.calls = []
+
+    async def generate(self, model, prompt, generation_config, system_instruction=None, history=None):
+        import asyncio
+
+        self.calls.append((model, prompt, history))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        text = self.reply(prompt)
+        return {
+            "text": text,
+            "usage_metadata": {"promptTokenCount": 100, "candidatesTokenCount": 50, "totalTokenCount": 150},
+            "prompt_feedback": None,
+        }
+
+    async def stream(self, model, prompt, generation_config, system_instruction=None, timeout=None, history=None):
+        self.calls.append((model, prompt, history))
+        for word in self.reply(prompt).split(" "):
+            yield {"text": word + " ", "usage_metadata": None}
+
+    async def warm_up(self, model):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+@pytest.fixture
+def fake_gemini():
+    return FakeGemini()
+
+
+@pytest.fixture
+def ai_service(monkeypatch, fake_gemini):
+    """An AIService with in-memory state, no rate limit, hedging or breaker, talking to fake_gemini."""
+    from config import settings
+    from services import AIService
+
+    for name, value in {
+        "rate_limit_rpm": 0,
+        "hedge_enabled": False,
+        "breaker_enabled": False,
+        "fallback_model_name": "",
+        "state_backend": "memory",
+        "cache_sqlite_path": "",
+        "record_path": "",
+        "replay_path": "",
+        "semantic_cache_enabled": False,
+        "structured_output": False,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    service = AIService()
+    service._client = fake_gemini
+    return service
@@ -0,0 +1,30 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from config import settings
+from routes import admin_routes
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(admin_routes.router)
+    return TestClient(app)
+
+
+def test_slow_request_log_is_disabled_without_an_admin_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "")
+
+    assert client.get("/traces/slow").status_code == 403
+
+
+def test_slow_request_log_needs_the_admin_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "t0ken")
+
+    assert client.get("/traces/slow").status_code == 401
+    assert client.get("/traces/slow", headers={"X-Admin-Token": "wrong"}).status_code == 401
+
+    response = client.get("/traces/slow", headers={"X-Admin-Token": "t0ken"})
+    assert response.status_code == 200
+    assert "requests" in response.json()
@@ -0,0 +1,169 @@
+import asyncio
+
+import pytest
+
+from services import metrics, tracing
+from services.errors import TenantQuotaExceededError, UpstreamUnavailableError
+from services.rate_limiter import AdmissionController, TokenBucket
+from services.shared_state import SQLiteBackend
+
+pytestmark = pytest.mark.anyio
+
+
+def controller(**overrides):
+    options = dict(
+        requests_per_minute=60,
+        tokens_per_minute=1_000_000,
+        max_queue=10,
+        max_wait_seconds=30,
+    )
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+async def test_queue_gauges_follow_waiting_callers():
+    # One request per second: the first caller drains the bucket, the next two queue
+    admission = controller(requests_per_minute=60)
+    admission._requests._tokens = 1
+
+    await admission.acquire(10, tenant="a")
+    waiters = [
+        asyncio.ensure_future(admission.acquire(10, tenant="a")),
+        asyncio.ensure_future(admission.acquire(10, tenant="b")),
+    ]
+    await asyncio.sleep(0.05)
+
+    assert metrics.ADMISSION_QUEUE_DEPTH._value.get() == 2
+    assert metrics.TENANTS_QUEUED._value.get() == 2
+
+    for waiter in waiters:
+        waiter.cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+
+    assert metrics.ADMISSION_QUEUE_DEPTH._value.get() == 0
+    assert metrics.TENANTS_QUEUED._value.get() == 0
+
+
+async def test_caller_over_tenant_quota_gets_429():
+    admission = controller(tenant_requests_per_minute=1)
+
+    await admission.acquire(10, tenant="a")
+    with pytest.raises(TenantQuotaExceededError):
+        await admission.acquire(10, tenant="a")
+    # Other tenants have their own quota
+    await admission.acquire(10, tenant="b")
+
+    assert admission.tenant_stats()["tenants"]["a"]["quota_rejected"] == 1
+
+
+async def test_caller_rejected_for_capacity_keeps_its_tenant_quota():
+    admission = controller(requests_per_minute=60, max_queue=1, tenant_requests_per_minute=2)
+    admission._requests._tokens = 0
+    # Tenant a's caller fills the one queue slot
+    queued = asyncio.ensure_future(admission.acquire(10, tenant="a"))
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(UpstreamUnavailableError):
+        await admission.acquire(10, tenant="b")
+
+    # The 503 did not use up b's quota: it can still make two requests
+    quota = admission._tenants["b"].quota
+    assert await quota.take(10) == 0
+    assert await quota.take(10) == 0
+
+    queued.cancel()
+    await asyncio.gather(queued, return_exceptions=True)
+
+
+async def test_background_tasks_do_not_inherit_the_callers_trace():
+    admission = controller()
+    admission._requests._tokens = 0
+    seen = []
+    take = admission._take
+
+    async def recording_take(tokens):
+        seen.append(tracing.current_trace())
+        return await take(tokens)
+
+    admission._take = recording_take
+    token = tracing._trace.set(tracing.Trace("POST /generate-description"))
+    try:
+        queued = asyncio.ensure_future(admission.acquire(10, tenant="a"))
+        await asyncio.sleep(0.05)
+    finally:
+        tracing._trace.reset(token)
+
+    assert seen and all(trace is None for trace in seen)
+
+    queued.cancel()
+    await asyncio.gather(queued, return_exceptions=True)
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(rate_per_minute=60)
+    bucket.take(60)
+
+    # One token per second, so five tokens are five seconds away
+    assert bucket.wait_time(5) == pytest.approx(5, abs=0.05)
+    # A request bigger than the bucket only waits for it to be full
+    assert bucket.wait_time(1000) == pytest.approx(60, abs=0.05)
+
+    bucket._updated -= 2
+    assert bucket.wait_time(2) == pytest.approx(0, abs=0.05)
+
+
+def test_token_bucket_can_go_negative_to_charge_actual_usage():
+    bucket = TokenBucket(rate_per_minute=60)
+    bucket.take(90)
+
+    assert bucket.wait_time(1) == pytest.approx(31, abs=0.05)
+
+
+def test_rate_limit_halves_the_rate_once_per_burst_and_successes_restore_it():
+    admission = controller(requests_per_minute=600, min_rate_factor=0.1)
+
+    admission.on_rate_limited()
+    # 429s from calls already in flight count as one signal
+    admission.on_rate_limited()
+    assert admission.stats()["rate_factor"] == 0.5
+    assert admission.stats()["requests_per_minute"] == 300
+
+    for _ in range(5):
+        admission.on_success()
+    assert admission.stats()["rate_factor"] == 0.75
+
+    for _ in range(20):
+        admission.on_success()
+    assert admission.stats()["rate_factor"] == 1.0
+
+
+def test_rate_factor_never_drops_below_the_floor():
+    admission = controller(min_rate_factor=0.1)
+
+    for _ in range(10):
+        admission._last_decrease = 0.0
+        admission.on_rate_limited()
+
+    assert admission.stats()["rate_factor"] == 0.1
+
+
+async def test_retry_after_pauses_admission():
+    admission = controller(max_wait_seconds=1)
+
+    admission.on_rate_limited(retry_after=30)
+
+    assert admission.stats()["paused_for_seconds"] == pytest.approx(30, abs=0.1)
+    assert not await admission.try_acquire(10)
+    # Waiting out the pause would take longer than callers may queue
+    with pytest.raises(UpstreamUnavailableError):
+        await admission.acquire(10)
+
+
+async def test_workers_sharing_a_backend_draw_from_one_budget(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "state.db"))
+    workers = [controller(requests_per_minute=3, backend=backend) for _ in range(2)]
+
+    admitted = [await worker.try_acquire(10) for worker in workers + workers]
+
+    assert admitted == [True, True, True, False]
+    await backend.aclose()
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from models import TaskContext
+from services.usage_tracker import split_usage
+
+pytestmark = pytest.mark.anyio
+
+
+def test_split_usage_is_proportional_and_adds_up_exactly():
+    shares = split_usage({"model": "m", "prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110}, [1, 1, 1])
+    assert [share["prompt_tokens"] for share in shares] == [34, 33, 33]
+    assert sum(share["completion_tokens"] for share in shares) == 10
+    assert sum(share["total_tokens"] for share in shares) == 110
+    assert all(share["model"] == "m" for share in shares)
+
+    uneven = split_usage({"prompt_tokens": 90, "completion_tokens": 30, "total_tokens": 120}, [200, 100])
+    assert [share["completion_tokens"] for share in uneven] == [20, 10]
+
+
+def test_split_usage_with_zero_weights_splits_evenly():
+    assert [s["prompt_tokens"] for s in split_usage({"prompt_tokens": 4}, [0, 0])] == [2, 2]
+
+
+async def test_packed_batch_items_add_up_to_the_pack_usage(ai_service, fake_gemini):
+    fake_gemini.reply = lambda prompt: json.dumps([
+        {"index": 0, "description": "x" * 300},
+        {"index": 1, "description": "y" * 100},
+    ])
+    tasks = [TaskContext(title=f"Task {i}", stage="todo") for i in range(2)]
+    results = await ai_service.generate_descriptions_batch(tasks, pack=True)
+
+    assert len(fake_gemini.calls) == 1
+    usage = [result["usage_info"] for result in results]
+    assert sum(u["prompt_tokens"] for u in usage) == 100
+    assert sum(u["completion_tokens"] for u in usage) == 50
+    assert usage[0]["completion_tokens"] > usage[1]["completion_tokens"]
+    assert all(u["packed_tasks"] == 2 for u in usage)
@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+from services.cache_service import ResponseCache, make_cache_key
+
+pytestmark = pytest.mark.anyio
+
+
+def test_key_ignores_whitespace_only_differences():
+    assert make_cache_key("fix  the\nbug", "m", {"t": 1}) == make_cache_key("fix the bug", "m", {"t": 1})
+
+
+def test_key_depends_on_model_config_system_instruction_and_history():
+    base = make_cache_key("p", "m", {"t": 1})
+    assert make_cache_key("p", "other", {"t": 1}) != base
+    assert make_cache_key("p", "m", {"t": 2}) != base
+    assert make_cache_key("p", "m", {"t": 1}, "be brief") != base
+    assert make_cache_key("p", "m", {"t": 1}, history=[{"role": "user", "text": "x"}]) != base
+
+
+def test_empty_history_keeps_the_key_unchanged():
+    assert make_cache_key("p", "m", {}, None, []) == make_cache_key("p", "m", {})
+
+
+async def test_get_returns_a_copy_of_the_stored_value():
+    cache = ResponseCache(max_entries=10, ttl_seconds=60)
+    await cache.set("k", {"content": "a"})
+    hit = await cache.get("k")
+    hit["content"] = "changed"
+    assert (await cache.get("k"))["content"] == "a"
+    assert cache.stats()["hits"] == 2
+
+
+async def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    await cache.set("a", {"v": 1})
+    await cache.set("b", {"v": 2})
+    await cache.get("a")
+    await cache.set("c", {"v": 3})
+    assert await cache.get("b") is None
+    assert await cache.get("a") == {"v": 1}
+    assert cache.stats()["evictions"] == 1
+
+
+async def test_expired_entries_are_misses(monkeypatch):
+    cache = ResponseCache(max_entries=10, ttl_seconds=60)
+    await cache.set("k", {"v": 1})
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert await cache.get("k") is None
+    assert cache.stats()["expired"] == 1
+
+
+async def test_sqlite_tier_survives_a_new_cache_instance(tmp_path):
+    path = str(tmp_path / "cache.db")
+    await ResponseCache(max_entries=10, ttl_seconds=60, sqlite_path=path).set("k", {"v": 1})
+    cache = ResponseCache(max_entries=10, ttl_seconds=60, sqlite_path=path)
+    assert await cache.get("k") == {"v": 1}
+    assert cache.stats()["disk_hits"] == 1
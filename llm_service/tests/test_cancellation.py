@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from routes.ai_routes import run_cancellable
+from services import metrics
+from services.deadline import remaining
+from services.errors import DeadlineExceededError
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeRequest:
+    """Just enough of a Starlette request for run_cancellable: receive() reports a disconnect after a delay."""
+
+    def __init__(self, disconnect_after: float = 60):
+        self.disconnect_after = disconnect_after
+
+    async def receive(self):
+        await asyncio.sleep(self.disconnect_after)
+        return {"type": "http.disconnect"}
+
+
+async def test_result_is_returned_when_the_work_finishes_first():
+    async def work():
+        return "done"
+
+    assert await run_cancellable(FakeRequest(), work(), None, "generate") == "done"
+
+
+async def test_client_disconnect_cancels_the_work_and_answers_499():
+    cancelled = asyncio.Event()
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with pytest.raises(HTTPException) as error:
+        await run_cancellable(FakeRequest(disconnect_after=0.01), work(), None, "generate")
+    assert error.value.status_code == 499
+    assert cancelled.is_set()
+
+
+async def test_disconnect_is_recorded_as_cancelled_not_error():
+    async def work():
+        await asyncio.sleep(10)
+
+    before = metrics.REQUEST_LATENCY.labels("cancel_test", "cancelled")._sum.get()
+    with pytest.raises(HTTPException):
+        with metrics.track_request("cancel_test"):
+            await run_cancellable(FakeRequest(disconnect_after=0.01), work(), None, "cancel_test")
+    assert metrics.REQUEST_LATENCY.labels("cancel_test", "cancelled")._sum.get() > before
+
+
+async def test_work_sees_the_callers_deadline():
+    async def work():
+        return remaining()
+
+    left = await run_cancellable(FakeRequest(), work(), 5, "generate")
+    assert 0 < left <= 5
+
+
+async def test_deadline_errors_propagate():
+    async def work():
+        raise DeadlineExceededError()
+
+    with pytest.raises(DeadlineExceededError):
+        await run_cancellable(FakeRequest(), work(), 1, "generate")
@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from services import metrics
+from services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from services.errors import CircuitOpenError
+
+
+def breaker(**overrides):
+    options = dict(error_rate=0.5, min_calls=4, window_seconds=30, open_seconds=0.05, probe_calls=2)
+    options.update(overrides)
+    return CircuitBreaker(**options)
+
+
+def fail(circuit, times):
+    for _ in range(times):
+        circuit.record(circuit.acquire(), ok=False)
+
+
+def test_opens_once_enough_calls_fail():
+    circuit = breaker()
+    circuit.record(circuit.acquire(), ok=True)
+    fail(circuit, 2)
+    # Two failures out of three calls: too few calls to judge yet
+    assert circuit.state == CLOSED
+
+    fail(circuit, 1)
+
+    assert circuit.state == OPEN
+    assert metrics.CIRCUIT_STATE._value.get() == 2
+    with pytest.raises(CircuitOpenError):
+        circuit.acquire()
+    assert circuit.stats()["rejected"] == 1
+
+
+def test_successful_probes_close_the_circuit():
+    circuit = breaker()
+    fail(circuit, 4)
+    time.sleep(0.06)
+
+    probes = [circuit.acquire(), circuit.acquire()]
+    assert circuit.state == HALF_OPEN
+    # Only probe_calls requests are let through while half-open
+    with pytest.raises(CircuitOpenError):
+        circuit.acquire()
+
+    for probe in probes:
+        circuit.record(probe, ok=True)
+
+    assert circuit.state == CLOSED
+    # Failures from before the outage are forgotten
+    assert circuit.stats()["recent_calls"] == 0
+
+
+def test_failed_probe_reopens_the_circuit():
+    circuit = breaker()
+    fail(circuit, 4)
+    time.sleep(0.06)
+
+    circuit.record(circuit.acquire(), ok=False)
+
+    assert circuit.state == OPEN
+    assert circuit.stats()["opened"] == 2
+
+
+def test_probe_from_an_earlier_half_open_period_is_ignored():
+    circuit = breaker()
+    fail(circuit, 4)
+    time.sleep(0.06)
+    stale = circuit.acquire()
+    circuit.record(circuit.acquire(), ok=False)
+    time.sleep(0.06)
+    assert not circuit.is_closed()
+
+    circuit.record(stale, ok=True)
+    circuit.record(circuit.acquire(), ok=True)
+
+    # One success in the current period is not enough to close
+    assert circuit.state == HALF_OPEN
+
+
+def test_released_probe_frees_its_slot():
+    circuit = breaker(probe_calls=1)
+    fail(circuit, 4)
+    time.sleep(0.06)
+
+    probe = circuit.acquire()
+    circuit.release(probe)
+
+    circuit.record(circuit.acquire(), ok=True)
+    assert circuit.state == CLOSED
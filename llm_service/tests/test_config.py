@@ -0,0 +1,37 @@
+import os
+import re
+
+import pytest
+
+from config import load_env_files, parse_tenant_weights
+
+
+def test_env_files_load_even_when_the_api_key_is_already_set(tmp_path, monkeypatch):
+    root = tmp_path / "root.env"
+    root.write_text("GOOGLE_API_KEY=from-file\nAI_TEST_ROOT_VALUE=root\nAI_TEST_SHARED=root\n")
+    local = tmp_path / "local.env"
+    local.write_text("AI_TEST_LOCAL_VALUE=local\nAI_TEST_SHARED=local\n")
+    monkeypatch.setenv("GOOGLE_API_KEY", "from-environment")
+    # Recorded as unset, so monkeypatch removes whatever the files add
+    for name in ("AI_TEST_ROOT_VALUE", "AI_TEST_LOCAL_VALUE", "AI_TEST_SHARED"):
+        monkeypatch.delenv(name, raising=False)
+
+    load_env_files((str(root), str(local), str(tmp_path / "missing.env")))
+
+    assert os.environ["GOOGLE_API_KEY"] == "from-environment"
+    assert os.environ["AI_TEST_ROOT_VALUE"] == "root"
+    assert os.environ["AI_TEST_LOCAL_VALUE"] == "local"
+    # The first file wins over later ones
+    assert os.environ["AI_TEST_SHARED"] == "root"
+
+
+def test_tenant_weights_are_parsed():
+    assert parse_tenant_weights("") == {}
+    assert parse_tenant_weights(" project:ops=2, anonymous=0.5 ,") == {"project:ops": 2.0, "anonymous": 0.5}
+
+
+@pytest.mark.parametrize("value", ["x=0", "x=-1", "x=nan", "x=inf", "a=1,x", "=2", "x=heavy"])
+def test_bad_tenant_weights_are_rejected_by_name(value):
+    bad = value.split(",")[-1]
+    with pytest.raises(ValueError, match=re.escape(repr(bad))):
+        parse_tenant_weights(value)
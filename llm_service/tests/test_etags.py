@@ -0,0 +1,94 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import ai_routes
+from routes.ai_routes import etag_matches, prompt_etag
+from services.compression import CompressionMiddleware
+
+REQUEST = {"task": {"title": "Set up CI pipeline", "stage": "todo"}}
+
+
+@pytest.fixture
+def generated(monkeypatch):
+    """Descriptions the route asked the service for, answered with a long fixed text."""
+    calls = []
+
+    async def generate_description(request, **kwargs):
+        calls.append(kwargs)
+        return {"success": True, "content": "Pipeline. " * 200}
+
+    monkeypatch.setattr(ai_routes.ai_service, "generate_description", generate_description)
+    return calls
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(ai_routes.router)
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return TestClient(app)
+
+
+def test_etag_matching_is_weak_and_handles_lists():
+    etag = prompt_etag("a" * 64)
+
+    assert etag == '"' + "a" * 32 + '"'
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_several_prompts_share_one_order_sensitive_etag():
+    assert prompt_etag("a", "b") != prompt_etag("b", "a")
+    assert prompt_etag("a", "b") == prompt_etag("a", "b")
+
+
+def test_matching_if_none_match_skips_generation(client, generated):
+    # Uncompressed, so the ETag is the strong one the 304 repeats
+    first = client.post("/generate-description", json=REQUEST, headers={"Accept-Encoding": "identity"})
+    etag = first.headers["ETag"]
+
+    again = client.post("/generate-description", json=REQUEST, headers={"If-None-Match": etag})
+
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert again.content == b""
+    assert len(generated) == 1
+
+
+def test_changed_task_gets_a_new_etag(client, generated):
+    etag = client.post("/generate-description", json=REQUEST).headers["ETag"]
+    changed = {"task": {**REQUEST["task"], "title": "Set up CD pipeline"}}
+
+    response = client.post("/generate-description", json=changed, headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_no_cache_never_answers_304(client, generated):
+    etag = client.post("/generate-description", json=REQUEST).headers["ETag"]
+
+    response = client.post(
+        "/generate-description", json=REQUEST, headers={"If-None-Match": etag, "Cache-Control": "no-cache"}
+    )
+
+    assert response.status_code == 200
+    assert len(generated) == 2
+
+
+def test_compressed_response_carries_a_weak_etag_that_still_matches(client, generated):
+    response = client.post("/generate-description", json=REQUEST, headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"].startswith('W/"')
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert response.json()["content"].startswith("Pipeline.")
+
+    again = client.post(
+        "/generate-description", json=REQUEST, headers={"If-None-Match": response.headers["ETag"]}
+    )
+    assert again.status_code == 304
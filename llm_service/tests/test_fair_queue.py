@@ -0,0 +1,74 @@
+from collections import Counter
+
+import pytest
+
+from services.fair_queue import DeficitRoundRobin
+
+
+def drain(queue):
+    served = []
+    while True:
+        item = queue.pop()
+        if item is None:
+            return served
+        served.append(item)
+
+
+def test_backlogged_tenants_take_turns():
+    queue = DeficitRoundRobin(quantum=100)
+    for i in range(3):
+        queue.push("a", f"a{i}", 100)
+    for i in range(3):
+        queue.push("b", f"b{i}", 100)
+
+    assert drain(queue) == ["a0", "b0", "a1", "b1", "a2", "b2"]
+    assert len(queue) == 0
+    assert queue.tenants_queued() == 0
+
+
+def test_share_follows_cost_and_weight():
+    queue = DeficitRoundRobin(quantum=100, weights={"heavy": 2.0})
+    for i in range(20):
+        queue.push("heavy", "heavy", 100)
+        queue.push("light", "light", 100)
+        # Requests four times as large get a quarter as many turns
+        queue.push("big", "big", 400)
+
+    # Eight rounds: 16 heavy, 8 light, 2 big
+    first = Counter(drain(queue)[:26])
+
+    assert first["heavy"] == 2 * first["light"]
+    assert first["light"] == 4 * first["big"]
+
+
+def test_removed_item_is_never_served():
+    queue = DeficitRoundRobin(quantum=100)
+    queue.push("a", "a0", 100)
+    queue.push("a", "a1", 100)
+    queue.push("b", "b0", 100)
+
+    assert queue.remove("a", "a0")
+    assert not queue.remove("a", "a0")
+    assert queue.queued("a") == 1
+
+    assert drain(queue) == ["a1", "b0"]
+
+
+def test_idle_tenant_does_not_bank_deficit():
+    queue = DeficitRoundRobin(quantum=100)
+    queue.push("a", "a0", 100)
+    assert drain(queue) == ["a0"]
+
+    # a was idle while b queued; coming back it gets a normal turn, not a burst
+    for i in range(3):
+        queue.push("b", f"b{i}", 100)
+    for i in range(3):
+        queue.push("a", f"a{i + 1}", 100)
+
+    assert drain(queue)[:4] == ["b0", "a1", "b1", "a2"]
+
+
+@pytest.mark.parametrize("weight", [0, -1.0, float("nan")])
+def test_weights_must_be_positive(weight):
+    with pytest.raises(AssertionError):
+        DeficitRoundRobin(quantum=100, weights={"a": weight})
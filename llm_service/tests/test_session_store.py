@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from services.session_store import SessionStore, apply_edits, new_session
+from services.shared_state import SQLiteBackend
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+async def store_factory(request, tmp_path):
+    """Build SessionStores in memory or on a shared SQLite backend."""
+    backends = []
+
+    def make(max_sessions=10, ttl_seconds=60):
+        backend = None
+        if request.param == "sqlite":
+            backend = SQLiteBackend(str(tmp_path / "state.db"))
+            backends.append(backend)
+        return SessionStore(max_sessions, ttl_seconds, backend)
+
+    yield make
+    for backend in backends:
+        await backend.aclose()
+
+
+async def test_save_is_compare_and_swap_on_version(store_factory):
+    store = store_factory()
+    session = new_session("alice", "Draft one")
+    await store.create(session)
+
+    first = {**session, "draft": "Draft two", "version": 2}
+    second = {**session, "draft": "Draft three", "version": 2}
+    assert await store.save(first, expected_version=1)
+    # The second turn started from version 1 too and loses
+    assert not await store.save(second, expected_version=1)
+
+    current = await store.get(session["id"])
+    assert current["draft"] == "Draft two"
+    assert current["version"] == 2
+    assert store.stats()["conflicts"] == 1
+
+
+async def test_sessions_expire_after_ttl(store_factory):
+    store = store_factory(ttl_seconds=0.05)
+    session = new_session("alice", "Draft")
+    await store.create(session)
+
+    await asyncio.sleep(0.1)
+
+    assert await store.get(session["id"]) is None
+    assert not await store.save({**session, "version": 2}, expected_version=1)
+
+
+async def test_least_recently_changed_session_is_evicted_past_max_sessions(store_factory):
+    store = store_factory(max_sessions=2)
+    oldest, middle, newest = (new_session("alice", f"Draft {i}") for i in range(3))
+    await store.create(oldest)
+    await store.create(middle)
+    # A turn on the oldest session makes middle the least recently changed
+    await asyncio.sleep(0.01)
+    assert await store.save({**oldest, "version": 2}, expected_version=1)
+
+    await store.create(newest)
+
+    assert await store.get(middle["id"]) is None
+    assert await store.get(oldest["id"]) is not None
+    assert await store.get(newest["id"]) is not None
+    assert store.stats()["evictions"] == 1
+
+
+async def test_shared_cap_holds_across_workers(tmp_path):
+    path = str(tmp_path / "state.db")
+    workers = [SessionStore(2, 60, SQLiteBackend(path)) for _ in range(2)]
+    sessions = [new_session("alice", f"Draft {i}") for i in range(4)]
+
+    for i, session in enumerate(sessions):
+        await workers[i % 2].create(session)
+        await asyncio.sleep(0.01)
+
+    kept = [await workers[0].get(session["id"]) is not None for session in sessions]
+    assert kept == [False, False, True, True]
+    for worker in workers:
+        await worker._shared.aclose()
+
+
+def test_edits_must_match_exactly_once():
+    assert apply_edits("one two", [{"find": "two", "replace": "three"}]) == "one three"
+    with pytest.raises(ValueError, match="not found"):
+        apply_edits("one two", [{"find": "four", "replace": "five"}])
+    with pytest.raises(ValueError, match="found 2 times"):
+        apply_edits("two two", [{"find": "two", "replace": "three"}])
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from services.shared_state import MemoryBackend, SharedSingleFlight
+from services.singleflight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = 0
+
+    async def fn():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*[flight.do("k", fn) for _ in range(5)])
+    assert results == [1] * 5
+    assert flight.stats() == {"leaders": 1, "followers": 4, "in_flight": 0}
+
+
+async def test_a_leaving_caller_does_not_cancel_the_call_for_others():
+    flight = SingleFlight()
+
+    async def fn():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    leaving = asyncio.ensure_future(flight.do("k", fn))
+    staying = asyncio.ensure_future(flight.do("k", fn))
+    await asyncio.sleep(0)
+    leaving.cancel()
+    assert await staying == "done"
+
+
+async def test_caller_arriving_after_the_last_waiter_left_gets_a_fresh_call():
+    flight = SingleFlight()
+    started = 0
+
+    async def fn():
+        nonlocal started
+        started += 1
+        await asyncio.sleep(0.02)
+        return started
+
+    first = asyncio.ensure_future(flight.do("k", fn))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    # The cancelled call's done callback has not run yet; the key must already be free
+    assert not flight.in_flight("k")
+    assert await flight.do("k", fn) == 2
+
+
+def shared_workers(count: int):
+    """SharedSingleFlights standing in for workers on one backend."""
+    backend = MemoryBackend()
+    return [SharedSingleFlight(backend, lock_ttl_seconds=5, poll_interval=0.01) for _ in range(count)]
+
+
+async def test_workers_share_one_call_across_a_backend():
+    leader, follower = shared_workers(2)
+    release = asyncio.Event()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await release.wait()
+        return "fresh"
+
+    leading = asyncio.ensure_future(leader.do("key", fn))
+    await asyncio.sleep(0.02)
+    following = asyncio.ensure_future(follower.do("key", fn))
+    await asyncio.sleep(0.02)
+    release.set()
+
+    assert await asyncio.gather(leading, following) == ["fresh", "fresh"]
+    assert len(calls) == 1
+    assert follower.stats()["followers"] == 1
+
+
+async def test_failed_leader_does_not_hand_followers_an_earlier_result():
+    first, leader, follower = shared_workers(3)
+
+    async def old():
+        return "old"
+
+    # An earlier flight of the same key left its result behind
+    assert await first.do("key", old) == "old"
+
+    started = asyncio.Event()
+
+    async def failing():
+        started.set()
+        await asyncio.sleep(0.05)
+        raise RuntimeError("upstream failed")
+
+    async def new():
+        return "new"
+
+    leading = asyncio.ensure_future(leader.do("key", failing))
+    await started.wait()
+    following = asyncio.ensure_future(follower.do("key", new))
+
+    with pytest.raises(RuntimeError):
+        await leading
+    # The follower takes over and makes its own call
+    assert await following == "new"
+    assert follower.stats()["takeovers"] == 1
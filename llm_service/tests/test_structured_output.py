@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+from config import settings
+from models import AIGenerateRequest, StructuredDescription, TaskContext
+from services.structured_output import compact_description, parse_description, render_description
+
+pytestmark = pytest.mark.anyio
+
+
+def answer(purpose, requirements, criteria):
+    return json.dumps({"purpose": purpose, "requirements": requirements, "acceptance_criteria": criteria})
+
+
+def test_answer_within_the_limit_is_kept_as_is():
+    raw = answer("Automate builds.", ["Add a CI workflow"], ["Builds run on every push"])
+
+    description, outcome = parse_description(raw, 400)
+
+    assert outcome == "valid"
+    assert render_description(description) == (
+        "Automate builds.\n\nRequirements:\n- Add a CI workflow\n\nAcceptance criteria:\n- Builds run on every push"
+    )
+
+
+@pytest.mark.parametrize("raw", ["not json", answer("Purpose", [], ["Done"]), json.dumps({"purpose": "Only"})])
+def test_malformed_answers_are_invalid(raw):
+    assert parse_description(raw, 400) == (None, "invalid")
+
+
+def test_filler_and_duplicates_go_first():
+    description = StructuredDescription(
+        purpose="The purpose of this task is to automate builds in order to catch breakages.",
+        requirements=["Make sure that CI runs successfully on every push", "make sure that CI runs on every push"],
+        acceptance_criteria=["Builds are properly reported"],
+    )
+
+    compacted = compact_description(description, 140)
+
+    assert compacted.purpose == "Automate builds to catch breakages"
+    assert compacted.requirements == ["CI runs on every push"]
+    assert compacted.acceptance_criteria == ["Builds are reported"]
+
+
+def test_then_first_sentences_then_trailing_items():
+    description = StructuredDescription(
+        purpose="Automate builds. Everything else follows from that.",
+        requirements=["Add a workflow. Use the hosted runners.", "Cache dependencies", "Publish artifacts"],
+        acceptance_criteria=["Builds pass. Failures notify the team.", "Artifacts are downloadable"],
+    )
+
+    roomy = compact_description(description, 200)
+    assert roomy.purpose == "Automate builds"
+    assert roomy.requirements == ["Add a workflow", "Cache dependencies", "Publish artifacts"]
+    assert roomy.acceptance_criteria == ["Builds pass", "Artifacts are downloadable"]
+
+    # Trailing items go from the longer list first
+    tight = compact_description(description, 120)
+    assert tight.requirements == ["Add a workflow"]
+    assert tight.acceptance_criteria == ["Builds pass", "Artifacts are downloadable"]
+
+    # Never below one of each
+    tightest = compact_description(description, 90)
+    assert tightest.requirements == ["Add a workflow"]
+    assert tightest.acceptance_criteria == ["Builds pass"]
+
+
+def test_answer_that_cannot_fit_is_too_long():
+    raw = answer("A" * 500, ["Step"], ["Done"])
+
+    assert parse_description(raw, 400) == (None, "too_long")
+
+
+def test_answer_emptied_by_compaction_is_too_long():
+    raw = answer("Ensure that .", ["Make sure that " + "x" * 400], ["Done"])
+
+    assert parse_description(raw, 400) == (None, "too_long")
+
+
+async def test_service_renders_structured_answers(ai_service, fake_gemini, monkeypatch):
+    monkeypatch.setattr(settings, "structured_output", True)
+    fake_gemini.reply = lambda prompt: answer("Automate builds.", ["Add a CI workflow"], ["Builds run on every push"])
+
+    result = await ai_service.generate_description(AIGenerateRequest(task=TaskContext(title="CI", stage="todo")))
+
+    assert result["structured"]["requirements"] == ["Add a CI workflow"]
+    assert result["content"].startswith("Automate builds.\n\nRequirements:")
+    assert result["character_count"] == len(result["content"])
+    assert len(fake_gemini.calls) == 1
+
+
+@pytest.mark.parametrize("unusable", ["{not json", answer("Ensure that .", ["Make sure that " + "x" * 400], ["Done"])])
+async def test_service_falls_back_to_free_text_on_an_unusable_answer(ai_service, fake_gemini, monkeypatch, unusable):
+    monkeypatch.setattr(settings, "structured_output", True)
+    replies = iter([unusable, "A free-text description"])
+    fake_gemini.reply = lambda prompt: next(replies)
+
+    result = await ai_service.generate_description(AIGenerateRequest(task=TaskContext(title="CI", stage="todo")))
+
+    assert result["success"]
+    assert result["content"] == "A free-text description"
+    assert "structured" not in result
+    assert len(fake_gemini.calls) == 2
@@ -0,0 +1,62 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from config import settings
+from routes import ai_routes
+
+EVENT = {"event": "task.created", "task_id": "42", "task": {"title": "Set up CI pipeline", "stage": "todo"}}
+
+
+class FakeJob:
+    id = "job-1"
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(ai_routes.router)
+    return TestClient(app)
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    """Jobs the webhook queues, captured instead of run."""
+    jobs = []
+
+    async def submit(operation, payload, **kwargs):
+        jobs.append((operation, payload, kwargs))
+        return FakeJob()
+
+    monkeypatch.setattr(ai_routes.job_queue, "submit", submit)
+    return jobs
+
+
+def test_events_are_refused_until_a_secret_is_configured(client, submitted, monkeypatch):
+    monkeypatch.setattr(settings, "webhook_secret", "")
+
+    response = client.post("/events/task", json=EVENT)
+
+    assert response.status_code == 503
+    assert submitted == []
+
+
+def test_events_with_a_wrong_secret_are_rejected(client, submitted, monkeypatch):
+    monkeypatch.setattr(settings, "webhook_secret", "s3cret")
+
+    assert client.post("/events/task", json=EVENT).status_code == 401
+    assert client.post("/events/task", json=EVENT, headers={"X-Webhook-Secret": "nope"}).status_code == 401
+    assert submitted == []
+
+
+def test_signed_event_queues_a_pregeneration_without_exposing_a_job_id(client, submitted, monkeypatch):
+    monkeypatch.setattr(settings, "webhook_secret", "s3cret")
+    monkeypatch.setattr(settings, "pregenerate_enabled", True)
+    monkeypatch.setattr(type(ai_routes.ai_service), "caching", property(lambda self: True))
+    monkeypatch.setattr(ai_routes.ai_service, "upstream_available", lambda: True)
+
+    response = client.post("/events/task", json=EVENT, headers={"X-Webhook-Secret": "s3cret"})
+
+    assert response.status_code == 202
+    assert response.json() == {"accepted": True, "reason": None}
+    assert [(operation, kwargs["caller"]) for operation, _, kwargs in submitted] == [("pregenerate", "pregenerate")]
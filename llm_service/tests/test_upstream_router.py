@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+from services.upstream_router import UpstreamRouter
+
+pytestmark = pytest.mark.anyio
+
+
+def router(**overrides):
+    options = dict(
+        primary_model="primary",
+        fallback_model="fallback",
+        hedge_min_delay=0.0,
+        hedge_default_delay=3.0,
+        hedge_min_samples=10,
+        fallback_min_calls=5,
+        fallback_error_rate=0.5,
+    )
+    options.update(overrides)
+    return UpstreamRouter(**options)
+
+
+def test_successful_call_without_latency_is_not_an_error():
+    upstream = router()
+    upstream.record("primary", None, ok=True)
+    stats = upstream.stats()["models"]["primary"]
+    assert stats["calls"] == 1
+    assert stats["errors"] == 0
+    assert stats["recent_error_rate"] == 0.0
+
+
+def test_failed_calls_count_as_errors_without_latency_samples():
+    upstream = router()
+    upstream.record("primary", 1.0, ok=False)
+    stats = upstream.stats()["models"]["primary"]
+    assert stats["errors"] == 1
+    assert stats["latency_p95_seconds"] is None
+
+
+def test_hedge_delay_uses_the_default_until_enough_samples():
+    upstream = router()
+    for _ in range(9):
+        upstream.record("primary", 0.1, ok=True)
+    assert upstream.hedge_delay("primary") == 3.0
+    upstream.record("primary", 0.1, ok=True)
+    assert upstream.hedge_delay("primary") == pytest.approx(0.1)
+
+
+def test_censored_hedge_losers_keep_the_hedge_delay_from_drifting_down():
+    upstream = router(hedge_quantile=0.9)
+    for _ in range(80):
+        upstream.record("primary", 0.1, ok=True)
+    # The slow 20% are cancelled after 1s when their hedge wins
+    for _ in range(20):
+        upstream.record_censored("primary", 1.0)
+    assert upstream.hedge_delay("primary") == pytest.approx(1.0)
+    assert upstream.stats()["models"]["primary"]["censored"] == 20
+
+
+def test_primary_failure_or_high_error_rate_routes_to_the_fallback():
+    upstream = router()
+    assert upstream.choose_model() == "primary"
+    assert upstream.choose_model(failed_model="primary") == "fallback"
+    for _ in range(5):
+        upstream.record("primary", 0.1, ok=False)
+    assert upstream.choose_model() == "fallback"
+
+
+async def test_successful_streams_are_not_reported_as_errors(ai_service):
+    events = [event async for event in ai_service.stream_content("write it", operation="generate")]
+    assert events[-1]["type"] == "done"
+    primary = ai_service.upstream_stats()["models"][ai_service._router.primary_model]
+    assert primary["calls"] == 1
+    assert primary["errors"] == 0
+
+
+async def test_hedge_win_records_the_cancelled_original_as_censored(ai_service, fake_gemini, monkeypatch):
+    calls = 0
+
+    async def generate(model, prompt, generation_config, system_instruction=None, history=None):
+        nonlocal calls
+        calls += 1
+        # The original hangs; the hedge answers right away
+        await asyncio.sleep(10 if calls == 1 else 0)
+        return {"text": "answer", "usage_metadata": None, "prompt_feedback": None}
+
+    fake_gemini.generate = generate
+    monkeypatch.setattr(ai_service._router, "hedge_enabled", True)
+    monkeypatch.setattr(ai_service._router, "hedge_default_delay", 0.02)
+    result = await ai_service.generate_content("prompt")
+    assert result["content"] == "answer"
+    stats = ai_service.upstream_stats()["models"][ai_service._router.primary_model]
+    assert stats["hedge_wins"] == 1
+    assert stats["censored"] == 1
+
+
+def test_hedge_delay_is_kept_per_operation():
+    upstream = router()
+    for _ in range(10):
+        upstream.record("primary", 0.1, ok=True, operation="generate")
+
+    assert upstream.hedge_delay("primary", "generate") == pytest.approx(0.1)
+    # Expand has no samples of its own yet, so short generate calls do not set its delay
+    assert upstream.hedge_delay("primary", "expand") == 3.0
+    assert upstream.stats()["models"]["primary"]["operations"]["generate"]["latency_samples"] == 10
+
+
+@pytest.fixture
+def hedging(ai_service, fake_gemini, monkeypatch):
+    """Hedging on, with a window of fast generate calls on the primary model."""
+    upstream = ai_service._router
+    monkeypatch.setattr(upstream, "hedge_enabled", True)
+    monkeypatch.setattr(upstream, "hedge_min_delay", 0.0)
+    monkeypatch.setattr(upstream, "hedge_default_delay", 5.0)
+    for _ in range(upstream.hedge_min_samples):
+        upstream.record(upstream.primary_model, 0.001, ok=True, operation="generate")
+    fake_gemini.delay = 0.05
+    return fake_gemini
+
+
+async def test_expand_length_call_is_not_hedged_against_generate_latency(ai_service, hedging):
+    result = await ai_service.generate_content("expand this", operation="expand")
+
+    assert result["success"]
+    assert len(hedging.calls) == 1
+
+
+async def test_generate_call_past_its_own_p95_is_hedged(ai_service, hedging):
+    await ai_service.generate_content("generate this", operation="generate")
+
+    assert len(hedging.calls) == 2
+
+
+@pytest.mark.parametrize("operation, background", [("generate", True), ("batch", False)])
+async def test_background_and_packed_calls_are_never_hedged(ai_service, hedging, operation, background):
+    for _ in range(ai_service._router.hedge_min_samples):
+        ai_service._router.record(ai_service._router.primary_model, 0.001, ok=True, operation=operation)
+
+    await ai_service.generate_content("prompt", operation=operation, background=background)
+
+    assert len(hedging.calls) == 1
@@ -0,0 +1,43 @@
+from models import UsageInfo
+from services.usage_tracker import OTHER_CALLERS, UsageTracker, build_usage_info
+
+
+def usage(prompt_tokens=10, completion_tokens=5):
+    return UsageInfo(model="m", prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+
+def test_usage_info_uses_gemini_counts_when_present():
+    info = build_usage_info("m", "prompt", "answer", {"promptTokenCount": 7, "candidatesTokenCount": 3, "totalTokenCount": 12})
+    assert (info.prompt_tokens, info.completion_tokens, info.total_tokens, info.estimated) == (7, 3, 12, False)
+
+
+def test_usage_info_estimates_missing_counts():
+    info = build_usage_info("m", "x" * 40, "y" * 8, None)
+    assert (info.prompt_tokens, info.completion_tokens, info.estimated) == (10, 2, True)
+
+
+def test_cumulative_usage_by_operation_and_caller():
+    tracker = UsageTracker(retention_seconds=60, max_events=100)
+    tracker.record("generate", "alice", usage())
+    tracker.record("expand", "alice", usage(20, 10))
+    report = tracker.cumulative()
+    assert report["totals"]["total_tokens"] == 45
+    assert report["by_caller"]["alice"]["requests"] == 2
+    assert report["by_operation"]["expand"]["prompt_tokens"] == 20
+
+
+def test_callers_beyond_the_cap_are_summed_under_other():
+    tracker = UsageTracker(retention_seconds=60, max_events=100, max_callers=2)
+    for caller in ["a", "b", "c", "d", "a"]:
+        tracker.record("generate", caller, usage())
+    by_caller = tracker.cumulative()["by_caller"]
+    assert set(by_caller) == {"a", "b", OTHER_CALLERS}
+    assert by_caller["a"]["requests"] == 2
+    assert by_caller[OTHER_CALLERS]["requests"] == 2
+
+
+def test_window_drops_events_past_max_events():
+    tracker = UsageTracker(retention_seconds=60, max_events=3)
+    for i in range(5):
+        tracker.record("generate", f"caller{i}", usage())
+    assert tracker.window(60)["totals"]["requests"] == 3